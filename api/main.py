@@ -1,64 +1,389 @@
-from fastapi import FastAPI, HTTPException
-from utils.modules import generative, query_endpoint,summary_prompt
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import json
+import os
+from utils.admission import parse_deadline, set_deadline, reset_deadline
+from utils.filters import build_filters
+from utils.summarize import is_focused_request
+from utils.modules import run_query_batch, stream_query, admission_stats, coalesced_generative, coalescing_stats, query_endpoint,summary_prompt,SUMMARY_SYSTEM_PROMPT,resolve_model,llm_router,page_catalog,intent_router,title_index,page_content,stream_page_content,summarizer,precomputed_summary,query_cache_stats,start_query_warmup
+import webhooks
 
 app = FastAPI()
+app.include_router(webhooks.router)
+request_deadline = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+max_batch_queries = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "1000"))
+max_batch_top_k = int(os.getenv("QUERY_BATCH_MAX_TOP_K", "10"))
 
 
+@app.on_event("startup")
+def warm_query_caches():
+    """Replays the most frequent logged queries in the background so the first requests find warm caches."""
+    start_query_warmup()
+
+
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    """
+    Gives every request a deadline (`X-Request-Timeout` header in seconds, or `REQUEST_DEADLINE_SECONDS`)
+    that bounds how long it may wait in the stage queues. A client may shorten the deadline but not
+    extend it past `REQUEST_DEADLINE_SECONDS`; a malformed header is answered with 400.
+    """
+    try:
+        timeout = parse_deadline(request.headers.get("x-request-timeout"), request_deadline)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    token = set_deadline(timeout)
+    try:
+        return await call_next(request)
+    finally:
+        reset_deadline(token)
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    model: Optional[str] = None
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=max_batch_queries)
+    top_k: int = Field(1, ge=1, le=max_batch_top_k)
+    generate: bool = True
+
+
+class SummarizeRequest(BaseModel):
+    page_id: Optional[str] = None
+    content: Optional[str] = None
+    title: Optional[str] = None
+    query: Optional[str] = None
+    model: Optional[str] = None
+    use_precomputed: bool = True
+
 
 @app.get("/generate_summary/")
-def summary_generator(prompt: str, model: str = "deepseek-ai/DeepSeek-R1"):
+def summary_generator(prompt: str, model: Optional[str] = None):
     """
-    Endpoint to generate a response using the Together API with retry logic.
+    Endpoint to generate a response through the configured LLM provider with retry logic.
 
     Args:
         prompt (str): The input prompt.
-        model (str): The model name (default: deepseek-ai/DeepSeek-R1).
+        model (Optional[str]): The model name, optionally as `provider:model` (default: the task's configured model).
 
     Returns:
         str: The model's response.
     """
     try:
-        response = generative(summary_prompt(prompt), model)
+        response = coalesced_generative(summary_prompt(prompt), model, system=SUMMARY_SYSTEM_PROMPT, task="summarization")
         if response is None:
             raise HTTPException(status_code=500, detail="Unable to get a response from the model.")
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/generate/")
-def generate_response(prompt: str, model: str = "deepseek-ai/DeepSeek-R1"):
+def generate_response(prompt: str, model: Optional[str] = None):
     """
-    Endpoint to generate a response using the Together API with retry logic.
+    Endpoint to generate a response through the configured LLM provider with retry logic.
 
     Args:
         prompt (str): The input prompt.
-        model (str): The model name (default: deepseek-ai/DeepSeek-R1).
+        model (Optional[str]): The model name, optionally as `provider:model` (default: the task's configured model).
 
     Returns:
         str: The model's response.
     """
     try:
-        response = generative(prompt, model)
+        response = coalesced_generative(prompt, model, task="generation")
         if response is None:
             raise HTTPException(status_code=500, detail="Unable to get a response from the model.")
         return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/generate/")
+def generate_response_post(request: GenerateRequest):
+    """
+    Endpoint to generate a response for a prompt sent in the request body.
+
+    Args:
+        request (GenerateRequest): The prompt and model name.
+
+    Returns:
+        str: The model's response.
+    """
+    return generate_response(request.prompt, request.model)
+
+
+@app.post("/summarize")
+def summarize(request: SummarizeRequest):
+    """
+    Endpoint to summarize a page with map-reduce summarization.
+
+    For an indexed page whose current version was summarized at ingestion time, the stored summary
+    is returned immediately unless the query asks for something more specific than a summary of
+    the page. Otherwise the page is split into token-bounded sections that are
+    summarized concurrently and then merged. Section summaries are cached by content hash, so only
+    edited sections are summarized again.
+
+    Args:
+        request (SummarizeRequest): Either an indexed `page_id` or raw `content`, plus the user query.
+
+    Returns:
+        dict: The summary, page metadata, and section/cache counts.
+    """
+    metadata = {"Page_Title": request.title or "Untitled"}
+    content = request.content
+    if request.page_id and request.use_precomputed:
+        # The stored summary is query-independent, so a focused request is summarized afresh
+        stored = precomputed_summary(request.page_id)
+        if stored is not None and not is_focused_request(request.query, stored["metadata"].get("Page_Title")):
+            return {**stored, "sections": 0, "cached_sections": 0, "precomputed": True}
+    if request.page_id:
+        page = page_content(request.page_id)
+        if page is None:
+            raise HTTPException(status_code=404, detail=f"Page {request.page_id} is not indexed.")
+        content, metadata = page["content"], page["metadata"]
+    if not content:
+        raise HTTPException(status_code=422, detail="Either page_id or content is required.")
+    try:
+        model = resolve_model("summarization", request.model)
+        result = summarizer.summarize(content, request.query, metadata.get("Page_Title", "Untitled"), model)
+        return {**result, "metadata": metadata, "model": model, "precomputed": False}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
 @app.get("/query/")
-async def query(query: str):
+async def query(query: str, space: Optional[List[str]] = Query(None), author: Optional[List[str]] = Query(None),
+                label: Optional[List[str]] = Query(None), ancestor: Optional[List[str]] = Query(None),
+                modified_after: Optional[str] = None, modified_before: Optional[str] = None):
     """
-    Endpoint to handle query requests.
+    Endpoint to handle query requests, optionally restricted to pages matching metadata filters.
+
+    Repeat a facet parameter to accept any of several values, e.g. `?space=PLAT&space=OPS`.
 
     Args:
         query (str): The input query.
+        space (Optional[List[str]]): Space keys.
+        author (Optional[List[str]]): Author display names.
+        label (Optional[List[str]]): Page labels.
+        ancestor (Optional[List[str]]): Ancestor page ids, to search a page tree.
+        modified_after (Optional[str]): ISO date or age (`30d`, `6m`, `1y`) of the oldest last modification.
+        modified_before (Optional[str]): ISO date or age of the newest last modification.
 
     Returns:
         dict: The responses generated by the query endpoint.
     """
     try:
-        response = await query_endpoint(query)
+        filters = build_filters(space, author, label, ancestor, modified_after, modified_before)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        response = await query_endpoint(query, filters)
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/query/stream")
+def query_stream(query: str, space: Optional[List[str]] = Query(None), author: Optional[List[str]] = Query(None),
+                 label: Optional[List[str]] = Query(None), ancestor: Optional[List[str]] = Query(None),
+                 modified_after: Optional[str] = None, modified_before: Optional[str] = None):
+    """
+    Endpoint to answer a query like `/query/`, streaming the answer as the model generates it.
+
+    Takes the same filters as `/query/`. Retrieval errors are returned as HTTP errors; once the
+    stream has started, a generation failure is sent as an `error` event.
+
+    Args:
+        query (str): The input query.
+        space (Optional[List[str]]): Space keys.
+        author (Optional[List[str]]): Author display names.
+        label (Optional[List[str]]): Page labels.
+        ancestor (Optional[List[str]]): Ancestor page ids, to search a page tree.
+        modified_after (Optional[str]): ISO date or age (`30d`, `6m`, `1y`) of the oldest last modification.
+        modified_before (Optional[str]): ISO date or age of the newest last modification.
+
+    Returns:
+        StreamingResponse: Newline-delimited JSON events: `metadata` for each document, then its
+        `token` events, then `done` (or `error`).
+    """
+    try:
+        filters = build_filters(space, author, label, ancestor, modified_after, modified_before)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        events = stream_query(query, filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse((json.dumps(event) + "\n" for event in events), media_type="application/x-ndjson")
+
+
+@app.post("/query/batch")
+def query_batch(request: BatchQueryRequest):
+    """
+    Endpoint to answer many queries in one request, for bulk and offline evaluation workloads.
+
+    Queries are embedded in batches, searched with a single `_msearch` for BM25 and kNN, and
+    reranked in large batches. Results are streamed back as newline-delimited JSON, in input
+    order, as they complete. A query that fails gets an `error` line and the others still run.
+    Requests with more than `QUERY_BATCH_MAX_QUERIES` queries or a `top_k` above
+    `QUERY_BATCH_MAX_TOP_K` are rejected with 422.
+
+    Args:
+        request (BatchQueryRequest): The queries, answers per query, and whether to call the LLM.
+
+    Returns:
+        StreamingResponse: One JSON line per query with its `index`, `query` and either `responses` or `error`.
+    """
+    results = run_query_batch(request.queries, top_k=request.top_k, generate=request.generate)
+    return StreamingResponse((json.dumps(result) + "\n" for result in results), media_type="application/x-ndjson")
+
+
+@app.get("/pages/")
+def list_pages():
+    """
+    Endpoint to list the pages available in the Elasticsearch index.
+
+    Returns:
+        dict: The cached page catalog and its age in seconds.
+    """
+    try:
+        pages = page_catalog.get()
+        return {"pages": pages, "age_seconds": round(page_catalog.age(), 2)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/pages/search/")
+def search_pages(query: str, top_k: int = 5):
+    """
+    Endpoint to find the page titles that best match a query.
+
+    Args:
+        query (str): The input query.
+        top_k (int): The maximum number of candidates to return.
+
+    Returns:
+        dict: Ranked (title, score) candidates.
+    """
+    try:
+        title_index.sync((page["Page_Title"] for page in page_catalog.get()), version=page_catalog.version)
+        return {"candidates": [{"Page_Title": title, "score": score} for title, score in title_index.search(query, top_k=top_k)]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/pages/{page_id}/content/")
+def get_page_content(page_id: str, stream: bool = False):
+    """
+    Endpoint to assemble a page from its indexed chunks in split order.
+
+    Args:
+        page_id (str): The Confluence page id.
+        stream (bool): Stream the stitched text as plain text instead of returning JSON.
+
+    Returns:
+        dict: The page content, metadata and chunk count.
+    """
+    if stream:
+        return StreamingResponse((f"{text}\n" for text in stream_page_content(page_id)), media_type="text/plain")
+    try:
+        page = page_content(page_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Page {page_id} is not indexed.")
+    return page
+
+
+@app.get("/route/")
+def route_query(query: str):
+    """
+    Endpoint to classify a query as Retrieval or Summarization and match it to page titles.
+
+    Args:
+        query (str): The input query.
+
+    Returns:
+        dict: The intent, matched page titles, confidence margin, routing source and latency.
+    """
+    try:
+        return intent_router.route(query)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/route/stats/")
+def route_stats():
+    """
+    Endpoint to report intent routing latency and LLM fallback rate.
+
+    Returns:
+        dict: The routing statistics.
+    """
+    return intent_router.stats()
+
+
+@app.get("/cache/stats/")
+def cache_statistics():
+    """
+    Endpoint to report the query embedding and retrieval caches and the startup warm-up.
+
+    Returns:
+        dict: Per-cache size, hits, misses and hit rate, and the warm-up progress.
+    """
+    return query_cache_stats()
+
+
+@app.get("/coalescing/stats/")
+def coalescing_statistics():
+    """
+    Endpoint to report how many requests were coalesced onto an identical in-flight request.
+
+    Returns:
+        dict: Per-layer request, execution and coalesced counts.
+    """
+    return coalescing_stats()
+
+
+@app.get("/admission/stats/")
+def admission_statistics():
+    """
+    Endpoint to report per-stage concurrency, queue depth and wait times for autoscaling.
+
+    Returns:
+        dict: Per-stage limiter statistics.
+    """
+    return admission_stats()
+
+
+@app.get("/llm/stats/")
+def llm_statistics():
+    """
+    Endpoint to report per-route LLM latency, hedging, token usage and cost.
+
+    Returns:
+        dict: Per-route statistics keyed by `provider:model`.
+    """
+    return llm_router.stats()
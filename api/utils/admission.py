@@ -0,0 +1,192 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from utils.llm import percentile
+
+# Absolute time.monotonic() deadline of the request being served, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class Overloaded(HTTPException):
+    """Raised when a stage's wait queue is full; answered with 429 and a Retry-After hint."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(status_code=429, detail=f"The {stage} stage is overloaded, retry later.",
+                         headers={"Retry-After": str(retry_after)})
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a request's deadline passes while it waits for a stage; answered with 503."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(status_code=503, detail=f"Request deadline exceeded while waiting for the {stage} stage.",
+                         headers={"Retry-After": str(retry_after)})
+
+
+def set_deadline(seconds: Optional[float]):
+    """
+    Sets the deadline of the current request.
+
+    Args:
+        seconds (Optional[float]): Seconds from now, or None for no deadline.
+
+    Returns:
+        Token: A token for `reset_deadline`.
+    """
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def parse_deadline(header: Optional[str], limit: float) -> float:
+    """
+    Parses a client-supplied request timeout and caps it at the server's deadline.
+
+    Args:
+        header (Optional[str]): The `X-Request-Timeout` value in seconds, or None if absent.
+        limit (float): The server deadline in seconds (0 or less for none), used when no header is sent.
+
+    Returns:
+        float: The timeout in seconds, in `(0, limit]` when the server has a deadline.
+
+    Raises:
+        ValueError: If the header is not a positive, finite number of seconds.
+    """
+    if header is None:
+        return limit
+    try:
+        timeout = float(header)
+    except ValueError:
+        raise ValueError(f"X-Request-Timeout must be a number of seconds, got {header!r}.")
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError(f"X-Request-Timeout must be a positive number of seconds, got {header!r}.")
+    return min(timeout, limit) if limit > 0 else timeout
+
+
+def reset_deadline(token) -> None:
+    _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class StageLimiter:
+    """
+    Bounds the concurrency of one pipeline stage (embedder, reranker, Elasticsearch, LLM).
+
+    At most `max_concurrency` calls run at once and at most `max_queue` more wait for a slot. A
+    call that finds the queue full is rejected immediately with `Overloaded`; a waiting call gives
+    up with `DeadlineExceeded` after `max_wait` seconds or when the request deadline passes.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait: float, window: int = 1000):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._waits = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of calls currently waiting for a slot."""
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Estimates how long, in whole seconds, the current queue needs to drain."""
+        service = sum(self._service_times) / len(self._service_times) if self._service_times else 1.0
+        return max(1, math.ceil(service * (self._waiting + 1) / self.max_concurrency))
+
+    @contextmanager
+    def slot(self):
+        """
+        Waits for a free slot in this stage and holds it for the duration of the block.
+
+        Raises:
+            Overloaded: If the wait queue is full.
+            DeadlineExceeded: If no slot frees up before `max_wait` or the request deadline.
+        """
+        with self._lock:
+            if self._active >= self.max_concurrency and self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise Overloaded(self.name, self.retry_after())
+            self._waiting += 1
+
+        timeout = self.max_wait
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining))
+        start = time.monotonic()
+        acquired = self._semaphore.acquire(timeout=timeout)
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self._waiting -= 1
+            self._waits.append(waited)
+            if not acquired:
+                self._timeouts += 1
+                raise DeadlineExceeded(self.name, self.retry_after())
+            self._active += 1
+            self._admitted += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._service_times.append(time.monotonic() - start)
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "capacity": self.max_concurrency,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "queue_limit": self.max_queue,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "wait_s": {"p50": percentile(waits, 50), "p95": percentile(waits, 95), "max": max(waits) if waits else None},
+            }
+
+
+def limiter_from_env(name: str, max_concurrency: int, max_queue: int, max_wait: float) -> StageLimiter:
+    """
+    Builds a `StageLimiter` whose limits can be overridden with `<NAME>_CONCURRENCY`,
+    `<NAME>_QUEUE` and `<NAME>_MAX_WAIT` environment variables.
+
+    Args:
+        name (str): The stage name, e.g. "embedder".
+        max_concurrency (int): The default number of concurrent calls.
+        max_queue (int): The default number of waiting calls.
+        max_wait (float): The default maximum wait in seconds.
+
+    Returns:
+        StageLimiter: The configured limiter.
+    """
+    prefix = name.upper()
+    return StageLimiter(
+        name,
+        max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", max_concurrency)),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", max_queue)),
+        max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", max_wait)),
+    )
@@ -0,0 +1,150 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from haystack import Document
+
+from docstore.utils.vector_index import knn_body
+
+
+def embed_texts(embedder, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+    """
+    Embeds many queries in one batched forward pass of a `SentenceTransformersTextEmbedder`.
+
+    Args:
+        embedder: The (warmed-up) Haystack text embedder.
+        texts (List[str]): The queries.
+        batch_size (int): The encoder batch size.
+
+    Returns:
+        List[List[float]]: One embedding per query, in order.
+    """
+    embedder.warm_up()
+    texts_to_embed = [embedder.prefix + text + embedder.suffix for text in texts]
+    return embedder.embedding_backend.embed(
+        texts_to_embed,
+        batch_size=batch_size,
+        show_progress_bar=False,
+        normalize_embeddings=embedder.normalize_embeddings,
+    )
+
+
+def hit_to_document(hit: Dict[str, Any]) -> Document:
+    """
+    Converts an Elasticsearch hit written by `ElasticsearchDocumentStore` back into a Document.
+
+    Args:
+        hit (Dict[str, Any]): The raw hit.
+
+    Returns:
+        Document: The document, with its score and flattened meta fields restored.
+    """
+    data = dict(hit["_source"])
+    data["score"] = hit.get("_score")
+    return Document.from_dict(data)
+
+
+def bm25_body(query: str, top_k: int, fuzziness: str = "AUTO", filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Builds a BM25 search body like that of `ElasticsearchBM25Retriever`, with optional filter clauses."""
+    return {
+        "size": top_k,
+        "query": {"bool": {"must": [{"multi_match": {"query": query, "fuzziness": fuzziness, "type": "most_fields", "operator": "AND"}}],
+                           "filter": filters or []}},
+        "_source": {"excludes": ["embedding"]},
+    }
+
+
+def bm25_search(client, index: str, query: str, top_k: int, filters: Optional[List[Dict[str, Any]]] = None,
+                routing: Optional[str] = None, fuzziness: str = "AUTO") -> List[Document]:
+    """
+    Runs one BM25 search, optionally routed to the shards of some routing values.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index (or alias) to search.
+        query (str): The query.
+        top_k (int): Documents to return.
+        filters (Optional[List[Dict[str, Any]]]): Elasticsearch filter clauses.
+        routing (Optional[str]): Comma-separated routing values; only their shards are searched.
+        fuzziness (str): BM25 fuzziness.
+
+    Returns:
+        List[Document]: The documents, best first.
+    """
+    response = client.search(index=index, routing=routing, **bm25_body(query, top_k, fuzziness, filters))
+    return [hit_to_document(hit) for hit in response["hits"]["hits"]]
+
+
+def msearch_hybrid(client, index: str, queries: List[str], embeddings: List[List[float]], top_k: int = 3,
+                   num_candidates: int = 3, fuzziness: str = "AUTO", oversample: float = 1.0,
+                   rescore: bool = False, filters: Optional[List[Optional[Dict[str, Any]]]] = None
+                   ) -> List[Tuple[List[Document], List[Document]]]:
+    """
+    Runs the BM25 and kNN searches of many queries in a single `_msearch` round trip.
+
+    The BM25 body mirrors that of `ElasticsearchBM25Retriever`; the kNN body is `knn_body`, so a
+    quantized index is oversampled and rescored the same way as single queries.
+
+    Args:
+        client: The shared Elasticsearch client.
+        index (str): The index (or alias) to search.
+        queries (List[str]): The queries.
+        embeddings (List[List[float]]): The query embeddings, in the same order.
+        top_k (int): Documents per query and retriever.
+        num_candidates (int): kNN candidates per shard.
+        fuzziness (str): BM25 fuzziness.
+        oversample (float): kNN candidates kept per returned document.
+        rescore (bool): Whether to rescore kNN candidates with full-precision vectors.
+        filters (Optional[List[Optional[Dict[str, Any]]]]): An Elasticsearch filter clause per query
+            (or None), applied to both of its searches.
+
+    Returns:
+        List[Tuple[List[Document], List[Document]]]: (BM25 documents, kNN documents) per query.
+    """
+    searches = []
+    for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+        clause = [filters[i]] if filters and filters[i] else []
+        searches.append({"index": index})
+        searches.append(bm25_body(query, top_k, fuzziness, clause))
+        searches.append({"index": index})
+        searches.append(knn_body(embedding, top_k, num_candidates, oversample, rescore, clause))
+    responses = client.msearch(searches=searches)["responses"]
+
+    results = []
+    for i in range(len(queries)):
+        sparse, dense = responses[2 * i], responses[2 * i + 1]
+        for response in (sparse, dense):
+            if "error" in response:
+                raise RuntimeError(f"Elasticsearch msearch failed: {response['error']}")
+        results.append((
+            [hit_to_document(hit) for hit in sparse["hits"]["hits"]],
+            [hit_to_document(hit) for hit in dense["hits"]["hits"]],
+        ))
+    return results
+
+
+def rerank_pairs(ranker, pairs: List[Tuple[str, str]], batch_size: int = 64) -> List[float]:
+    """
+    Scores (query, document) pairs from many queries in large batches with the ranker's cross-encoder.
+
+    Scores match `TransformersSimilarityRanker.run`, including its sigmoid scaling.
+
+    Args:
+        ranker: The (warmed-up) `TransformersSimilarityRanker`.
+        pairs (List[Tuple[str, str]]): (query, document content) pairs.
+        batch_size (int): Pairs per forward pass.
+
+    Returns:
+        List[float]: One score per pair, in order.
+    """
+    ranker.warm_up()
+    device = next(ranker.model.parameters()).device
+    scores = []
+    with torch.inference_mode():
+        for start in range(0, len(pairs), batch_size):
+            batch = [[query, content] for query, content in pairs[start:start + batch_size]]
+            features = ranker.tokenizer(batch, padding=True, truncation=True, return_tensors="pt").to(device)
+            logits = ranker.model(**features).logits.squeeze(dim=1)
+            if ranker.scale_score:
+                logits = torch.sigmoid(logits * ranker.calibration_factor)
+            scores.extend(logits.float().cpu().tolist())
+    return scores
@@ -0,0 +1,125 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+
+class PageCatalog:
+    """
+    A TTL cache of the pages present in the Elasticsearch index.
+
+    Pages are read with a composite terms aggregation on `Page_Title` and `Page_ID` instead of calling
+    Confluence (or with the store's own `list_pages` for the local document store), so pages sharing a
+    title in different spaces stay separate entries.
+    Once loaded, a stale catalog is still served while a single background thread refreshes it, so
+    callers only ever wait for the very first load. `version` increases whenever a refresh changes the
+    catalog, so dependent indexes can skip rebuilding when nothing changed.
+    """
+
+    def __init__(self, document_store, index: str, ttl: float = 300, page_size: int = 1000):
+        self.document_store = document_store
+        self.index = index
+        self.ttl = ttl
+        self.page_size = page_size
+        self._pages: List[Dict[str, Any]] = []
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.version = 0
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if hasattr(self.document_store, "list_pages"):
+            return self.document_store.list_pages()
+        client = self.document_store.client
+        pages = []
+        after_key = None
+        while True:
+            composite = {
+                "size": self.page_size,
+                "sources": [
+                    {"title": {"terms": {"field": "Page_Title"}}},
+                    {"page_id": {"terms": {"field": "Page_ID"}}},
+                ],
+            }
+            if after_key:
+                composite["after"] = after_key
+            response = client.search(
+                index=self.index,
+                size=0,
+                aggs={
+                    "titles": {
+                        "composite": composite,
+                        "aggs": {
+                            "page": {
+                                "top_hits": {
+                                    "size": 1,
+                                    "_source": {"includes": ["Page_URL"]},
+                                }
+                            }
+                        },
+                    }
+                },
+            )
+            aggregation = response["aggregations"]["titles"]
+            for bucket in aggregation["buckets"]:
+                hits = bucket["page"]["hits"]["hits"]
+                source = hits[0]["_source"] if hits else {}
+                pages.append({
+                    "Page_Title": bucket["key"]["title"],
+                    "Page_ID": bucket["key"]["page_id"],
+                    "Page_URL": source.get("Page_URL"),
+                    "chunks": bucket["doc_count"],
+                })
+            after_key = aggregation.get("after_key")
+            if not after_key or not aggregation["buckets"]:
+                return pages
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        """
+        Reloads the catalog from Elasticsearch synchronously.
+
+        Returns:
+            List[Dict[str, Any]]: The freshly loaded pages.
+        """
+        pages = self._load()
+        with self._lock:
+            if pages != self._pages:
+                self.version += 1
+            self._pages = pages
+            self._loaded_at = time.monotonic()
+        return pages
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Page catalog refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self) -> List[Dict[str, Any]]:
+        """
+        Returns the cached catalog, scheduling a background refresh when it is older than the TTL.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per page with its title, id, URL and chunk count.
+        """
+        with self._lock:
+            loaded = self._loaded_at > 0
+            stale = time.monotonic() - self._loaded_at > self.ttl
+            if loaded and stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+            if loaded:
+                return self._pages
+        return self.refresh()
+
+    def invalidate(self) -> None:
+        """Marks the catalog stale so the next `get` refreshes it in the background."""
+        with self._lock:
+            if self._loaded_at:
+                self._loaded_at = time.monotonic() - self.ttl - 1
+
+    def age(self) -> float:
+        """Seconds since the catalog was last loaded."""
+        return time.monotonic() - self._loaded_at if self._loaded_at else float("inf")
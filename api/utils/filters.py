@@ -0,0 +1,150 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Query parameters that filter on a keyword facet, and the chunk metadata field each one matches
+FACET_FIELDS = {
+    "space": "Space_Key",
+    "author": "Author_Name",
+    "label": "Labels",
+    "ancestor": "Ancestor_IDs",
+}
+
+# Units of relative dates such as "30d" or "6m"
+RELATIVE_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+RANGE_OPERATORS = {">": "gt", ">=": "gte", "<": "lt", "<=": "lte"}
+
+
+def parse_date(value: str, now: Optional[datetime] = None) -> str:
+    """
+    Parses an ISO 8601 date or a relative age (`30d`, `2w`, `6m`, `1y`) into a UTC ISO timestamp.
+
+    Args:
+        value (str): The date, e.g. "2024-06-01" or "6m" (six months ago).
+        now (Optional[datetime]): The reference time for relative ages (default: now).
+
+    Returns:
+        str: The timestamp, comparable with the `Last_Modified` chunk field.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([dwmy])\s*", value.lower())
+    if match:
+        days = int(match.group(1)) * RELATIVE_UNITS[match.group(2)]
+        # Rounded to the minute so repeated queries share a filter (and a coalescing key)
+        now = (now or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+        return (now - timedelta(days=days)).isoformat()
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}': expected an ISO 8601 date or an age such as 30d, 6m or 1y.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def build_filters(space: Optional[List[str]] = None, author: Optional[List[str]] = None,
+                  label: Optional[List[str]] = None, ancestor: Optional[List[str]] = None,
+                  modified_after: Optional[str] = None, modified_before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Builds Haystack filters from the facet query parameters.
+
+    Several values of one facet match any of them; different facets must all match.
+
+    Args:
+        space (Optional[List[str]]): Space keys.
+        author (Optional[List[str]]): Author display names.
+        label (Optional[List[str]]): Page labels.
+        ancestor (Optional[List[str]]): Ancestor page ids (the page tree below them).
+        modified_after (Optional[str]): Earliest last modification, see `parse_date`.
+        modified_before (Optional[str]): Latest last modification, see `parse_date`.
+
+    Returns:
+        Optional[Dict[str, Any]]: The filters, or None if no parameter was given.
+
+    Raises:
+        ValueError: If a date cannot be parsed.
+    """
+    conditions = []
+    for name, values in (("space", space), ("author", author), ("label", label), ("ancestor", ancestor)):
+        values = [value for value in values or [] if value]
+        if values:
+            conditions.append({"field": f"meta.{FACET_FIELDS[name]}", "operator": "in", "value": values})
+    if modified_after:
+        conditions.append({"field": "meta.Last_Modified", "operator": ">=", "value": parse_date(modified_after)})
+    if modified_before:
+        conditions.append({"field": "meta.Last_Modified", "operator": "<=", "value": parse_date(modified_before)})
+    return combine_filters(*conditions)
+
+
+def combine_filters(*filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Joins Haystack filters with AND, skipping None; returns None if nothing is left."""
+    filters = [f for f in filters if f]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return {"operator": "AND", "conditions": filters}
+
+
+def es_clause(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translates Haystack filters (AND/OR/NOT of `==`, `!=`, `in`, `not in` and range conditions)
+    into an Elasticsearch query clause, for searches that bypass the Haystack retrievers.
+    """
+    if "conditions" in filters:
+        clauses = [es_clause(condition) for condition in filters["conditions"]]
+        operator = filters["operator"]
+        if operator == "AND":
+            return {"bool": {"filter": clauses}}
+        if operator == "OR":
+            return {"bool": {"should": clauses, "minimum_should_match": 1}}
+        if operator == "NOT":
+            return {"bool": {"must_not": [{"bool": {"filter": clauses}}]}}
+        raise ValueError(f"Unknown logical operator '{operator}'")
+    field = filters["field"].removeprefix("meta.")
+    operator, value = filters["operator"], filters["value"]
+    if operator == "==":
+        return {"term": {field: value}}
+    if operator == "!=":
+        return {"bool": {"must_not": [{"term": {field: value}}]}}
+    if operator == "in":
+        return {"terms": {field: value}}
+    if operator == "not in":
+        return {"bool": {"must_not": [{"terms": {field: value}}]}}
+    if operator in RANGE_OPERATORS:
+        return {"range": {field: {RANGE_OPERATORS[operator]: value}}}
+    raise ValueError(f"Unknown comparison operator '{operator}'")
+
+
+def es_filter_clauses(filters: Optional[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """The `filter` clauses of a kNN or BM25 search for Haystack `filters` (None if unfiltered)."""
+    return [es_clause(filters)] if filters else None
+
+
+def routing_values(filters: Optional[Dict[str, Any]], field: str = "meta.Space_Key") -> Optional[List[str]]:
+    """
+    Finds the values `filters` restricts `field` to, when every match must have one of them.
+
+    Args:
+        filters (Optional[Dict[str, Any]]): Haystack filters.
+        field (str): The routing field.
+
+    Returns:
+        Optional[List[str]]: The values (for the search `routing` parameter), or None if matches
+        may have any value.
+    """
+    if not filters:
+        return None
+    if filters.get("operator") == "AND":
+        for condition in filters["conditions"]:
+            values = routing_values(condition, field)
+            if values:
+                return values
+        return None
+    if filters.get("field") == field and filters["operator"] in ("==", "in"):
+        values = filters["value"] if filters["operator"] == "in" else [filters["value"]]
+        return [str(value) for value in values] or None
+    return None
@@ -0,0 +1,526 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class LLMProvider:
+    """
+    A client for any OpenAI-compatible `/chat/completions` endpoint (Together, vLLM, llama.cpp server, ...).
+
+    Connections are pooled in a `requests.Session`, so repeated calls to the same host reuse TCP/TLS
+    connections. Failed requests are retried `retry_count` times, `backoff_time` seconds apart.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: Optional[str] = None, timeout: float = 60,
+                 retry_count: int = 3, backoff_time: float = 10, extra_params: Optional[Dict[str, Any]] = None,
+                 pool_size: int = 32, limiter=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retry_count = retry_count
+        self.backoff_time = backoff_time
+        self.extra_params = extra_params or {}
+        self.limiter = limiter
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        self.session.headers.update({"Content-Type": "application/json"})
+        if api_key:
+            self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def chat(self, messages: List[Dict[str, str]], model: str, **params) -> Optional[Dict[str, Any]]:
+        """
+        Sends a chat completion request with retry logic.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages.
+            model (str): The model name as known to this provider.
+            **params: Extra request parameters, overriding the provider defaults.
+
+        Returns:
+            Optional[Dict[str, Any]]: The JSON response, or None once every attempt has failed.
+        """
+        payload = {"model": model, "messages": messages, **self.extra_params, **params}
+        url = f"{self.base_url}/chat/completions"
+
+        for attempt in range(self.retry_count):
+            try:
+                with self.limiter.slot() if self.limiter is not None else nullcontext():
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException as e:
+                print(f"[{self.name}] Attempt {attempt+1} failed: {e}")
+
+                if attempt < self.retry_count - 1:
+                    print(f"Retrying in {self.backoff_time} seconds...")
+                    time.sleep(self.backoff_time)
+                else:
+                    print("Max retries reached. Returning None.")
+        return None
+
+    def chat_stream(self, messages: List[Dict[str, str]], model: str, **params) -> Iterator[Dict[str, Any]]:
+        """
+        Sends a streaming chat completion request and yields its server-sent events as they arrive.
+
+        Only opening the stream is retried; once events have been yielded, a failure is raised,
+        since the caller has already shown part of the answer.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages.
+            model (str): The model name as known to this provider.
+            **params: Extra request parameters, overriding the provider defaults.
+
+        Yields:
+            Dict[str, Any]: The parsed `chat.completion.chunk` events.
+
+        Raises:
+            requests.RequestException: If the stream cannot be opened after every attempt, or breaks off.
+        """
+        payload = {"model": model, "messages": messages, **self.extra_params, **params, "stream": True}
+        url = f"{self.base_url}/chat/completions"
+
+        for attempt in range(self.retry_count):
+            # The admission slot is held until the stream ends, like a blocking call's
+            with self.limiter.slot() if self.limiter is not None else nullcontext():
+                try:
+                    response = self.session.post(url, json=payload, timeout=self.timeout, stream=True)
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"[{self.name}] Attempt {attempt+1} failed: {e}")
+                    if attempt == self.retry_count - 1:
+                        raise
+                else:
+                    with response:
+                        for line in response.iter_lines():
+                            if not line.startswith(b"data:"):
+                                continue
+                            data = line[len(b"data:"):].strip().decode("utf-8")
+                            if data == "[DONE]":
+                                return
+                            yield json.loads(data)
+                    return
+            print(f"Retrying in {self.backoff_time} seconds...")
+            time.sleep(self.backoff_time)
+
+
+def build_messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Builds the chat messages for a prompt.
+
+    Static instructions belong in `system`, which comes first and is byte-identical across requests,
+    so providers that cache prompt prefixes can reuse its prefill.
+
+    Args:
+        prompt (str): The variable part of the prompt (context, query).
+        system (Optional[str]): The static instructions.
+
+    Returns:
+        List[Dict[str, str]]: The messages.
+    """
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+class LLMRegistry:
+    """
+    Resolves a task (or an explicit model) to a provider and model name.
+
+    Providers come from the `LLM_PROVIDERS` environment variable, a JSON object such as
+    `{"local": {"base_url": "http://127.0.0.1:8000/v1"}}`; a `together` provider is always
+    available. Each task's model is configured with `LLM_MODEL_<TASK>` as `provider:model`,
+    falling back to `LLM_MODEL_DEFAULT` and then to `together:deepseek-ai/DeepSeek-R1`.
+    """
+
+    def __init__(self, providers: Dict[str, LLMProvider], task_models: Dict[str, str], default_model: str):
+        self.providers = providers
+        self.task_models = task_models
+        self.default_model = default_model
+
+    @classmethod
+    def from_env(cls, limiter=None) -> "LLMRegistry":
+        timeout = float(os.getenv("LLM_TIMEOUT", "60"))
+        providers = {
+            "together": LLMProvider(
+                "together",
+                os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1"),
+                api_key=os.getenv("TOGETHER_TOKEN"),
+                timeout=timeout,
+                extra_params={
+                    "max_tokens": None,
+                    "temperature": 0.7,
+                    "top_p": 0.7,
+                    "top_k": 50,
+                    "repetition_penalty": 1,
+                    "stop": ["<｜end▁of▁sentence｜>"],
+                },
+                limiter=limiter,
+            )
+        }
+        for name, config in json.loads(os.getenv("LLM_PROVIDERS", "{}")).items():
+            providers[name] = LLMProvider(
+                name,
+                config["base_url"],
+                api_key=os.getenv(config["api_key_env"]) if config.get("api_key_env") else config.get("api_key"),
+                timeout=config.get("timeout", timeout),
+                retry_count=config.get("retry_count", 3),
+                backoff_time=config.get("backoff_time", 10),
+                extra_params=config.get("params", {"temperature": 0.7, "top_p": 0.7}),
+                limiter=limiter,
+            )
+        task_models = {
+            key[len("LLM_MODEL_"):].lower(): value
+            for key, value in os.environ.items()
+            if key.startswith("LLM_MODEL_") and key != "LLM_MODEL_DEFAULT"
+        }
+        default_model = os.getenv("LLM_MODEL_DEFAULT", "together:deepseek-ai/DeepSeek-R1")
+        return cls(providers, task_models, default_model)
+
+    def resolve(self, task: Optional[str] = None, model: Optional[str] = None) -> Tuple[LLMProvider, str]:
+        """
+        Picks the provider and model for a call.
+
+        Args:
+            task (Optional[str]): The task name, e.g. "retrieval", "summarization" or "classification".
+            model (Optional[str]): An explicit model, optionally prefixed with a provider name
+                (`local:qwen2.5-7b-instruct`); it overrides the task's configured model.
+
+        Returns:
+            Tuple[LLMProvider, str]: The provider and the model name to send to it.
+        """
+        spec = model or self.task_models.get(task or "") or self.default_model
+        provider_name, _, model_name = spec.partition(":")
+        if model_name and provider_name in self.providers:
+            return self.providers[provider_name], model_name
+        default_provider = self.default_model.partition(":")[0]
+        return self.providers.get(default_provider, self.providers["together"]), spec
+
+
+def extract_text_after_tag(input_text: str, tag: str) -> str:
+    """
+    Extracts and returns the text following a specified HTML-like closing tag from a given input string.
+
+    Responses from non-reasoning models have no such tag and are returned whole.
+
+    :param input_text: A string containing the text with HTML-like tags.
+    :param tag: A string representing the tag name to search for in the input text.
+    :return: A string containing the text after the specified closing tag, or the whole input if the tag is not found.
+    """
+    tag_end = f"</{tag}>"
+    tag_end_index = input_text.find(tag_end)
+    if tag_end_index != -1:
+        return input_text[tag_end_index + len(tag_end):].strip()
+    return input_text.strip()
+
+
+# Words that suggest a query needs multi-step reasoning rather than a short extractive answer
+COMPLEX_MARKERS = ("why", "compare", "difference", "trade-off", "tradeoff", "design", "architecture", "explain",
+                   "step by step", "root cause", "analy", "pros and cons", "versus", " vs ", "recommend")
+
+
+def is_complex(query: Optional[str], max_words: int = 25) -> bool:
+    """
+    Guesses whether a query needs a reasoning model.
+
+    Args:
+        query (Optional[str]): The user query; unknown queries count as complex.
+        max_words (int): Queries longer than this count as complex.
+
+    Returns:
+        bool: True if the query should go to the reasoning model.
+    """
+    if not query:
+        return True
+    lowered = f" {query.lower()} "
+    return len(query.split()) > max_words or any(marker in lowered for marker in COMPLEX_MARKERS)
+
+
+def percentile(values, q: float) -> Optional[float]:
+    """
+    Returns the nearest-rank `q`th percentile of a list of samples.
+
+    Args:
+        values: The samples, in any order.
+        q (float): The percentile, from 0 to 100.
+
+    Returns:
+        Optional[float]: The percentile, or None if there are no samples.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class RouteStats:
+    """Latency, hedging, token and cost counters for one `provider:model` route."""
+
+    def __init__(self, window: int = 1000):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_s": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)},
+            "hedges": self.hedges,
+            "hedges_skipped": self.hedges_skipped,
+            "hedge_wins": self.hedge_wins,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+class LLMRouter:
+    """
+    Chooses a model per call within a latency budget and hedges slow completions.
+
+    Classification, and retrieval answers to short, simple queries, go to `fast_model` (a
+    non-reasoning model) when one is configured; everything else uses the task's model from the
+    registry, e.g. DeepSeek-R1. Once a route has `hedge_min_samples` latencies, a call still
+    running after that route's `hedge_percentile` latency gets a backup request, and the first
+    successful response wins. At most `max_hedges` backups run at once, and none is sent while
+    the provider's limiter has calls waiting, so hedging never adds load to a saturated stage.
+
+    Hedged requests run on a pool of `max_workers` threads, in the caller's context so the request
+    deadline still applies. Work is only handed to the pool when a thread is free: a call that finds
+    every thread busy runs unhedged on the calling thread, and a backup is skipped, so nothing queues
+    in front of the provider's limiter and an overloaded stage still answers 429. Latency, hedges,
+    tokens and cost (from `prices`, USD per million tokens) are tracked per route.
+    """
+
+    def __init__(self, registry: LLMRegistry, fast_model: Optional[str] = None,
+                 fast_tasks: Tuple[str, ...] = ("classification", "retrieval"), max_fast_query_words: int = 25,
+                 hedge_percentile: float = 95, hedge_min_samples: int = 20, hedge_min_delay: float = 2.0,
+                 max_hedges: int = 4, prices: Optional[Dict[str, Dict[str, float]]] = None, max_workers: int = 32):
+        self.registry = registry
+        self.fast_model = fast_model
+        self.fast_tasks = fast_tasks
+        self.max_fast_query_words = max_fast_query_words
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.max_hedges = max_hedges
+        self.prices = prices or {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._pool_slots = threading.BoundedSemaphore(max_workers)
+        self._stats: Dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+        self._hedges_in_flight = 0
+
+    @classmethod
+    def from_env(cls, registry: LLMRegistry) -> "LLMRouter":
+        hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        return cls(
+            registry,
+            fast_model=os.getenv("LLM_FAST_MODEL"),
+            max_fast_query_words=int(os.getenv("LLM_FAST_MAX_QUERY_WORDS", "25")),
+            hedge_percentile=hedge_percentile,
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")) if hedge_percentile > 0 else 0,
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "2")),
+            max_hedges=int(os.getenv("LLM_MAX_HEDGES", "4")),
+            prices=json.loads(os.getenv("LLM_PRICES", "{}")),
+        )
+
+    def select(self, task: Optional[str] = None, model: Optional[str] = None, query: Optional[str] = None) -> Tuple[LLMProvider, str]:
+        """
+        Picks the provider and model for a call.
+
+        Args:
+            task (Optional[str]): The task name.
+            model (Optional[str]): An explicit model; bypasses the fast-model policy.
+            query (Optional[str]): The user query, used to judge complexity.
+
+        Returns:
+            Tuple[LLMProvider, str]: The provider and model name.
+        """
+        if model is None and self.fast_model and task in self.fast_tasks:
+            if task == "classification" or not is_complex(query, self.max_fast_query_words):
+                return self.registry.resolve(model=self.fast_model)
+        return self.registry.resolve(task, model)
+
+    def _route_stats(self, route: str) -> RouteStats:
+        with self._lock:
+            return self._stats.setdefault(route, RouteStats())
+
+    def _hedge_delay(self, route: str) -> Optional[float]:
+        stats = self._route_stats(route)
+        if not self.hedge_min_samples or len(stats.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, percentile(list(stats.latencies), self.hedge_percentile))
+
+    def _submit(self, provider: LLMProvider, model: str, messages: List[Dict[str, str]], route: str) -> Optional[Future]:
+        """Runs a call on a free pool thread in the caller's context, or returns None if every thread is busy."""
+        if not self._pool_slots.acquire(blocking=False):
+            return None
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._call, provider, model, messages, route)
+        future.add_done_callback(lambda _: self._pool_slots.release())
+        return future
+
+    def _start_hedge(self, provider: LLMProvider, model: str, messages: List[Dict[str, str]], route: str) -> Optional[Future]:
+        limiter = getattr(provider, "limiter", None)
+        with self._lock:
+            stats = self._stats[route]
+            if self._hedges_in_flight >= self.max_hedges or (limiter is not None and limiter.queue_depth > 0):
+                stats.hedges_skipped += 1
+                return None
+            self._hedges_in_flight += 1
+        backup = self._submit(provider, model, messages, route)
+        with self._lock:
+            if backup is None:
+                self._hedges_in_flight -= 1
+                stats.hedges_skipped += 1
+                return None
+            stats.hedges += 1
+        backup.add_done_callback(self._hedge_done)
+        return backup
+
+    def _hedge_done(self, future) -> None:
+        with self._lock:
+            self._hedges_in_flight -= 1
+
+    def _call(self, provider: LLMProvider, model: str, messages: List[Dict[str, str]], route: str):
+        start = time.perf_counter()
+        response = provider.chat(messages, model)
+        latency = time.perf_counter() - start
+        stats = self._route_stats(route)
+        with self._lock:
+            stats.calls += 1
+            if response is None:
+                stats.failures += 1
+                return None
+            stats.latencies.append(latency)
+            usage = response.get("usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            price = self.prices.get(route, {})
+            stats.cost += (prompt_tokens * price.get("input", 0) + completion_tokens * price.get("output", 0)) / 1e6
+        return response
+
+    def complete(self, messages: List[Dict[str, str]], task: Optional[str] = None, model: Optional[str] = None,
+                 query: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Runs a chat completion on the selected route, hedging it if it runs slower than usual.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages.
+            task (Optional[str]): The task name.
+            model (Optional[str]): An explicit model.
+            query (Optional[str]): The user query, used to judge complexity.
+
+        Returns:
+            Optional[Dict[str, Any]]: The JSON response of the first successful request, or None.
+
+        Raises:
+            Exception: The error of the first request to raise, if no request succeeded.
+        """
+        provider, model_name = self.select(task, model, query)
+        route = f"{provider.name}:{model_name}"
+        delay = self._hedge_delay(route)
+        if delay is None:
+            return self._call(provider, model_name, messages, route)
+
+        primary = self._submit(provider, model_name, messages, route)
+        if primary is None:
+            # Every pool thread is busy: wait for the limiter here rather than in the executor's queue
+            return self._call(provider, model_name, messages, route)
+        done, _ = wait([primary], timeout=delay)
+        backup = None if done else self._start_hedge(provider, model_name, messages, route)
+        if backup is None:
+            return primary.result()
+
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    # The other request may still succeed
+                    error = error or e
+                    continue
+                if response is not None:
+                    if future is backup:
+                        with self._lock:
+                            self._stats[route].hedge_wins += 1
+                    return response
+        if error is not None:
+            raise error
+        return None
+
+    def stream(self, messages: List[Dict[str, str]], task: Optional[str] = None, model: Optional[str] = None,
+               query: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams a chat completion on the selected route, yielding the answer text as it is generated.
+
+        Streams are not hedged: a backup would have to start over after text was already shown.
+        Latency (to the last token) and token usage, when the provider reports it, count towards the route.
+
+        Args:
+            messages (List[Dict[str, str]]): The chat messages.
+            task (Optional[str]): The task name.
+            model (Optional[str]): An explicit model.
+            query (Optional[str]): The user query, used to judge complexity.
+
+        Yields:
+            str: Pieces of the response content.
+        """
+        provider, model_name = self.select(task, model, query)
+        route = f"{provider.name}:{model_name}"
+        stats = self._route_stats(route)
+        start = time.perf_counter()
+        usage = {}
+        try:
+            for chunk in provider.chat_stream(messages, model_name):
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        except requests.RequestException:
+            with self._lock:
+                stats.calls += 1
+                stats.failures += 1
+            raise
+        with self._lock:
+            stats.calls += 1
+            stats.latencies.append(time.perf_counter() - start)
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            price = self.prices.get(route, {})
+            stats.cost += (prompt_tokens * price.get("input", 0) + completion_tokens * price.get("output", 0)) / 1e6
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports latency percentiles, hedging, token usage and cost per route.
+
+        Returns:
+            Dict[str, Any]: Per-route statistics.
+        """
+        with self._lock:
+            return {route: stats.to_dict() for route, stats in self._stats.items()}
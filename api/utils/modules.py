@@ -5,29 +5,175 @@ from haystack_integrations.components.retrievers.elasticsearch import (
     ElasticsearchBM25Retriever
 )
 from haystack.components.embedders import SentenceTransformersTextEmbedder
-import requests
+import asyncio
+import hashlib
+import json
+import threading
 import time
+from concurrent.futures import Future
 from haystack.components.joiners import DocumentJoiner
 from haystack.components.rankers import TransformersSimilarityRanker
-from haystack import Pipeline
+from utils.catalog import PageCatalog
+from utils.router import IntentRouter
+from utils.title_index import TitleIndex
+from utils.page_assembly import assemble_page, iter_page_text, page_metadata
+from utils.summarize import MapReduceSummarizer, PartialSummaryCache
+from utils.admission import limiter_from_env
+from utils.query_cache import LRUCache, QueryLog
+from utils.filters import combine_filters, es_clause, es_filter_clauses, routing_values
+from utils.llm import LLMRegistry, LLMRouter, build_messages
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import numpy as np
 from dotenv import load_dotenv
 import os
+import sys
 from pathlib import Path
 env_path = Path(__file__).resolve().parents[2] / ".env"  # Navigate up to project root
 load_dotenv(dotenv_path=env_path)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from docstore.utils.summary_store import SummaryStore
+from docstore.utils.vector_index import document_mapping, knn_search
+from docstore.utils.local_store import LocalBM25Retriever, LocalDocumentStore, LocalEmbeddingRetriever
+from docstore.utils.page_index import PageVectorIndex, page_documents, page_vectors
+from docstore.utils.index_lifecycle import alias_chunks, bulk_update_documents, bulk_write_documents
+from utils.batch import bm25_search, embed_texts, hit_to_document, msearch_hybrid, rerank_pairs
+from utils.work_queue import DebouncedQueue, QueueWorker
+from haystack.document_stores.types import DuplicatePolicy
+from confluence.utils import confluence_program
+from ingestion.utils.chunker import StructureChunker
+from ingestion.utils.dedup import rehome_aliases, restore_aliases
+from ingestion.utils.preprocessing import build_page_docx, chunk_pairs, page_metadata as confluence_page_metadata, page_pair
 
 
-# Load API Token
-api_token = os.getenv("TOGETHER_TOKEN")
 elasticsearch_url =os.getenv('ELASTICSEARCH_URL')
 elasticsearch_username=os.getenv('ELASTICSEARCH_USERNAME')
 elasticsearch_password=os.getenv("ELASTICSEARCH_PASSWORD")
 elasticsearch_indexname=os.getenv("ELASTICSEARCH_INDEXNAME")
+elasticsearch_summary_indexname=os.getenv("ELASTICSEARCH_SUMMARY_INDEXNAME", f"{elasticsearch_indexname}-summaries")
+elasticsearch_page_indexname=os.getenv("ELASTICSEARCH_PAGE_INDEXNAME", f"{elasticsearch_indexname}-pages")
+elasticsearch_connections = int(os.getenv("ELASTICSEARCH_CONNECTIONS", "10"))
+page_catalog_ttl = float(os.getenv("PAGE_CATALOG_TTL", "300"))
+router_min_margin = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+router_title_min_score = float(os.getenv("ROUTER_TITLE_MIN_SCORE", "0.8"))
+summary_section_tokens = int(os.getenv("SUMMARY_SECTION_TOKENS", "3000"))
+summary_workers = int(os.getenv("SUMMARY_WORKERS", "4"))
+summary_cache_dir = os.getenv("SUMMARY_CACHE_DIR")
+query_batch_chunk = int(os.getenv("QUERY_BATCH_CHUNK", "64"))
+query_batch_workers = int(os.getenv("QUERY_BATCH_WORKERS", "8"))
+vector_quantization = os.getenv("VECTOR_QUANTIZATION", "int8").lower()
+chunker_mode = os.getenv("INGEST_CHUNKER", "structure").lower()
+chunk_max_tokens = int(os.getenv("INGEST_CHUNK_MAX_TOKENS", "480"))
+chunk_min_tokens = int(os.getenv("INGEST_CHUNK_MIN_TOKENS", "240"))
+webhook_queue_path = os.getenv("WEBHOOK_QUEUE_PATH", str(Path(__file__).resolve().parents[2] / "state" / "webhook_queue.sqlite3"))
+webhook_debounce = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", "5"))
+webhook_max_delay = float(os.getenv("WEBHOOK_MAX_DELAY_SECONDS", "60"))
+document_store_backend = os.getenv("DOCUMENT_STORE", "elasticsearch").lower()
+local_store_path = os.getenv("LOCAL_STORE_PATH", str(Path(__file__).resolve().parents[2] / "state" / "local_store"))
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "flat").lower()
+retrieval_top_pages = int(os.getenv("RETRIEVAL_TOP_PAGES", "20"))
+vector_oversample = float(os.getenv("VECTOR_OVERSAMPLE", "4"))
+vector_rescore = vector_quantization != "none" and os.getenv("VECTOR_RESCORE", "true").lower() in ("1", "true", "yes")
+query_embedding_cache_size = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+retrieval_cache_size = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+retrieval_cache_ttl = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+query_log_path = os.getenv("QUERY_LOG_PATH", str(Path(__file__).resolve().parents[2] / "state" / "query_log.jsonl"))
+query_log_max_entries = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "10000"))
+query_warmup_count = int(os.getenv("QUERY_WARMUP_COUNT", "100"))
+# Chunks are routed to shards by Space_Key (see embedding.py), so space-filtered searches only touch those shards
+space_routing = os.getenv("ELASTICSEARCH_SPACE_ROUTING", "false").lower() in ("1", "true", "yes")
+
+
+
+# Per-stage admission control: bounded concurrency with a bounded wait queue
+embedder_limiter = limiter_from_env("embedder", max_concurrency=2, max_queue=32, max_wait=10)
+reranker_limiter = limiter_from_env("reranker", max_concurrency=2, max_queue=32, max_wait=10)
+es_limiter = limiter_from_env("es", max_concurrency=elasticsearch_connections, max_queue=64, max_wait=5)
+llm_limiter = limiter_from_env("llm", max_concurrency=16, max_queue=64, max_wait=30)
+
+
+def admission_stats():
+    """
+    Reports the concurrency, queue depth and wait times of every admission-controlled stage.
 
+    Returns:
+        dict: Per-stage limiter statistics.
+    """
+    return {limiter.name: limiter.stats() for limiter in (embedder_limiter, reranker_limiter, es_limiter, llm_limiter)}
 
 
-def summary_prompt(context):
-    prompt=f""" 
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one in-flight computation.
+
+    The first caller for a key runs the function; callers arriving while it is still running wait
+    for and receive the same result (or exception) instead of repeating the work.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            requests_seen = self.executions + self.coalesced
+            return {
+                "requests": requests_seen,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / requests_seen, 4) if requests_seen else 0.0,
+                "in_flight": len(self._calls),
+            }
+
+
+query_flight = SingleFlight("query")
+generate_flight = SingleFlight("generate")
+
+
+def normalize_query(query: str) -> str:
+    """Lower-cases a query and collapses whitespace so trivially different spellings share a key."""
+    return " ".join(query.lower().split())
+
+
+def coalescing_stats():
+    """
+    Reports how many requests were served by attaching to an identical in-flight computation.
+
+    Returns:
+        dict: Per-layer request, execution and coalesced counts.
+    """
+    return {flight.name: flight.stats() for flight in (query_flight, generate_flight)}
+
+
+SUMMARY_SYSTEM_PROMPT = """
     You are an expert AI assistant specializing in fact-based, structured, and professional summarization. Your task is to generate a concise yet detailed summary of the provided content while maintaining its original intent, technical accuracy, and key takeaways.
 
 **Instructions**:
@@ -61,7 +207,11 @@ def summary_prompt(context):
     - If the provided content lacks enough details, clearly state:
     - "The given content does not provide sufficient details for a comprehensive summary."
     - Do not attempt to fabricate missing information.
-    
+"""
+
+
+def summary_prompt(context):
+    prompt=f"""
 **Input Content**:{context}
     
 **Output Summary:**
@@ -69,153 +219,718 @@ def summary_prompt(context):
     return prompt
 
 
+# LLM providers (Together and any OpenAI-compatible endpoint) with per-task model selection,
+# fast-model routing for simple requests and tail-latency hedging
+llm_registry = LLMRegistry.from_env(limiter=llm_limiter)
+llm_router = LLMRouter.from_env(llm_registry)
+
+
+def resolve_model(task: Optional[str] = None, model: Optional[str] = None, query: Optional[str] = None) -> str:
+    """
+    Resolves a task or explicit model to a fully qualified `provider:model` name.
+
+    Args:
+        task (Optional[str]): The task name, e.g. "retrieval" or "summarization".
+        model (Optional[str]): An explicit model that overrides the task's configured model.
+        query (Optional[str]): The user query, used to judge whether a fast model suffices.
+
+    Returns:
+        str: The `provider:model` name.
+    """
+    provider, model_name = llm_router.select(task, model, query)
+    return f"{provider.name}:{model_name}"
+
+
 # Generative function with retry logic
-def generative(prompt: str, model="deepseek-ai/DeepSeek-R1") -> str:
+def generative(prompt: str, model: Optional[str] = None, system: Optional[str] = None, task: Optional[str] = None,
+               query: Optional[str] = None) -> str:
+    """
+    Generates a response through the configured LLM provider with retry logic and hedging.
+
+    Args:
+        prompt (str): The input prompt (the variable part of the request).
+        model (Optional[str]): The model to use, optionally as `provider:model`; defaults to the task's model.
+        system (Optional[str]): Static instructions, sent as the system message.
+        task (Optional[str]): The task used to pick the model when none is given.
+        query (Optional[str]): The user query, used to route simple requests to the fast model.
+
+    Returns:
+        str: The model's response, or None if every attempt failed.
+    """
+    response = llm_router.complete(build_messages(prompt, system), task=task, model=model, query=query)
+    if response is None:
+        return None
+    return response["choices"][0]["message"]["content"]
+
+
+def coalesced_generative(prompt: str, model: Optional[str] = None, system: Optional[str] = None, task: Optional[str] = None) -> str:
     """
-    Generates a response using the Together API with retry logic.
+    Calls `generative`, sharing one model call between concurrent requests with the same prompt and model.
 
     Args:
         prompt (str): The input prompt.
-        model (str): The model to use (default: "deepseek-ai/DeepSeek-R1").
+        model (Optional[str]): The model to use; defaults to the task's model.
+        system (Optional[str]): Static instructions, sent as the system message.
+        task (Optional[str]): The task used to pick the model when none is given.
 
     Returns:
         str: The model's response.
     """
-    HEADERS = {
-    "Authorization": f"Bearer {api_token}",
-    "Content-Type": "application/json",
-    }
-    timeout = 60
-    retry_count = 3
-    backoff_time = 10  # Time to wait before retrying
-
-    url = "https://api.together.xyz/v1/chat/completions"
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": None,
-        "temperature": 0.7,
-        "top_p": 0.7,
-        "top_k": 50,
-        "repetition_penalty": 1,
-        "stop": ["<｜end▁of▁sentence｜>"],
-    }
+    resolved = resolve_model(task, model)
+    key = (resolved, hashlib.sha256(f"{system}\x00{prompt}".encode("utf-8")).hexdigest())
+    return generate_flight.do(key, generative, prompt, resolved, system)
+
+
+# Static answering instructions, sent as the system message so providers can cache the prefix
+RETRIEVAL_SYSTEM_PROMPT = """
+### System Role:
+You are an AI assistant trained to provide fact-based, precise, and well-structured answers based on retrieved documents. 
+Use the provided context, metadata, and user query to generate a high-quality response. If the provided information is insufficient, 
+respond with: "The given context does not contain enough details to answer this query."
+
+### Response Guidelines:
+- **Accuracy & Relevance**: Extract and summarize relevant information strictly from the provided context.  
+- **Data Structure Awareness**: If the context includes SQL queries, hierarchical data, JSON structures, or tabular data, 
+  maintain their integrity in the response.  
+- **Technical Depth**: If the query is technical, provide optimizations, best practices, or alternative solutions.  
+- **Context Preservation**: Ensure that the response preserves relationships between data elements.  
+- **Clarity & Readability**: Structure responses clearly with bullet points, explanations, and code formatting (if applicable).  
+- **Uncertainty Handling**: If the context lacks enough information, state:  
+  _"The provided context does not contain sufficient details to answer this question."_  
+"""
 
-    for attempt in range(retry_count):
-        try:
-            response = requests.post(url, headers=HEADERS, json=payload, timeout=timeout)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except requests.RequestException as e:
-            print(f"Attempt {attempt+1} failed: {e}")
-
-            if attempt < retry_count - 1:
-                print(f"Retrying in {backoff_time} seconds...")
-                time.sleep(backoff_time)
-            else:
-                print("Max retries reached. Returning None.")
 
-    return None
 # Prompting function
 def prompting(user_query, context):
     prompt = f"""
-    ### System Role:
-    You are an AI assistant trained to provide fact-based, precise, and well-structured answers based on retrieved documents. 
-    Use the provided context, metadata, and user query to generate a high-quality response. If the provided information is insufficient, 
-    respond with: "The given context does not contain enough details to answer this query."
-
     ### Context:
     {context}  
 
     ### User Query:
     {user_query}  
-
-    ### Response Guidelines:
-    - **Accuracy & Relevance**: Extract and summarize relevant information strictly from the provided context.  
-    - **Data Structure Awareness**: If the context includes SQL queries, hierarchical data, JSON structures, or tabular data, 
-      maintain their integrity in the response.  
-    - **Technical Depth**: If the query is technical, provide optimizations, best practices, or alternative solutions.  
-    - **Context Preservation**: Ensure that the response preserves relationships between data elements.  
-    - **Clarity & Readability**: Structure responses clearly with bullet points, explanations, and code formatting (if applicable).  
-    - **Uncertainty Handling**: If the context lacks enough information, state:  
-      _"The provided context does not contain sufficient details to answer this question."_  
-
     """
     return prompt
 
-# Elasticsearch Document Store
-document_store = ElasticsearchDocumentStore(
-        hosts=elasticsearch_url,
-        basic_auth=(elasticsearch_username, elasticsearch_password),
-        index=elasticsearch_indexname,
-        embedding_similarity_function="cosine",
-        verify_certs=False,
-        ca_certs=None, 
-    )
+# Document store: Elasticsearch (its pooled client is shared by every endpoint) or, with
+# DOCUMENT_STORE=local, the embedded store written by embedding.py under LOCAL_STORE_PATH.
+# ELASTICSEARCH_INDEXNAME is the read alias that blue/green reindexing in embedding.py switches between builds
+local_store = document_store_backend == "local"
+if local_store:
+    document_store = LocalDocumentStore(local_store_path)
+    page_reader = document_store
+else:
+    document_store = ElasticsearchDocumentStore(
+            hosts=elasticsearch_url,
+            basic_auth=(elasticsearch_username, elasticsearch_password),
+            index=elasticsearch_indexname,
+            embedding_similarity_function="cosine",
+            custom_mapping=document_mapping(vector_quantization),
+            verify_certs=False,
+            ca_certs=None, 
+            connections_per_node=elasticsearch_connections,
+        )
+    page_reader = document_store.client
+
+# Page catalog served from the index (shares the document store's client)
+page_catalog = PageCatalog(document_store, elasticsearch_indexname, ttl=page_catalog_ttl)
 
 # Embedding Retriever and BM25 Retriever
-embedding_retriever = ElasticsearchEmbeddingRetriever(document_store=document_store, top_k=3, num_candidates=3)
+retriever_top_k = 3
+retriever_num_candidates = 3
+if local_store:
+    embedding_retriever = LocalEmbeddingRetriever(document_store=document_store, top_k=retriever_top_k)
+    bm25_retriever = LocalBM25Retriever(document_store=document_store, top_k=retriever_top_k)
+else:
+    embedding_retriever = ElasticsearchEmbeddingRetriever(document_store=document_store, top_k=retriever_top_k, num_candidates=retriever_num_candidates)
+    bm25_retriever = ElasticsearchBM25Retriever(document_store=document_store, top_k=retriever_top_k)
 embadder = SentenceTransformersTextEmbedder(model="BAAI/bge-m3", device=ComponentDevice.from_str("cuda:0"))
-bm25_retriever = ElasticsearchBM25Retriever(document_store=document_store, top_k=3)
+
+# Normalised query -> float32 embedding, and (query, filters) -> reranked documents; both prefilled
+# at startup from the most frequent queries in the on-disk query log
+query_embedding_cache = LRUCache(query_embedding_cache_size)
+retrieval_cache = LRUCache(retrieval_cache_size, ttl=retrieval_cache_ttl)
+query_log = QueryLog(query_log_path, max_entries=query_log_max_entries)
 
 # Joiner & Ranker
 document_joiner = DocumentJoiner()
 ranker = TransformersSimilarityRanker(model="BAAI/bge-reranker-base", top_k=1, device=ComponentDevice.from_str("cuda:0"))
 
-# Hybrid Retrieval Pipeline
-hybrid_retrieval = Pipeline()
-hybrid_retrieval.add_component("text_embedder", embadder)
-hybrid_retrieval.add_component("embedding_retriever", embedding_retriever)
-hybrid_retrieval.add_component("bm25_retriever", bm25_retriever)
-hybrid_retrieval.add_component("document_joiner", document_joiner)
-hybrid_retrieval.add_component("ranker", ranker)
 
-hybrid_retrieval.connect("text_embedder", "embedding_retriever")
-hybrid_retrieval.connect("bm25_retriever", "document_joiner")
-hybrid_retrieval.connect("embedding_retriever", "document_joiner")
-hybrid_retrieval.connect("document_joiner", "ranker")
+def page_content(page_id: str):
+    """
+    Assembles a page from its chunks using the shared Elasticsearch client (or the local store).
+
+    Args:
+        page_id (str): The Confluence page id.
+
+    Returns:
+        Optional[dict]: The page content, metadata and chunk count, or None if the page is not indexed.
+    """
+    return assemble_page(page_reader, elasticsearch_indexname, page_id)
+
+
+def stream_page_content(page_id: str):
+    """
+    Streams the de-overlapped text of a page chunk by chunk using the shared Elasticsearch client (or the local store).
+
+    Args:
+        page_id (str): The Confluence page id.
+
+    Returns:
+        Iterator[str]: The page text, one chunk at a time.
+    """
+    return iter_page_text(page_reader, elasticsearch_indexname, page_id)
+
+
+# Summaries precomputed at ingestion time, keyed by Page_ID + version (Elasticsearch only)
+summary_store = None if local_store else SummaryStore(document_store.client, elasticsearch_summary_indexname)
+
+
+def precomputed_summary(page_id: str):
+    """
+    Looks up the ingest-time summary of the currently indexed version of a page.
+
+    Args:
+        page_id (str): The Confluence page id.
+
+    Returns:
+        Optional[dict]: The stored summary and the page metadata, or None if the page is not indexed
+        or its current version has no precomputed summary.
+    """
+    if summary_store is None:
+        return None
+    metadata = page_metadata(page_reader, elasticsearch_indexname, page_id)
+    if metadata is None:
+        return None
+    try:
+        stored = summary_store.get(page_id, metadata.get("Version"))
+    except Exception as e:
+        print(f"Summary store lookup failed: {e}")
+        return None
+    if stored is None:
+        return None
+    return {"summary": stored["summary"], "metadata": metadata}
+
+
+# Map-reduce summarizer with partial summaries cached by section content
+summarizer = MapReduceSummarizer(
+    generate=lambda prompt, model, system: generative(prompt, model, system=system, task="summarization"),
+    cache=PartialSummaryCache(directory=summary_cache_dir),
+    section_tokens=summary_section_tokens,
+    max_workers=summary_workers,
+)
+
+
+def embed_query(text: str):
+    """
+    Embeds a single query with the shared bge-m3 text embedder, through the query embedding cache.
+
+    Args:
+        text (str): The query text.
+
+    Returns:
+        List[float]: The query embedding.
+    """
+    return embed_queries([text])[0]
+
+
+def embed_queries(texts):
+    """
+    Embeds many queries, running the embedder in one batch for those missing from the LRU cache
+    of normalised query -> embedding (`QUERY_EMBEDDING_CACHE_SIZE`).
+
+    Args:
+        texts (List[str]): The query texts.
+
+    Returns:
+        List[List[float]]: One embedding per query, in order.
+    """
+    keys = [normalize_query(text) for text in texts]
+    embeddings = [query_embedding_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        with embedder_limiter.slot():
+            computed = embed_texts(embadder, [texts[i] for i in missing])
+        for i, embedding in zip(missing, computed):
+            # Stored as float32 arrays, a quarter of the size of a list of Python floats
+            embeddings[i] = np.asarray(embedding, dtype=np.float32)
+            query_embedding_cache.put(keys[i], embeddings[i])
+    return [embedding.tolist() for embedding in embeddings]
+
+
+# Page-level vectors (the mean of each page's chunk vectors) for two-stage retrieval
+if local_store:
+    page_vector_store = LocalDocumentStore(os.path.join(local_store_path, "pages"))
+else:
+    page_vector_store = PageVectorIndex(document_store.client, elasticsearch_page_indexname)
+
+
+def select_pages(embeddings, filters=None):
+    """
+    First retrieval stage: finds the `RETRIEVAL_TOP_PAGES` pages closest to each query.
+
+    Args:
+        embeddings (List[List[float]]): The query embeddings.
+        filters (Optional[dict]): Haystack filters on the page facets (see `utils.filters`).
+
+    Returns:
+        List[Optional[List[str]]]: The page ids of each query, or None where the chunk search
+        should not be restricted (no page vectors yet, or the lookup failed).
+    """
+    try:
+        with es_limiter.slot():
+            if local_store:
+                selected = [[doc.id for doc in page_vector_store.embedding_retrieval(list(embedding), top_k=retrieval_top_pages, filters=filters)]
+                            for embedding in embeddings]
+            else:
+                selected = page_vector_store.msearch_top_pages(embeddings, retrieval_top_pages, filters=es_filter_clauses(filters))
+    except Exception as e:
+        print(f"Page vector lookup failed: {e}")
+        return [None] * len(embeddings)
+    return [page_ids or None for page_ids in selected]
+
+
+def page_retrieval_filters(page_ids):
+    """Haystack filters restricting a retriever to the chunks of `page_ids` (and chunks aliasing them)."""
+    return {"operator": "OR", "conditions": [
+        {"field": "meta.Page_ID", "operator": "in", "value": page_ids},
+        {"field": "meta.alias_page_ids", "operator": "in", "value": page_ids},
+    ]}
+
+
+def hybrid_retrieval(query: str, filters=None):
+    """
+    Runs hybrid retrieval: dense kNN and BM25 search, joined and reranked.
+
+    Each stage runs under its own admission limiter, so a burst that saturates one model or
+    Elasticsearch is shed with 429 instead of piling up behind it. On a quantized index the kNN
+    search oversamples candidates and rescores them with the full-precision vectors. With
+    `RETRIEVAL_MODE=two_stage`, both searches are restricted to the pages picked by `select_pages`.
+    Metadata filters are applied inside both searches (as kNN pre-filters and BM25 filter
+    clauses), not to their results. Results are cached per normalised query and filters for
+    `RETRIEVAL_CACHE_TTL` seconds. With `ELASTICSEARCH_SPACE_ROUTING`, searches restricted to
+    some spaces are routed to the shards holding them.
+
+    Args:
+        query (str): The input query.
+        filters (Optional[dict]): Haystack filters on the chunk metadata (see `utils.filters`).
+
+    Returns:
+        List[Document]: The reranked documents.
+    """
+    cache_key = (normalize_query(query), json.dumps(filters, sort_keys=True))
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    query_embedding = embed_query(query)
+    page_ids = select_pages([query_embedding], filters)[0] if retrieval_mode == "two_stage" else None
+    routing = None
+    if space_routing and not local_store:
+        routing = ",".join(routing_values(filters) or []) or None
+    filters = combine_filters(filters, page_retrieval_filters(page_ids) if page_ids else None)
+    with es_limiter.slot():
+        if local_store or (vector_quantization == "none" and routing is None):
+            dense_documents = embedding_retriever.run(query_embedding=query_embedding, filters=filters)["documents"]
+        else:
+            hits = knn_search(document_store.client, elasticsearch_indexname, query_embedding, retriever_top_k,
+                              retriever_num_candidates, oversample=vector_oversample, rescore=vector_rescore,
+                              filters=es_filter_clauses(filters), routing=routing)
+            dense_documents = [hit_to_document(hit) for hit in hits]
+    with es_limiter.slot():
+        if routing is None:
+            sparse_documents = bm25_retriever.run(query=query, filters=filters)["documents"]
+        else:
+            sparse_documents = bm25_search(document_store.client, elasticsearch_indexname, query, retriever_top_k,
+                                           filters=es_filter_clauses(filters), routing=routing)
+    joined_documents = document_joiner.run(documents=[sparse_documents, dense_documents])["documents"]
+    ranker.warm_up()
+    with reranker_limiter.slot():
+        documents = ranker.run(query=query, documents=joined_documents)["documents"]
+    retrieval_cache.put(cache_key, documents)
+    return list(documents)
+
+
+# Local intent router (LLM classification only on low confidence)
+title_index = TitleIndex()
+intent_router = IntentRouter(
+    embed=embed_query,
+    catalog=page_catalog,
+    llm=lambda prompt, system: generative(prompt, system=system, task="classification"),
+    title_index=title_index,
+    min_margin=router_min_margin,
+    title_min_score=router_title_min_score,
+)
 
 
 # Query Endpoint
-async def query_endpoint(query: str):
+async def query_endpoint(query: str, filters=None):
     """
     Handles the query endpoint logic.
 
+    Concurrent requests with the same normalised query and filters share a single retrieval and generation run.
+
     Args:
         query (str): The input query.
+        filters (Optional[dict]): Haystack filters on the chunk metadata.
 
     Returns:
         dict: The responses and metadata generated by the query endpoint.
     """
-    result = hybrid_retrieval.run(
-        {
-            "text_embedder": {"text": query},
-            "bm25_retriever": {"query": query},
-            "ranker": {"query": query}
-        }
-    )
+    key = (normalize_query(query), json.dumps(filters, sort_keys=True))
+    # Only buffered here; the log's own thread writes it to disk
+    query_log.append(key[0], filters)
+    return await asyncio.to_thread(query_flight.do, key, run_query, query, filters)
+
+
+query_warmup = {"state": "idle", "queries": 0, "replayed": 0, "failed": 0, "seconds": None}
+
+
+def warm_up_query_caches(count: int = query_warmup_count):
+    """
+    Loads the models and replays the most frequent logged queries through retrieval, filling the
+    query embedding and retrieval caches before real traffic needs them.
+
+    Args:
+        count (int): The number of logged queries to replay.
+    """
+    started = time.monotonic()
+    query_warmup.update(state="running")
+    try:
+        embadder.warm_up()
+        ranker.warm_up()
+        top_queries = query_log.most_common(count)
+        query_warmup["queries"] = len(top_queries)
+        # Embedded in one batch; retrieval then finds every embedding cached
+        embed_queries([query for query, _, _ in top_queries])
+    except Exception as e:
+        print(f"Query cache warm-up failed: {e}")
+        query_warmup.update(state="failed", seconds=round(time.monotonic() - started, 2))
+        return
+    for query, filters, _ in top_queries:
+        try:
+            hybrid_retrieval(query, filters)
+            query_warmup["replayed"] += 1
+        except Exception as e:
+            print(f"Warm-up of query '{query}' failed: {e}")
+            query_warmup["failed"] += 1
+    query_warmup.update(state="done", seconds=round(time.monotonic() - started, 2))
+
 
+def start_query_warmup():
+    """Runs `warm_up_query_caches` on a background thread, so startup is not delayed."""
+    if query_warmup_count > 0:
+        threading.Thread(target=warm_up_query_caches, name="query-warmup", daemon=True).start()
+
+
+def query_cache_stats():
+    """
+    Reports the query embedding and retrieval caches and the startup warm-up.
+
+    Returns:
+        dict: Size, hits, misses and hit rate per cache, and the warm-up progress.
+    """
+    return {"embedding": query_embedding_cache.stats(), "retrieval": retrieval_cache.stats(), "warmup": dict(query_warmup)}
+
+
+def document_metadata(doc):
+    """
+    Extracts the page metadata shown with an answer.
+
+    Args:
+        doc (Document): The retrieved document.
+
+    Returns:
+        dict: The page title, author, date (and ISO timestamp), space, URL and author email, the attachment the passage came
+        from (if any), and the titles of other pages carrying the same text.
+    """
+    return {
+        "Page_Title": doc.meta.get('Page_Title', 'Unknown'),
+        "Author_Name": doc.meta.get('Author_Name', 'Unknown'),
+        "Date": doc.meta.get('Date', 'Unknown'),
+        "Last_Modified": doc.meta.get('Last_Modified'),
+        "Space_Key": doc.meta.get('Space_Key'),
+        "Page_URL": doc.meta.get('Page_URL', 'Unknown'),
+        "Author_Email": doc.meta.get('Author_Email', 'Unknown'),
+        "Attachment": doc.meta.get('Attachment_Title'),
+        "Also_In": doc.meta.get('alias_page_titles', [])
+    }
+
+
+def answer_documents(query: str, documents, generate: bool = True):
+    """
+    Generates an answer from each document and pairs it with the document's metadata.
+
+    Args:
+        query (str): The input query.
+        documents (List[Document]): The reranked documents.
+        generate (bool): If False, return the document content instead of calling the LLM.
+
+    Returns:
+        List[dict]: One `response` and `metadata` entry per document.
+    """
     responses = []
-    for doc in result.get('ranker', {}).get('documents', []):
-        # Generate the prompt result using the query and document content
-        prompt_result = prompting(query, doc.content)
-        
-        # Generate the response using the prompt result
-        generative_response = generative(prompt_result)
-        
-        # Extract metadata
-        metadata = {
-            "Page_Title": doc.meta.get('Page_Title', 'Unknown'),
-            "Author_Name": doc.meta.get('Author_Name', 'Unknown'),
-            "Date": doc.meta.get('Date', 'Unknown'),
-            "Page_URL": doc.meta.get('Page_URL', 'Unknown'),
-            "Author_Email": doc.meta.get('Author_Email', 'Unknown')
-        }
-        
-        # Append the response and metadata to the responses list
+    for doc in documents:
+        if generate:
+            # Generate the response from the query and document content
+            response = generative(prompting(query, doc.content), system=RETRIEVAL_SYSTEM_PROMPT, task="retrieval", query=query)
+        else:
+            response = doc.content
         responses.append({
-            "response": generative_response,
-            "metadata": metadata
+            "response": response,
+            "metadata": document_metadata(doc)
         })
+    return responses
+
+
+def run_query(query: str, filters=None):
+    """
+    Runs hybrid retrieval, reranking and generation for a query.
+
+    Args:
+        query (str): The input query.
+        filters (Optional[dict]): Haystack filters on the chunk metadata.
+
+    Returns:
+        dict: The responses and metadata for the top ranked documents.
+    """
+    return {"responses": answer_documents(query, hybrid_retrieval(query, filters))}
+
 
-    return {"responses": responses}
\ No newline at end of file
+def stream_query(query: str, filters=None):
+    """
+    Runs hybrid retrieval and reranking for a query, and returns a stream of the answer as it is generated.
+
+    Retrieval runs before this returns, so its errors (e.g. an admission 429) can still become an
+    HTTP status. The stream sends the metadata of each reranked document before its answer, so a
+    client can show the source while the model is still writing.
+
+    Args:
+        query (str): The input query.
+        filters (Optional[dict]): Haystack filters on the chunk metadata.
+
+    Returns:
+        Iterator[dict]: Events in order: a `metadata` event per document followed by its `token`
+        events (`text`), then `done`; an `error` event (`detail`) ends the stream if generation fails.
+    """
+    query_log.append(normalize_query(query), filters)
+    documents = hybrid_retrieval(query, filters)
+
+    def events():
+        for index, doc in enumerate(documents):
+            yield {"event": "metadata", "index": index, "metadata": document_metadata(doc)}
+            messages = build_messages(prompting(query, doc.content), RETRIEVAL_SYSTEM_PROMPT)
+            try:
+                for text in llm_router.stream(messages, task="retrieval", query=query):
+                    yield {"event": "token", "index": index, "text": text}
+            except Exception as e:
+                yield {"event": "error", "index": index, "detail": str(e)}
+                return
+        yield {"event": "done"}
+
+    return events()
+
+
+def retrieve_batch(queries, top_k: int = 1):
+    """
+    Runs hybrid retrieval for many queries at once: one batched embedding call, one `_msearch`
+    round trip for both BM25 and kNN (in-process searches on the local store), and cross-encoder scoring of every (query, document) pair
+    in large batches.
+
+    Args:
+        queries (List[str]): The queries.
+        top_k (int): Reranked documents to keep per query.
+
+    Returns:
+        List[List[Document]]: The reranked documents of each query, in order.
+    """
+    embeddings = embed_queries(queries)
+    selected = select_pages(embeddings) if retrieval_mode == "two_stage" else [None] * len(queries)
+    with es_limiter.slot():
+        if local_store:
+            retrieved = []
+            for query, embedding, page_ids in zip(queries, embeddings, selected):
+                filters = page_retrieval_filters(page_ids) if page_ids else None
+                retrieved.append((bm25_retriever.run(query=query, filters=filters)["documents"],
+                                  embedding_retriever.run(query_embedding=list(embedding), filters=filters)["documents"]))
+        else:
+            retrieved = msearch_hybrid(document_store.client, elasticsearch_indexname, queries, embeddings,
+                                       top_k=retriever_top_k, num_candidates=retriever_num_candidates,
+                                       oversample=vector_oversample if vector_quantization != "none" else 1.0,
+                                       rescore=vector_rescore,
+                                       filters=[es_clause(page_retrieval_filters(page_ids)) if page_ids else None for page_ids in selected])
+    joined = [document_joiner.run(documents=[sparse, dense])["documents"] for sparse, dense in retrieved]
+
+    pairs = [(query, doc.content or "") for query, docs in zip(queries, joined) for doc in docs]
+    with reranker_limiter.slot():
+        scores = rerank_pairs(ranker, pairs)
+
+    results, position = [], 0
+    for docs in joined:
+        for doc in docs:
+            doc.score = scores[position]
+            position += 1
+        results.append(sorted(docs, key=lambda doc: doc.score, reverse=True)[:top_k])
+    return results
+
+
+def run_query_batch(queries, top_k: int = 1, generate: bool = True):
+    """
+    Answers many queries, yielding each result in input order as soon as it and every earlier one are done.
+
+    Queries are retrieved in chunks of `QUERY_BATCH_CHUNK`. Answers are generated concurrently by up
+    to `QUERY_BATCH_WORKERS` threads while the next chunk is being retrieved.
+
+    Args:
+        queries (List[str]): The queries.
+        top_k (int): Reranked documents (and answers) per query.
+        generate (bool): If False, return the reranked passages without calling the LLM.
+
+    Yields:
+        dict: The `index`, `query` and either `responses` or, if retrieving or answering that query
+        failed, `error`.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=query_batch_workers) as executor:
+        for start in range(0, len(queries), query_batch_chunk):
+            chunk = queries[start:start + query_batch_chunk]
+            try:
+                retrieved = retrieve_batch(chunk, top_k)
+            except Exception as e:
+                print(f"Batch retrieval failed for queries {start}-{start + len(chunk) - 1}: {e}")
+                failed = Future()
+                failed.set_exception(e)
+                pending.extend((start + offset, query, failed) for offset, query in enumerate(chunk))
+            else:
+                for offset, (query, documents) in enumerate(zip(chunk, retrieved)):
+                    pending.append((start + offset, query, executor.submit(answer_documents, query, documents, generate)))
+            while pending and pending[0][2].done():
+                yield _batch_result(*pending.popleft())
+        while pending:
+            yield _batch_result(*pending.popleft())
+
+
+def _batch_result(index: int, query: str, future: Future) -> dict:
+    try:
+        return {"index": index, "query": query, "responses": future.result()}
+    except Exception as e:
+        return {"index": index, "query": query, "error": getattr(e, "detail", None) or str(e)}
+
+
+# Near-real-time indexing of single pages from Confluence webhooks, with the same preprocessing as embedding.py
+page_chunker = StructureChunker(tokenizer_model="BAAI/bge-m3", max_tokens=chunk_max_tokens, min_tokens=chunk_min_tokens)
+webhook_queue = DebouncedQueue(webhook_queue_path, debounce_seconds=webhook_debounce, max_delay_seconds=webhook_max_delay)
+
+
+def page_alias_chunks(page_id: str, include_attachments: bool = False):
+    """Returns the chunks of a page that stand in for other pages' collapsed duplicates."""
+    if local_store:
+        return document_store.alias_chunks([page_id], include_attachments)
+    with es_limiter.slot():
+        return alias_chunks(document_store.client, elasticsearch_indexname, [page_id], include_attachments)
+
+
+def remove_page(page_id: str, keep_ids=(), include_attachments: bool = False, stored=None):
+    """
+    Deletes the indexed chunks of a page, except those in `keep_ids`.
+
+    A chunk that holds other pages' aliases is not deleted but handed over to the first aliased
+    page, so the pages collapsed into it keep their content.
+
+    Args:
+        page_id (str): The Confluence page id.
+        keep_ids (Iterable[str]): Chunk ids to keep (the page's freshly written chunks).
+        include_attachments (bool): Whether to delete the chunks of the page's attachments too.
+        stored (Optional[List[dict]]): The page's alias-holding chunks, if already read with `page_alias_chunks`.
+
+    Returns:
+        int: The number of deleted chunks.
+    """
+    if stored is None:
+        stored = page_alias_chunks(page_id, include_attachments)
+    rehomed = rehome_aliases(stored, keep_ids)
+    keep_ids = set(keep_ids) | set(rehomed)
+    if local_store:
+        document_store.update_meta(rehomed)
+        ids = [doc_id for doc_id in document_store.page_document_ids(page_id, include_attachments) if doc_id not in keep_ids]
+        document_store.delete_documents(ids)
+        return len(ids)
+    must_not = [{"ids": {"values": list(keep_ids)}}]
+    if not include_attachments:
+        must_not.append({"exists": {"field": "Attachment_ID"}})
+    query = {"bool": {"filter": [{"term": {"Page_ID": page_id}}], "must_not": must_not}}
+    with es_limiter.slot():
+        if rehomed:
+            routing = {chunk["id"]: chunk.get("Space_Key") for chunk in stored} if space_routing else None
+            bulk_update_documents(document_store.client, elasticsearch_indexname, rehomed, routing=routing, refresh="wait_for")
+        response = document_store.client.delete_by_query(index=elasticsearch_indexname, query=query, refresh=True, conflicts="proceed")
+    return response.get("deleted", 0)
+
+
+def update_page_vector(page_id: str, documents=()):
+    """
+    Replaces the page-level vector of a page with the mean of its freshly embedded chunks, or
+    deletes it when `documents` is empty.
+
+    Args:
+        page_id (str): The Confluence page id.
+        documents (List[Document]): The page's embedded chunks.
+    """
+    pages = [page for page in page_vectors(documents) if page["Page_ID"] == page_id]
+    with es_limiter.slot():
+        if local_store:
+            page_vector_store.delete_documents([page_id])
+            page_vector_store.write_documents(page_documents(pages))
+        elif pages:
+            page_vector_store.ensure_index(vector_quantization)
+            page_vector_store.write(pages)
+        else:
+            page_vector_store.delete(page_id)
+
+
+def index_page(page_id: str, event: str = "upsert"):
+    """
+    Re-fetches, re-chunks, re-embeds and upserts a single page, or removes it.
+
+    The new chunks are written before the old ones are deleted, so the page stays searchable
+    throughout. Attachments and near-duplicate collapsing are only handled by full ingestion runs,
+    but the pages collapsed into this page's chunks by one keep their aliases: a rewritten chunk
+    takes them over, and a deleted one is handed over to the first aliased page.
+
+    Args:
+        page_id (str): The Confluence page id.
+        event (str): "upsert" or "remove".
+
+    Returns:
+        dict: The page id, the action taken and the number of chunks written and deleted.
+    """
+    page = confluence_program.get_page(page_id) if event == "upsert" else None
+    if page is None:
+        deleted = remove_page(page_id, include_attachments=True)
+        update_page_vector(page_id)
+        page_catalog.invalidate()
+        retrieval_cache.clear()
+        return {"page_id": page_id, "action": "removed", "written": 0, "deleted": deleted}
+
+    doc = build_page_docx(page["title"], page.get("body", {}).get("storage", {}).get("value", ""))
+    pair = page_pair(doc, confluence_page_metadata(page), chunker_mode)
+    documents = chunk_pairs([pair], chunker_mode, page_chunker)
+    stored = page_alias_chunks(page_id)
+    restore_aliases(documents, stored)
+    with embedder_limiter.slot():
+        embeddings = embed_texts(embadder, [document.content or "" for document in documents])
+    for document, embedding in zip(documents, embeddings):
+        document.embedding = list(embedding)
+    with es_limiter.slot():
+        if space_routing and not local_store:
+            written = bulk_write_documents(document_store.client, elasticsearch_indexname, documents,
+                                           routing_field="Space_Key", refresh="wait_for")
+        else:
+            written = document_store.write_documents(documents, policy=DuplicatePolicy.OVERWRITE)
+    deleted = remove_page(page_id, keep_ids=[document.id for document in documents], stored=stored)
+    update_page_vector(page_id, documents)
+    page_catalog.invalidate()
+    retrieval_cache.clear()
+    return {"page_id": page_id, "action": "upserted", "written": written, "deleted": deleted}
+
+
+webhook_worker = QueueWorker(webhook_queue, index_page)
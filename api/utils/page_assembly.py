@@ -0,0 +1,192 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+# Fields that describe a single chunk rather than the page it belongs to
+CHUNK_FIELDS = {"content", "embedding", "split_id", "split_idx_start", "_split_overlap", "page_number", "source_id", "id",
+                "section_path", "token_count", "alias_page_ids", "alias_page_titles", "alias_page_urls"}
+
+
+def alias_metadata(source: Dict[str, Any], page_id: str) -> Dict[str, Any]:
+    """
+    Builds the metadata of a page from a chunk that stands in for one of its collapsed duplicates.
+
+    Args:
+        source (Dict[str, Any]): The `_source` of a chunk listing `page_id` in its `alias_page_ids`.
+        page_id (str): The aliased page id.
+
+    Returns:
+        Dict[str, Any]: The page's `Page_ID`, `Page_Title` and `Page_URL`.
+    """
+    position = list(source.get("alias_page_ids") or []).index(page_id)
+    titles = source.get("alias_page_titles") or []
+    urls = source.get("alias_page_urls") or []
+    return {
+        "Page_ID": page_id,
+        "Page_Title": titles[position] if position < len(titles) else None,
+        "Page_URL": urls[position] if position < len(urls) else None,
+    }
+
+
+def _iter_hits(client, index: str, query: Dict[str, Any], page_size: int) -> Iterator[List[Dict[str, Any]]]:
+    search_after = None
+    while True:
+        body = {
+            "size": page_size,
+            "query": query,
+            "sort": [{"split_id": {"order": "asc", "unmapped_type": "long"}}, {"_doc": "asc"}],
+            "_source": {"excludes": ["embedding"]},
+        }
+        if search_after is not None:
+            body["search_after"] = search_after
+        response = client.search(index=index, **body)
+        hits = response["hits"]["hits"]
+        if not hits:
+            return
+        yield [hit["_source"] for hit in hits]
+        if len(hits) < page_size:
+            return
+        search_after = hits[-1]["sort"]
+
+
+def iter_page_hits(client, index: str, page_id: str, page_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streams the chunks of one page from Elasticsearch, one batch of hits at a time.
+
+    The page's own chunks come first, in `split_id` order. They are followed by the chunks of other
+    pages that stand in for collapsed duplicates of this page (`alias_page_ids`): their `split_id`
+    is a position in their own page, so they are appended rather than interleaved. Sorting happens
+    server-side and pagination uses `search_after`, so no batch holds more than `page_size` hits.
+    The embedding vector is excluded from `_source`, and chunks of the page's attachments are not
+    included.
+
+    Args:
+        client: The shared Elasticsearch client, or a `LocalDocumentStore`.
+        index (str): The index (or alias) to read from.
+        page_id (str): The Confluence page id to fetch.
+        page_size (int): The number of hits per request.
+
+    Yields:
+        List[Dict[str, Any]]: The `_source` of each hit in the batch.
+    """
+    if hasattr(client, "page_sources"):
+        # A LocalDocumentStore reads the page from its own table in one go
+        yield client.page_sources(page_id)
+        return
+    no_attachments = [{"exists": {"field": "Attachment_ID"}}]
+    yield from _iter_hits(client, index, {"bool": {"filter": [{"term": {"Page_ID": page_id}}], "must_not": no_attachments}}, page_size)
+    yield from _iter_hits(client, index, {"bool": {"filter": [{"term": {"alias_page_ids": page_id}}], "must_not": no_attachments}}, page_size)
+
+
+def page_metadata(client, index: str, page_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads the page-level metadata of a page from any one of its chunks.
+
+    A page whose chunks were all collapsed into other pages' chunks gets the title and URL recorded
+    on those chunks.
+
+    Args:
+        client: The shared Elasticsearch client, or a `LocalDocumentStore`.
+        index (str): The index (or alias) to read from.
+        page_id (str): The Confluence page id.
+
+    Returns:
+        Optional[Dict[str, Any]]: The page metadata, or None if the page is not indexed.
+    """
+    if hasattr(client, "page_sources"):
+        sources = client.page_sources(page_id)
+    else:
+        sources = []
+        for field in ("Page_ID", "alias_page_ids"):
+            response = client.search(
+                index=index,
+                size=1,
+                query={"bool": {"filter": [{"term": {field: page_id}}], "must_not": [{"exists": {"field": "Attachment_ID"}}]}},
+                _source={"excludes": ["embedding", "content"]},
+            )
+            sources = [hit["_source"] for hit in response["hits"]["hits"]]
+            if sources:
+                break
+    if not sources:
+        return None
+    if sources[0].get("Page_ID") != page_id:
+        return alias_metadata(sources[0], page_id)
+    return {key: value for key, value in sources[0].items() if key not in CHUNK_FIELDS}
+
+
+def strip_overlap(previous: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """
+    Removes the start of a chunk that repeats the end of the chunk before it.
+
+    Only the word splitter (`INGEST_CHUNKER=word`) makes chunks overlap, and it records each
+    overlap in the chunk's `_split_overlap` meta: the previous chunk's id and the character range
+    of the repeated text in it. Exactly that text is dropped so stitched pages read once; chunks
+    without such a record, like those of the structure chunker, are kept whole.
+
+    Args:
+        previous (Dict[str, Any]): The `_source` of the preceding chunk.
+        current (Dict[str, Any]): The `_source` of the chunk to trim.
+
+    Returns:
+        str: The content of `current` without its overlapping prefix.
+    """
+    previous_content = previous.get("content") or ""
+    content = current.get("content") or ""
+    for overlap in current.get("_split_overlap") or []:
+        if previous.get("id") is not None and overlap.get("doc_id") != previous["id"]:
+            continue
+        start, end = overlap.get("range") or (0, 0)
+        if start < end == len(previous_content) and content.startswith(previous_content[start:end]):
+            return content[end - start:].lstrip()
+    return content
+
+
+def iter_page_text(client, index: str, page_id: str, page_size: int = 100,
+                   metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Streams the de-overlapped text of a page, chunk by chunk.
+
+    Args:
+        client: The shared Elasticsearch client.
+        index (str): The index (or alias) to read from.
+        page_id (str): The Confluence page id to fetch.
+        page_size (int): The number of hits per Elasticsearch request.
+        metadata (Optional[Dict[str, Any]]): If given, filled with the page-level metadata of the first chunk
+            (or, for a page without chunks of its own, with its title and URL from an alias).
+
+    Yields:
+        str: The text of each chunk with its overlap removed.
+    """
+    previous = None
+    own = True
+    for batch in iter_page_hits(client, index, page_id, page_size):
+        for source in batch:
+            if own and source.get("Page_ID") != page_id:
+                # Chunks standing in for collapsed duplicates follow the page's own; they do not continue its last chunk
+                own, previous = False, None
+            if metadata is not None and not metadata:
+                metadata.update({key: value for key, value in source.items() if key not in CHUNK_FIELDS}
+                                if own else alias_metadata(source, page_id))
+            text = (source.get("content") or "") if previous is None else strip_overlap(previous, source)
+            previous = source
+            if text:
+                yield text
+
+
+def assemble_page(client, index: str, page_id: str, page_size: int = 100) -> Optional[Dict[str, Any]]:
+    """
+    Assembles the full text and metadata of a page from its indexed chunks.
+
+    Args:
+        client: The shared Elasticsearch client.
+        index (str): The index (or alias) to read from.
+        page_id (str): The Confluence page id to fetch.
+        page_size (int): The number of hits per Elasticsearch request.
+
+    Returns:
+        Optional[Dict[str, Any]]: The page `content`, `metadata` and `chunks` count, or None if neither the page
+        nor a chunk standing in for it is indexed.
+    """
+    metadata: Dict[str, Any] = {}
+    parts = list(iter_page_text(client, index, page_id, page_size, metadata))
+    if not metadata:
+        return None
+    return {"content": "\n".join(parts), "metadata": metadata, "chunks": len(parts)}
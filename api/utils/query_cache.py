@@ -0,0 +1,160 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache with an optional time to live.
+
+    Args:
+        maxsize (int): Entries kept; 0 disables the cache.
+        ttl (Optional[float]): Seconds an entry stays valid (None: until evicted).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class QueryLog:
+    """
+    A compact on-disk log of recent queries, one JSON line (`q`, optional `f` filters) per query.
+
+    Queries are buffered in memory and appended to the file by a background thread every
+    `flush_interval` seconds, so request handlers (including those on the event loop) never wait
+    on the disk. The file is rewritten with only the latest `max_entries` lines once it has grown
+    to twice that, so it stays bounded across restarts.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, flush_interval: float = 1.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._lines: Optional[int] = None
+        self._pending: List[str] = []
+        self._pending_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        directory = os.path.dirname(path)
+        if directory and max_entries > 0:
+            os.makedirs(directory, exist_ok=True)
+
+    def _read(self) -> List[str]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def append(self, query: str, filters: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Records a query; it is written to the file by the background thread.
+
+        Args:
+            query (str): The normalised query.
+            filters (Optional[Dict[str, Any]]): Its Haystack filters.
+        """
+        if self.max_entries <= 0:
+            return
+        entry = {"q": query, "f": filters} if filters else {"q": query}
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with self._pending_lock:
+            self._pending.append(line)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="query-log", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Failed to write the query log: {e}")
+
+    def flush(self) -> None:
+        """Appends the buffered queries to the file."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._lock:
+            if self._lines is None:
+                self._lines = len(self._read())
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in pending))
+            self._lines += len(pending)
+            if self._lines >= 2 * self.max_entries:
+                lines = self._read()[-self.max_entries:]
+                with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+                os.replace(f"{self.path}.tmp", self.path)
+                self._lines = len(lines)
+
+    def most_common(self, n: int) -> List[Tuple[str, Optional[Dict[str, Any]], int]]:
+        """
+        Returns the `n` most frequent logged queries.
+
+        Returns:
+            List[Tuple[str, Optional[Dict[str, Any]], int]]: Query, filters and count, most frequent first.
+        """
+        self.flush()
+        with self._lock:
+            lines = self._read()
+        counts = Counter()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if entry.get("q"):
+                counts[(entry["q"], json.dumps(entry.get("f"), sort_keys=True))] += 1
+        return [(query, json.loads(filters), count) for (query, filters), count in counts.most_common(n)]
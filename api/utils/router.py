@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.llm import extract_text_after_tag, percentile
+from utils.title_index import TitleIndex
+
+
+# Seed queries used to build one embedding centroid per intent
+INTENT_EXAMPLES = {
+    "Retrieval": [
+        "What is our company's vacation policy?",
+        "Provide details about our AWS infrastructure security measures.",
+        "How does our organization handle network segmentation?",
+        "How do I request access to the production database?",
+        "Which port does the billing service listen on?",
+        "Who is responsible for approving expense reports?",
+        "What are the steps to rotate the API keys?",
+        "Where are the deployment logs stored?",
+        "How do I configure the VPN on my laptop?",
+        "What is the SLA for priority one incidents?",
+    ],
+    "Summarization": [
+        "Summarize the contents of the DevOps Ramp-up Plan.",
+        "Give me a brief summary of the Technical Infrastructure FAQ.",
+        "What are the main points covered in the Employee Handbook?",
+        "Summarize the onboarding guide.",
+        "Give me an overview of the release process document.",
+        "Can you provide a summary of the security policy page?",
+        "TL;DR of the incident postmortem page.",
+        "What are the key takeaways from the architecture decision record?",
+        "Briefly summarize the quarterly roadmap.",
+        "Condense the data retention policy into a few bullet points.",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    Classifies a query as "Retrieval" or "Summarization" locally and finds the pages it refers to.
+
+    The intent comes from the nearest of two bge-m3 embedding centroids built from `INTENT_EXAMPLES`;
+    the pages come from a trigram `TitleIndex` kept in sync with the page catalog. Only when the
+    centroid margin is below `min_margin`, or a summarization request names no known page, is the
+    query sent to the LLM with the `query_analyzer` prompt, listing just the top title candidates.
+    """
+
+    def __init__(self, embed: Callable[[str], List[float]], catalog, llm: Callable[[str, str], Optional[str]],
+                 title_index: Optional[TitleIndex] = None, min_margin: float = 0.05,
+                 title_min_score: float = 0.8, prompt_candidates: int = 5,
+                 examples: Optional[Dict[str, List[str]]] = None, window: int = 1000):
+        self.embed = embed
+        self.catalog = catalog
+        self.llm = llm
+        self.title_index = title_index or TitleIndex()
+        self.min_margin = min_margin
+        self.title_min_score = title_min_score
+        self.prompt_candidates = prompt_candidates
+        self.examples = examples or INTENT_EXAMPLES
+        self._labels: List[str] = []
+        self._centroids = None
+        self._latencies = deque(maxlen=window)
+        self._requests = 0
+        self._fallbacks = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """Embeds the seed examples and builds the normalised intent centroids."""
+        if self._centroids is not None:
+            return
+        labels, centroids = [], []
+        for label, queries in self.examples.items():
+            vectors = np.array([self.embed(query) for query in queries], dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            labels.append(label)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self._labels = labels
+        self._centroids = np.stack(centroids)
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        """
+        Picks the intent whose centroid is closest to the query embedding.
+
+        Args:
+            query (str): The user query.
+
+        Returns:
+            Tuple[str, float]: The intent and its cosine-similarity margin over the runner-up.
+        """
+        self.warm_up()
+        vector = np.asarray(self.embed(query), dtype=np.float32)
+        scores = self._centroids @ (vector / np.linalg.norm(vector))
+        order = np.argsort(scores)[::-1]
+        margin = float(scores[order[0]] - scores[order[1]]) if len(order) > 1 else 1.0
+        return self._labels[order[0]], margin
+
+    def route(self, query: str) -> Dict[str, Any]:
+        """
+        Routes a query, falling back to the LLM classifier on low confidence.
+
+        Args:
+            query (str): The user query.
+
+        Returns:
+            Dict[str, Any]: The intent (`type`), matched page titles (`files`), the centroid margin,
+            whether the LLM was used (`source`) and the routing latency in milliseconds.
+        """
+        start = time.perf_counter()
+        pages = self.catalog.get()
+        self.title_index.sync((page["Page_Title"] for page in pages), version=self.catalog.version)
+        intent, margin = self.classify(query)
+        candidates = self.title_index.search(query, top_k=self.prompt_candidates)
+        files = [title for title, score in candidates if score >= self.title_min_score]
+        source = "local"
+
+        if margin < self.min_margin or (intent == "Summarization" and not files):
+            titles = [title for title, _ in candidates]
+            response = self.llm(query_analyzer(query, titles), CLASSIFIER_SYSTEM_PROMPT)
+            if response:
+                llm_intent, llm_files = check_string(extract_text_after_tag(response, "think"), titles)
+                intent = llm_intent or intent
+                files = llm_files or files
+                source = "llm"
+
+        latency = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._requests += 1
+            self._fallbacks += source == "llm"
+            self._latencies.append((latency, source))
+        return {"type": intent, "files": files, "margin": round(margin, 4), "source": source,
+                "latency_ms": round(latency, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports routing volume, LLM fallback rate and latency percentiles over the recent window.
+
+        Returns:
+            Dict[str, Any]: The routing statistics.
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+            requests, fallbacks = self._requests, self._fallbacks
+        local = [latency for latency, source in latencies if source == "local"]
+        every = [latency for latency, _ in latencies]
+        return {
+            "requests": requests,
+            "fallbacks": fallbacks,
+            "fallback_rate": round(fallbacks / requests, 4) if requests else 0.0,
+            "latency_ms": {"p50": percentile(every, 50), "p95": percentile(every, 95)},
+            "local_latency_ms": {"p50": percentile(local, 50), "p95": percentile(local, 95)},
+        }
+
+
+# Static classification instructions, sent as the system message so providers can cache the prefix
+CLASSIFIER_SYSTEM_PROMPT = """
+You are an intelligent AI assistant that classifies user queries into two categories:
+
+### **1. Retrieval Query**
+Classify the query as **Retrieval** if the user is searching for specific information, facts, or details that require looking up content from a document.  
+**Example Queries:**  
+- "What is our company's vacation policy?"  
+- "Provide details about our AWS infrastructure security measures."  
+- "How does our organization handle network segmentation?"  
+
+### **2. Summarization Query**
+Classify the query as **Summarization** if the user asks for a summary of a specific document, law, or policy.  
+**Example Queries:**  
+- "Summarize the contents of the DevOps Ramp-up Plan."  
+- "Give me a brief summary of the Technical Infrastructure FAQ."  
+- "What are the main points covered in the Employee Handbook?"  
+
+### **Filename Matching**
+Determine if the query references a document name, even partially, from the candidate list given with the query.
+A filename match should be considered **if the query directly mentions or implies content that is likely found in a specific document** (e.g., "vacation policy" relates to the Employee Handbook & Policies).  
+
+### **Response Format:**
+1. Classify the query as either `"Retrieval"` or `"Summarization"`.
+2. If a filename is matched, return the filename.
+
+#### **Example Responses:**
+- **Retrieval only:** `"Retrieval"`
+- **Summarization only:** `"Summarization"`
+- **Summarization with filename:** `"Summarization - Employee Handbook & Policies"`
+- **Retrieval with filename:** `"Retrieval - Technical Infrastructure FAQ"`
+"""
+
+
+def query_analyzer(query: str, file_names: list[str]) -> str:
+    """
+    Generates the variable part of the classification prompt: the candidate filenames and the user query.
+    The instructions are in `CLASSIFIER_SYSTEM_PROMPT`.
+
+    :param query: A string representing the user's query.
+    :param file_names: A list of strings representing filenames to check against the query.
+    :return: A string prompt for an AI assistant.
+    """
+    file_list_str = "\n".join(f"- **{file}**" for file in file_names)
+
+    prompt = f"""
+    ### **Candidate Filenames**
+    {file_list_str}
+
+    Now, analyze the following user query and classify it accordingly:
+
+    **User Query:** `{query}`
+    """
+    return prompt
+
+
+def check_string(input_string: str, file_names: List[str]) -> Tuple[Optional[str], List[str]]:
+    """
+    Check if the input string contains specific terms and which file names are mentioned.
+
+    Args:
+    - input_string (str): The string to be checked.
+    - file_names (List[str]): A list of file names to check for mentions.
+
+    Returns:
+    - Tuple[Optional[str], List[str]]: A tuple containing the found term and mentioned files.
+    """
+    contains_term = None
+    if "Retrieval" in input_string:
+        contains_term = "Retrieval"
+    elif "Summarization" in input_string:
+        contains_term = "Summarization"
+    mentioned_files = [file_name for file_name in file_names if file_name in input_string]
+
+    return contains_term, mentioned_files
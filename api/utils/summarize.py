@@ -0,0 +1,285 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.llm import extract_text_after_tag
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the LLM token count of a text (about 4 tokens for every 3 words).
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return math.ceil(len(text.split()) * 4 / 3)
+
+
+# Besides headings, tables and code blocks, about one paragraph in ANCHOR_EVERY may start a section
+ANCHOR_EVERY = 4
+
+
+def is_anchor(paragraph: str) -> bool:
+    """Whether a section may start at this paragraph, judged from the paragraph's own text only."""
+    if paragraph.startswith(("#", "[Table Start]", "[Code Block]")):
+        return True
+    return int(hashlib.sha256(paragraph.encode("utf-8")).hexdigest()[:8], 16) % ANCHOR_EVERY == 0
+
+
+def split_sections(text: str, max_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens,
+                   min_tokens: Optional[int] = None) -> List[str]:
+    """
+    Splits a page into consecutive sections of at most `max_tokens` tokens at content-defined boundaries.
+
+    A section ends before an anchor paragraph (see `is_anchor`) once it holds `min_tokens`, and
+    wherever the next paragraph would overflow the budget. Boundaries thus depend on the nearby
+    text only: an edit moves boundaries up to the next anchor at most, so the other sections keep
+    their exact text and their cached summaries. A paragraph that is larger than the budget on its
+    own is split on word boundaries.
+
+    Args:
+        text (str): The page text.
+        max_tokens (int): The token budget per section.
+        count_tokens (Callable[[str], int]): The token counter.
+        min_tokens (Optional[int]): The size from which a section ends at an anchor (default: a quarter of the budget).
+
+    Returns:
+        List[str]: The sections, in page order.
+    """
+    min_tokens = max_tokens // 4 if min_tokens is None else min_tokens
+    sections, current, current_tokens = [], [], 0
+    for paragraph in re.split(r"\n\s*\n|\n(?=#|\[Table Start\]|\[Code Block\])", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            words = paragraph.split()
+            step = max(1, int(len(words) * max_tokens / tokens))
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [paragraph]
+        anchor = is_anchor(paragraph)
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if current and (current_tokens + piece_tokens > max_tokens or (anchor and current_tokens >= min_tokens)):
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+            anchor = False
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+# Words of a plain "summarize this page" request, which asks for nothing beyond a general summary
+GENERIC_SUMMARY_WORDS = {
+    "a", "about", "all", "an", "brief", "can", "confluence", "could", "doc", "document", "for", "give", "i", "in", "is",
+    "me", "of", "on", "overview", "page", "please", "provide", "quick", "short", "summarise", "summarize", "summarization",
+    "summary", "the", "this", "tl;dr", "tldr", "want", "what", "would", "write", "you",
+}
+
+
+def is_focused_request(query: Optional[str], title: Optional[str] = None) -> bool:
+    """
+    Tells a focused summary request ("summarize the runbook's rollback steps") from a plain one
+    ("give me a summary of the runbook"), which a query-independent summary answers just as well.
+
+    Args:
+        query (Optional[str]): The user's request.
+        title (Optional[str]): The page title, whose words do not make a request focused.
+
+    Returns:
+        bool: True if the request asks about something more specific than the whole page.
+    """
+    ignored = GENERIC_SUMMARY_WORDS | set(re.findall(r"[\w;']+", (title or "").lower()))
+    return any(word not in ignored for word in re.findall(r"[\w;']+", (query or "").lower()))
+
+
+# Static instructions go in the system message so providers can cache the prompt prefix
+SECTION_SYSTEM_PROMPT = """
+You are summarizing one section of a Confluence page. Other sections are summarized separately and merged later.
+
+- Capture every fact, decision, requirement, number and name in this section; omit nothing essential.
+- Keep tables, code snippets, JSON structures and SQL queries intact or describe them precisely.
+- Do not add an introduction or conclusion and do not add information that is not in the section.
+"""
+
+PAGE_SYSTEM_PROMPT = """
+You are an expert AI assistant specializing in fact-based, structured, and professional summarization.
+Summarize the given Confluence page concisely yet comprehensively with clear headings and bullet points.
+Keep tables, code snippets, JSON structures and SQL queries intact, keep technical accuracy and key
+terminology, and do not add external information.
+"""
+
+MERGE_SYSTEM_PROMPT = """
+You are an expert AI assistant specializing in fact-based, structured, and professional summarization.
+You are given summaries of consecutive parts of a Confluence page. Merge them into one concise yet
+comprehensive summary of the whole page with clear headings and bullet points. Remove repetition, keep
+technical accuracy and key terminology, and do not add external information.
+"""
+
+
+def section_prompt(section: str, title: str) -> str:
+    prompt = f"""
+    **Page Title**:{title}
+
+    **Section Content**:{section}
+
+    **Section Summary:**
+    """
+    return prompt
+
+
+def page_prompt(content: str, title: str, query: Optional[str]) -> str:
+    prompt = f"""
+    **Page Title**:{title}
+
+    **Input Content**:{content}
+
+    **User Query**:{query or "Summarize the page."}
+
+    **Output Summary:**
+    """
+    return prompt
+
+
+def merge_prompt(partials: List[str], title: str, query: Optional[str]) -> str:
+    joined = "\n\n".join(f"### Part {i}\n{partial}" for i, partial in enumerate(partials, start=1))
+    prompt = f"""
+    **Page Title**:{title}
+
+    **Partial Summaries**:{joined}
+
+    **User Query**:{query or "Summarize the page."}
+
+    **Output Summary:**
+    """
+    return prompt
+
+
+class PartialSummaryCache:
+    """
+    An LRU cache of section summaries keyed by a hash of the model and the section content.
+
+    With a directory configured, entries are also persisted as JSON files so they survive restarts
+    and are shared by every worker pointing at the same directory.
+    """
+
+    def __init__(self, max_entries: int = 10000, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, section: str) -> str:
+        return hashlib.sha256(f"{model}\x00{section}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.directory is not None:
+            path = self.directory / f"{key}.json"
+            if path.exists():
+                summary = json.loads(path.read_text(encoding="utf-8"))["summary"]
+                self._remember(key, summary)
+                return summary
+        return None
+
+    def put(self, key: str, summary: str) -> None:
+        self._remember(key, summary)
+        if self.directory is not None:
+            (self.directory / f"{key}.json").write_text(json.dumps({"summary": summary}), encoding="utf-8")
+
+    def _remember(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes long pages by summarizing token-bounded sections concurrently (map) and merging the
+    partial summaries (reduce).
+
+    Partial summaries are cached by section content, so after a page edit only the sections whose
+    text changed are sent to the model again.
+    """
+
+    def __init__(self, generate: Callable[[str, str, str], Optional[str]], cache: Optional[PartialSummaryCache] = None,
+                 section_tokens: int = 3000, max_workers: int = 4):
+        self.generate = generate
+        self.cache = cache or PartialSummaryCache()
+        self.section_tokens = section_tokens
+        self.max_workers = max_workers
+
+    def _summarize_section(self, section: str, title: str, model: str) -> Dict[str, Any]:
+        key = self.cache.key(model, section)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"summary": cached, "cached": True}
+        response = self.generate(section_prompt(section, title), model, SECTION_SYSTEM_PROMPT)
+        if response is None:
+            raise RuntimeError("Unable to get a section summary from the model.")
+        summary = extract_text_after_tag(response, "think")
+        self.cache.put(key, summary)
+        return {"summary": summary, "cached": False}
+
+    def _reduce(self, partials: List[str], title: str, query: Optional[str], model: str) -> str:
+        # Merge in groups that fit the budget until a single prompt can hold every partial
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > self.section_tokens:
+            groups = split_sections("\n\n".join(partials), self.section_tokens)
+            if len(groups) >= len(partials):
+                break
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                partials = list(executor.map(lambda group: self._summarize_section(group, title, model)["summary"], groups))
+        response = self.generate(merge_prompt(partials, title, query), model, MERGE_SYSTEM_PROMPT)
+        if response is None:
+            raise RuntimeError("Unable to merge the section summaries.")
+        return extract_text_after_tag(response, "think")
+
+    def summarize(self, content: str, query: Optional[str], title: str, model: str) -> Dict[str, Any]:
+        """
+        Summarizes a page.
+
+        Args:
+            content (str): The full page text.
+            query (Optional[str]): The user's request, used when merging the partial summaries.
+            title (str): The page title.
+            model (str): The model name.
+
+        Returns:
+            Dict[str, Any]: The `summary`, the number of `sections` and how many were served from the cache.
+        """
+        sections = split_sections(content, self.section_tokens) or [""]
+        if len(sections) == 1:
+            response = self.generate(page_prompt(sections[0], title, query), model, PAGE_SYSTEM_PROMPT)
+            if response is None:
+                raise RuntimeError("Unable to get a summary from the model.")
+            return {"summary": extract_text_after_tag(response, "think"), "sections": 1, "cached_sections": 0}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            partials = list(executor.map(lambda section: self._summarize_section(section, title, model), sections))
+        summary = self._reduce([partial["summary"] for partial in partials], title, query, model)
+        return {
+            "summary": summary,
+            "sections": len(sections),
+            "cached_sections": sum(partial["cached"] for partial in partials),
+        }
@@ -0,0 +1,187 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def normalize_title(text: str) -> str:
+    """
+    Lower-cases the text and collapses every run of non-alphanumeric characters into a single space.
+
+    Args:
+        text (str): The text to normalise.
+
+    Returns:
+        str: The normalised text.
+    """
+    return re.sub(r"[^0-9a-z]+", " ", text.lower()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns the set of character trigrams of the normalised, space-padded text.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        Set[str]: The trigrams.
+    """
+    padded = f" {normalize_title(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    A trigram inverted index over page titles for fuzzy, ranked title lookup.
+
+    A title scores by the IDF-weighted fraction of its trigrams that also occur in the query, so a
+    query that mentions a title (even with small typos or different punctuation) ranks it near 1.0.
+    Only trigrams found in at most `max_df_ratio` of the titles (or `min_stop_df` of them, if more)
+    make a title a candidate; common ones such as " th" just add their weight. Ties go to the title
+    with more weight, so a specific title beats a generic one it contains ("Work From Home Policy"
+    over "Home"). Postings are scored as numpy arrays of title ids.
+
+    IDF values are a snapshot: `add` and `remove` only touch the postings and weight of their own
+    title, and the snapshot (with every title weight) is rebuilt once the number of titles has
+    drifted by more than `rebuild_drift` from it. Scores and weights always use the same snapshot,
+    so a title fully contained in the query still scores 1.0 between rebuilds. `sync` applies only
+    the difference between the indexed titles and a new catalog.
+    """
+
+    def __init__(self, max_df_ratio: float = 0.02, min_stop_df: int = 50, rebuild_drift: float = 0.1):
+        self.version = None
+        self.max_df_ratio = max_df_ratio
+        self.min_stop_df = min_stop_df
+        self.rebuild_drift = rebuild_drift
+        self._ids: Dict[str, int] = {}
+        self._titles: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._idf: Dict[str, float] = {}
+        self._weights = np.zeros(64)
+        self._snapshot_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def _gram_idf(self, gram: str) -> float:
+        return math.log(1 + len(self._grams) / (1 + len(self._postings.get(gram, ()))))
+
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._arrays.get(gram)
+        if array is None:
+            array = self._arrays[gram] = np.fromiter(self._postings[gram], dtype=np.int64)
+        return array
+
+    def _add(self, title: str) -> None:
+        if title in self._grams:
+            return
+        if self._free:
+            title_id = self._free.pop()
+            self._titles[title_id] = title
+        else:
+            title_id = len(self._titles)
+            self._titles.append(title)
+            if title_id >= len(self._weights):
+                self._weights = np.concatenate([self._weights, np.zeros(len(self._weights))])
+        self._ids[title] = title_id
+        grams = trigrams(title)
+        self._grams[title] = grams
+        for gram in grams:
+            self._postings[gram].add(title_id)
+            self._arrays.pop(gram, None)
+            if gram not in self._idf:
+                self._idf[gram] = self._gram_idf(gram)
+        self._weights[title_id] = sum(self._idf[gram] for gram in grams)
+
+    def _remove(self, title: str) -> None:
+        if title not in self._grams:
+            return
+        title_id = self._ids.pop(title)
+        for gram in self._grams.pop(title):
+            postings = self._postings[gram]
+            postings.discard(title_id)
+            self._arrays.pop(gram, None)
+            if not postings:
+                del self._postings[gram]
+                del self._idf[gram]
+        self._titles[title_id] = None
+        self._weights[title_id] = 0.0
+        self._free.append(title_id)
+
+    def _maybe_rebuild(self) -> None:
+        if abs(len(self._grams) - self._snapshot_size) <= self.rebuild_drift * self._snapshot_size:
+            return
+        self._snapshot_size = len(self._grams)
+        self._idf = {gram: self._gram_idf(gram) for gram in self._postings}
+        for title, grams in self._grams.items():
+            self._weights[self._ids[title]] = sum(self._idf[gram] for gram in grams)
+
+    def add(self, title: str) -> None:
+        with self._lock:
+            self._add(title)
+            self._maybe_rebuild()
+
+    def remove(self, title: str) -> None:
+        with self._lock:
+            self._remove(title)
+            self._maybe_rebuild()
+
+    def sync(self, titles: Iterable[str], version: Optional[int] = None) -> None:
+        """
+        Brings the index in line with a catalog by adding new titles and removing missing ones.
+
+        Args:
+            titles (Iterable[str]): The complete current list of titles.
+            version (Optional[int]): The catalog version; the call is a no-op when it matches the
+                version of the last sync.
+        """
+        if version is not None and version == self.version:
+            return
+        wanted = set(titles)
+        with self._lock:
+            for title in set(self._grams) - wanted:
+                self._remove(title)
+            for title in wanted - set(self._grams):
+                self._add(title)
+            self._maybe_rebuild()
+        self.version = version
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Ranks the indexed titles by how much of each one appears in the query.
+
+        Args:
+            query (str): The user query.
+            top_k (int): The maximum number of candidates to return.
+            min_score (float): Candidates scoring below this value (0..1) are dropped.
+
+        Returns:
+            List[Tuple[str, float]]: (title, score) pairs, best first.
+        """
+        with self._lock:
+            scores = np.zeros(len(self._titles))
+            candidate = np.zeros(len(self._titles), dtype=bool)
+            scan_limit = max(self.min_stop_df, self.max_df_ratio * len(self._grams))
+            for gram in trigrams(query):
+                postings = self._postings.get(gram)
+                if not postings:
+                    continue
+                ids = self._posting_array(gram)
+                scores[ids] += self._idf[gram]
+                if len(postings) <= scan_limit:
+                    candidate[ids] = True
+            ids = np.flatnonzero(candidate)
+            weights = self._weights[ids]
+            ratios = np.round(scores[ids] / weights, 4)
+            keep = ratios >= min_score
+            ids, weights, ratios = ids[keep], weights[keep], ratios[keep]
+            order = np.lexsort((-weights, -ratios))[:top_k]
+            return [(self._titles[ids[i]], float(ratios[i])) for i in order]
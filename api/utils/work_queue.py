@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class DebouncedQueue:
+    """
+    A durable queue of page ids backed by SQLite, with one pending entry per page.
+
+    Enqueueing a page that is already pending replaces its event and pushes its due time back by
+    `debounce_seconds`, so a burst of edits to one page is processed once, after the burst ends. A
+    page that keeps changing is still processed `max_delay_seconds` after its first event.
+    Entries survive restarts; an entry is only removed once it has been processed and no newer
+    event arrived meanwhile.
+    """
+
+    def __init__(self, path: str, debounce_seconds: float = 5.0, max_delay_seconds: float = 60.0, max_attempts: int = 5):
+        self.path = path
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " page_id TEXT PRIMARY KEY, event TEXT NOT NULL, due_at REAL NOT NULL,"
+            " enqueued_at REAL NOT NULL, revision INTEGER NOT NULL DEFAULT 0,"
+            " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+        )
+
+    def enqueue(self, page_id: str, event: str) -> None:
+        """
+        Adds a page to the queue, or debounces it if it is already pending.
+
+        Args:
+            page_id (str): The Confluence page id.
+            event (str): "upsert" or "remove".
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending (page_id, event, due_at, enqueued_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET event = excluded.event, attempts = 0, revision = pending.revision + 1,"
+                " due_at = MIN(excluded.due_at, pending.enqueued_at + ?)",
+                (page_id, event, now + self.debounce_seconds, now, self.max_delay_seconds),
+            )
+
+    def next_due(self) -> Optional[Dict[str, Any]]:
+        """Returns the pending entry that has been due the longest, or None if nothing is due."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_id, event, due_at, enqueued_at, revision, attempts FROM pending WHERE due_at <= ? ORDER BY due_at LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("page_id", "event", "due_at", "enqueued_at", "revision", "attempts"), row))
+
+    def done(self, entry: Dict[str, Any]) -> None:
+        """Removes a processed entry unless a newer event for the page arrived while it was processed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pending WHERE page_id = ? AND revision = ?", (entry["page_id"], entry["revision"]))
+
+    def failed(self, entry: Dict[str, Any], error: str) -> None:
+        """Reschedules a failed entry with exponential backoff, dropping it after `max_attempts`."""
+        attempts = entry["attempts"] + 1
+        with self._lock:
+            if attempts >= self.max_attempts:
+                self._conn.execute("DELETE FROM pending WHERE page_id = ? AND revision = ?", (entry["page_id"], entry["revision"]))
+                return
+            self._conn.execute(
+                "UPDATE pending SET attempts = ?, due_at = ?, last_error = ? WHERE page_id = ? AND revision = ?",
+                (attempts, time.time() + self.debounce_seconds * 2 ** attempts, error, entry["page_id"], entry["revision"]),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, due, oldest = self._conn.execute(
+                "SELECT COUNT(*), SUM(due_at <= ?), MIN(enqueued_at) FROM pending", (time.time(),)
+            ).fetchone()
+        return {"pending": pending, "due": due or 0, "oldest_age_s": time.time() - oldest if oldest else None}
+
+
+class QueueWorker:
+    """
+    Processes due queue entries one at a time on a background thread.
+
+    Args:
+        queue (DebouncedQueue): The queue to drain.
+        process (Callable[[str, str], Any]): Called with the page id and event of each entry.
+        poll_interval (float): Seconds to sleep when nothing is due.
+    """
+
+    def __init__(self, queue: DebouncedQueue, process: Callable[[str, str], Any], poll_interval: float = 1.0):
+        self.queue = queue
+        self.process = process
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.processed = 0
+        self.failures = 0
+        self.last_latency: Optional[float] = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="queue-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            entry = self.queue.next_due()
+            if entry is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                self.process(entry["page_id"], entry["event"])
+            except Exception as e:
+                print(f"Failed to process {entry['event']} of page {entry['page_id']}: {e}")
+                self.failures += 1
+                self.queue.failed(entry, str(e))
+            else:
+                self.processed += 1
+                # Time from the first event of the burst until the page was searchable
+                self.last_latency = time.time() - entry["enqueued_at"]
+                self.queue.done(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.queue.stats(),
+            "processed": self.processed,
+            "failures": self.failures,
+            "last_latency_s": self.last_latency,
+        }
@@ -0,0 +1,90 @@
+import hashlib
+import hmac
+import json
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from utils.modules import webhook_queue, webhook_worker
+
+router = APIRouter()
+webhook_secret = os.getenv("CONFLUENCE_WEBHOOK_SECRET")
+
+# Confluence webhook events and the queue action each one triggers
+EVENT_ACTIONS = {
+    "page_created": "upsert",
+    "page_updated": "upsert",
+    "page_restored": "upsert",
+    "page_moved": "upsert",
+    "page_removed": "remove",
+    "page_trashed": "remove",
+}
+
+
+@router.on_event("startup")
+def start_webhook_worker():
+    webhook_worker.start()
+
+
+@router.on_event("shutdown")
+def stop_webhook_worker():
+    webhook_worker.stop()
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> None:
+    """
+    Checks the `X-Hub-Signature` HMAC of a webhook when `CONFLUENCE_WEBHOOK_SECRET` is set.
+
+    Raises:
+        HTTPException: 401 if the signature is missing or does not match.
+    """
+    if not webhook_secret:
+        return
+    expected = "sha256=" + hmac.new(webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    if not signature or not hmac.compare_digest(signature, expected):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature.")
+
+
+@router.post("/webhooks/confluence", status_code=202)
+async def confluence_webhook(request: Request, event: Optional[str] = None):
+    """
+    Endpoint for Confluence `page_created`, `page_updated` and `page_removed` webhooks.
+
+    The page id is put on the durable, debounced indexing queue and the request returns
+    immediately; the background worker re-indexes the page once its edits settle.
+
+    Args:
+        request (Request): The webhook request.
+        event (Optional[str]): The event name, if the webhook URL carries it instead of the payload.
+
+    Returns:
+        dict: The queued page id and action, or why the event was ignored.
+    """
+    body = await request.body()
+    verify_signature(body, request.headers.get("x-hub-signature"))
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Webhook body is not valid JSON.")
+
+    event = payload.get("event") or request.headers.get("x-event-key") or event
+    action = EVENT_ACTIONS.get(event)
+    if action is None:
+        return {"queued": False, "reason": f"Ignored event {event!r}."}
+    page_id = (payload.get("page") or {}).get("id") or payload.get("page_id")
+    if not page_id:
+        raise HTTPException(status_code=400, detail="Webhook payload has no page id.")
+
+    webhook_queue.enqueue(str(page_id), action)
+    return {"queued": True, "page_id": str(page_id), "action": action}
+
+
+@router.get("/webhooks/stats/")
+def webhook_stats():
+    """
+    Endpoint reporting the indexing queue depth and worker progress.
+
+    Returns:
+        dict: Pending and due pages, processed and failed counts and the latest edit-to-index latency.
+    """
+    return webhook_worker.stats()
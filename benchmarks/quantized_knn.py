@@ -0,0 +1,143 @@
+"""
+Measures kNN recall@k and latency of a quantized chunk index against a float32 copy.
+
+The float index is copied (with `_reindex`) into one index per quantization, the exact top-k
+of every query is computed by brute force on the float index, and each configuration is
+compared against it:
+
+    python -m benchmarks.quantized_knn --queries-file queries.txt --quantizations int8 binary
+
+Without `--queries-file`, stored chunk vectors are sampled and used as queries.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+from docstore.utils.vector_index import document_mapping, knn_body
+
+load_dotenv()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def build_quantized_copy(client, source, quantization, dims):
+    """Creates `<source>-<quantization>` with the quantized mapping and reindexes the float index into it."""
+    target = f"{source}-{quantization}"
+    if not client.indices.exists(index=target):
+        client.indices.create(index=target, mappings=document_mapping(quantization, dims=dims))
+        client.reindex(source={"index": source}, dest={"index": target}, wait_for_completion=True, request_timeout=3600)
+        client.indices.refresh(index=target)
+        client.indices.forcemerge(index=target, max_num_segments=1, request_timeout=3600)
+    return target
+
+
+def sample_query_vectors(client, index, count, seed):
+    response = client.search(
+        index=index,
+        size=count,
+        query={"function_score": {"query": {"match_all": {}}, "random_score": {"seed": seed, "field": "_seq_no"}}},
+        _source=["embedding"],
+    )
+    return [hit["_source"]["embedding"] for hit in response["hits"]["hits"]]
+
+
+def embed_queries(path, model):
+    from sentence_transformers import SentenceTransformer
+
+    with open(path, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    return SentenceTransformer(model).encode(queries, normalize_embeddings=True).tolist()
+
+
+def exact_top_k(client, index, embedding, k):
+    response = client.search(
+        index=index,
+        size=k,
+        query={"script_score": {
+            "query": {"match_all": {}},
+            "script": {"source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0", "params": {"query_vector": embedding}},
+        }},
+        _source=False,
+    )
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+def run_config(client, index, vectors, truth, k, num_candidates, oversample, rescore):
+    recalls, latencies, took = [], [], []
+    for embedding, expected in zip(vectors, truth):
+        body = knn_body(embedding, k, num_candidates, oversample, rescore)
+        body["_source"] = False
+        start = time.perf_counter()
+        response = client.search(index=index, **body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        took.append(response["took"])
+        found = {hit["_id"] for hit in response["hits"]["hits"]}
+        recalls.append(len(found & set(expected)) / max(1, len(expected)))
+    return {
+        "index": index,
+        "oversample": oversample,
+        "rescore": rescore,
+        f"recall@{k}": sum(recalls) / len(recalls),
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)},
+        "es_took_ms": {"p50": percentile(took, 50), "p95": percentile(took, 95)},
+    }
+
+
+def index_size(client, index):
+    stats = client.indices.stats(index=index, metric="store")
+    return stats["indices"][index]["primaries"]["store"]["size_in_bytes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--float-index", default=os.getenv("ELASTICSEARCH_INDEXNAME"),
+                        help="Index holding float32 (hnsw) vectors; defaults to ELASTICSEARCH_INDEXNAME.")
+    parser.add_argument("--quantizations", nargs="+", default=["int8", "int4", "binary"])
+    parser.add_argument("--queries-file", help="One query per line, embedded with --model.")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--sample", type=int, default=200, help="Stored vectors to use as queries without --queries-file.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", type=int, default=100)
+    parser.add_argument("--oversample", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    client = Elasticsearch(
+        os.getenv("ELASTICSEARCH_URL"),
+        basic_auth=(os.getenv("ELASTICSEARCH_USERNAME"), os.getenv("ELASTICSEARCH_PASSWORD")),
+        verify_certs=False,
+        request_timeout=120,
+    )
+
+    if args.queries_file:
+        vectors = embed_queries(args.queries_file, args.model)
+    else:
+        vectors = sample_query_vectors(client, args.float_index, args.sample, args.seed)
+    random.Random(args.seed).shuffle(vectors)
+    truth = [exact_top_k(client, args.float_index, embedding, args.k) for embedding in vectors]
+
+    results = [run_config(client, args.float_index, vectors, truth, args.k, args.num_candidates, 1.0, False)]
+    results[0]["size_bytes"] = index_size(client, args.float_index)
+    for quantization in args.quantizations:
+        index = build_quantized_copy(client, args.float_index, quantization, args.dims)
+        for oversample in args.oversample:
+            for rescore in (False, True):
+                result = run_config(client, index, vectors, truth, args.k, args.num_candidates, oversample, rescore)
+                result["quantization"] = quantization
+                result["size_bytes"] = index_size(client, index)
+                results.append(result)
+
+    print(json.dumps({"queries": len(vectors), "k": args.k, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
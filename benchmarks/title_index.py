@@ -0,0 +1,123 @@
+"""
+Measures `TitleIndex` sync and search latency, and how often titles are matched, as the catalog grows.
+
+A synthetic catalog is generated for each size: titles of one to six words drawn from a Zipf-like
+vocabulary, plus a few generic one-word titles ("Overview", "Home", ...). Two query sets are run:
+queries that mention a title (with one typo in half of them), and unrelated queries from other
+words. For each minimum score, the report gives the share of mentioned titles found as the top
+candidate and among the five candidates kept (the synthetic catalog has many titles contained in
+others, so a typo often turns a shorter title into the exact match), and the share of unrelated
+queries that matched any title:
+
+    python -m benchmarks.title_index --sizes 5000 20000 --min-scores 0.5 0.6 0.75 0.9
+"""
+import argparse
+import json
+import random
+import time
+
+from api.utils.title_index import TitleIndex
+
+GENERIC_TITLES = ["Overview", "Home", "FAQ", "Index", "Roadmap", "Notes", "Archive", "Glossary"]
+FILLERS = ["how", "do", "i", "what", "is", "the", "our", "for", "a", "to", "can", "you", "summarize", "explain", "about", "with"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def make_word(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return "".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+
+
+def make_catalog(rng, size, vocabulary):
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    titles = set(GENERIC_TITLES)
+    while len(titles) < size:
+        words = rng.choices(vocabulary, weights=weights, k=rng.randint(1, 6))
+        titles.add(" ".join(word.capitalize() for word in words))
+    return sorted(titles)
+
+
+def typo(rng, text):
+    position = rng.randrange(len(text))
+    return text[:position] + text[position + 1:]
+
+
+def timed_search(index, query, top_k=5):
+    start = time.perf_counter()
+    results = index.search(query, top_k=top_k)
+    return results, (time.perf_counter() - start) * 1000
+
+
+def run(args, size):
+    rng = random.Random(args.seed)
+    vocabulary = [make_word(rng) for _ in range(args.vocabulary)]
+    titles = make_catalog(rng, size, vocabulary[:len(vocabulary) // 2])
+    # Unrelated queries use the other half of the vocabulary, plus the usual question words
+    unrelated_words = vocabulary[len(vocabulary) // 2:] + ["review", "homework", "overall", "notebook", "indexing"]
+
+    index = TitleIndex()
+    start = time.perf_counter()
+    index.sync(titles, version=1)
+    sync_ms = (time.perf_counter() - start) * 1000
+
+    mentioned = []
+    for _ in range(args.queries):
+        title = rng.choice(titles)
+        text = typo(rng, title) if rng.random() < 0.5 and len(title) > 8 else title
+        mentioned.append((title, f"{' '.join(rng.sample(FILLERS, 3))} {text} {' '.join(rng.sample(FILLERS, 2))}"))
+    unrelated = [" ".join(rng.sample(FILLERS, 3) + rng.sample(unrelated_words, 3)) for _ in range(args.queries)]
+
+    _, first_ms = timed_search(index, mentioned[0][1])
+    mentioned_results, latencies = [], []
+    for title, query in mentioned:
+        results, elapsed = timed_search(index, query)
+        mentioned_results.append((title, results))
+        latencies.append(elapsed)
+    unrelated_results = []
+    for query in unrelated:
+        results, elapsed = timed_search(index, query)
+        unrelated_results.append(results)
+        latencies.append(elapsed)
+
+    # Latency of one search right after a single-title update (no snapshot rebuild)
+    index.add("Freshly Added Page")
+    _, after_add_ms = timed_search(index, mentioned[1][1])
+
+    thresholds = {}
+    for min_score in args.min_scores:
+        found = sum(bool(results) and results[0][0] == title and results[0][1] >= min_score for title, results in mentioned_results)
+        kept = sum(any(candidate == title and score >= min_score for candidate, score in results) for title, results in mentioned_results)
+        false = sum(bool(results) and results[0][1] >= min_score for results in unrelated_results)
+        thresholds[str(min_score)] = {
+            "top1_found": round(found / len(mentioned_results), 4),
+            "top5_found": round(kept / len(mentioned_results), 4),
+            "unrelated_matched": round(false / len(unrelated_results), 4),
+        }
+    return {
+        "titles": len(titles),
+        "sync_ms": round(sync_ms, 2),
+        "first_search_ms": round(first_ms, 3),
+        "search_after_add_ms": round(after_add_ms, 3),
+        "search_ms": {"p50": round(percentile(latencies, 50), 3), "p95": round(percentile(latencies, 95), 3),
+                      "p99": round(percentile(latencies, 99), 3)},
+        "min_score": thresholds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--min-scores", type=float, nargs="+", default=[0.5, 0.6, 0.75, 0.9])
+    parser.add_argument("--queries", type=int, default=500, help="Queries per query set.")
+    parser.add_argument("--vocabulary", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    print(json.dumps({str(size): run(args, size) for size in args.sizes}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Measures kNN recall@k and latency of flat chunk retrieval against two-stage retrieval
+(page vectors first, then chunk kNN restricted to the selected pages) as the corpus grows.
+
+A synthetic corpus of clustered vectors is generated for each size: pages belong to topics,
+chunks scatter around their page, and queries are perturbed chunks. Each size gets a chunk
+index and a page vector index, the exact top-k of every query is computed by brute force,
+and each configuration is compared against it:
+
+    python -m benchmarks.two_stage_retrieval --sizes 10000 100000 1000000 --top-pages 10 20 50
+
+Pass `--dims 1024` for bge-m3-sized vectors (the 1M corpus then needs about 4 GB of disk per copy).
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch, helpers
+
+from benchmarks.quantized_knn import index_size, percentile
+from docstore.utils.index_lifecycle import create_build_index, finalize_index
+from docstore.utils.page_index import PageVectorIndex, page_filter, page_mapping
+from docstore.utils.vector_index import document_mapping, knn_body
+
+load_dotenv()
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def page_chunks(args, page):
+    """Regenerates the chunk vectors of one page deterministically, so the corpus never has to fit in memory."""
+    topic = normalize(np.random.default_rng([args.seed, 1, page % args.topics]).standard_normal(args.dims))
+    rng = np.random.default_rng([args.seed, 2, page])
+    centre = normalize(topic + args.page_spread * rng.standard_normal(args.dims) / np.sqrt(args.dims))
+    noise = rng.standard_normal((args.chunks_per_page, args.dims)) / np.sqrt(args.dims)
+    return normalize(centre + args.chunk_spread * noise).astype(np.float32)
+
+
+def build_indices(client, args, size):
+    """Creates and loads `<prefix>-<size>` (chunks) and `<prefix>-<size>-pages` unless they already exist."""
+    chunk_index, page_index = f"{args.prefix}-{size}", f"{args.prefix}-{size}-pages"
+    pages = size // args.chunks_per_page
+    if client.indices.exists(index=chunk_index) and client.indices.exists(index=page_index):
+        return chunk_index, page_index
+
+    create_build_index(client, chunk_index, document_mapping(args.quantization, dims=args.dims))
+    create_build_index(client, page_index, page_mapping(args.quantization, dims=args.dims))
+
+    def actions():
+        for page in range(pages):
+            vectors = page_chunks(args, page)
+            for i, vector in enumerate(vectors):
+                yield {"_index": chunk_index, "_id": f"{page}-{i}", "_source": {"Page_ID": str(page), "embedding": vector.tolist()}}
+            mean = normalize(vectors.mean(axis=0))
+            yield {"_index": page_index, "_id": str(page), "_source": {"Page_ID": str(page), "chunks": len(vectors), "embedding": mean.tolist()}}
+
+    helpers.bulk(client, actions(), chunk_size=1000, request_timeout=600)
+    for index in (chunk_index, page_index):
+        finalize_index(client, index, replicas=0)
+    return chunk_index, page_index
+
+
+def make_queries(args, size):
+    rng = np.random.default_rng([args.seed, 3, size])
+    pages = size // args.chunks_per_page
+    sampled = [(int(page), int(rng.integers(args.chunks_per_page))) for page in rng.integers(pages, size=args.queries)]
+    vectors = np.stack([page_chunks(args, page)[i] for page, i in sampled])
+    noise = rng.standard_normal(vectors.shape) / np.sqrt(args.dims)
+    return normalize(vectors + args.query_spread * noise).astype(np.float32)
+
+
+def exact_top_k(args, size, queries, k, block_pages=1000):
+    """Brute-force top-k chunk ids of every query over the regenerated corpus."""
+    pages = size // args.chunks_per_page
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, pages, block_pages):
+        block = np.concatenate([page_chunks(args, page) for page in range(start, min(pages, start + block_pages))])
+        scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(len(block)) + start * args.chunks_per_page, (len(queries), len(block)))], axis=1)
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores, best_ids = np.take_along_axis(scores, keep, 1), np.take_along_axis(ids, keep, 1)
+    return [{f"{i // args.chunks_per_page}-{i % args.chunks_per_page}" for i in row} for row in best_ids]
+
+
+def run_config(client, chunk_index, page_index, queries, truth, args, top_pages=None):
+    pages = PageVectorIndex(client, page_index)
+    recalls, latencies, took = [], [], []
+    for embedding, expected in zip(queries, truth):
+        embedding = embedding.tolist()
+        start = time.perf_counter()
+        filters, es_took = None, 0
+        if top_pages:
+            response = client.search(index=page_index, **pages.search_body(embedding, top_pages, args.page_candidates))
+            es_took += response["took"]
+            filters = [page_filter([hit["_source"]["Page_ID"] for hit in response["hits"]["hits"]])]
+        body = knn_body(embedding, args.k, args.num_candidates, args.oversample, args.rescore, filters)
+        body["_source"] = False
+        response = client.search(index=chunk_index, **body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        took.append(es_took + response["took"])
+        found = {hit["_id"] for hit in response["hits"]["hits"]}
+        recalls.append(len(found & expected) / len(expected))
+    return {
+        "mode": "two_stage" if top_pages else "flat",
+        "top_pages": top_pages,
+        f"recall@{args.k}": sum(recalls) / len(recalls),
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)},
+        "es_took_ms": {"p50": percentile(took, 50), "p95": percentile(took, 95)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Corpus sizes in chunks.")
+    parser.add_argument("--top-pages", type=int, nargs="+", default=[10, 20, 50], help="Pages kept by the first stage.")
+    parser.add_argument("--prefix", default="bench-two-stage")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--quantization", default="int8")
+    parser.add_argument("--chunks-per-page", type=int, default=25)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--page-spread", type=float, default=1.0, help="Spread of pages around their topic.")
+    parser.add_argument("--chunk-spread", type=float, default=1.0, help="Spread of chunks around their page.")
+    parser.add_argument("--query-spread", type=float, default=0.7, help="Noise added to the chunks used as queries.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", type=int, default=100)
+    parser.add_argument("--page-candidates", type=int, default=100)
+    parser.add_argument("--oversample", type=float, default=1.0)
+    parser.add_argument("--rescore", action="store_true")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark indices afterwards.")
+    args = parser.parse_args()
+
+    client = Elasticsearch(
+        os.getenv("ELASTICSEARCH_URL"),
+        basic_auth=(os.getenv("ELASTICSEARCH_USERNAME"), os.getenv("ELASTICSEARCH_PASSWORD")),
+        verify_certs=False,
+        request_timeout=120,
+    )
+
+    report = []
+    for size in args.sizes:
+        chunk_index, page_index = build_indices(client, args, size)
+        queries = make_queries(args, size)
+        truth = exact_top_k(args, size, queries, args.k)
+        results = [run_config(client, chunk_index, page_index, queries, truth, args)]
+        results += [run_config(client, chunk_index, page_index, queries, truth, args, top_pages) for top_pages in args.top_pages]
+        report.append({"chunks": size, "pages": size // args.chunks_per_page,
+                       "size_bytes": index_size(client, chunk_index) + index_size(client, page_index), "results": results})
+        if args.cleanup:
+            client.indices.delete(index=[chunk_index, page_index])
+
+    print(json.dumps({"queries": args.queries, "k": args.k, "dims": args.dims, "report": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
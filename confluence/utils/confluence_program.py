@@ -17,6 +17,8 @@ confluence_api_token = os.getenv('CONFLUENCE_API_TOKEN')
 confluence_username = os.getenv('CONFLUENCE_USERNAME')
 confluence_url = os.getenv('CONFLUENCE_URL')
 confluence_space_key = os.getenv('SPACE_KEY')
+# SPACE_KEY may list several spaces, separated by commas
+confluence_space_keys = [key.strip() for key in (confluence_space_key or '').split(',') if key.strip()]
 confluence_user_email = os.getenv('USER_EMAIL')
 
 
@@ -35,6 +37,27 @@ def list_spaces():
         print(f"Failed to retrieve spaces. Status code: {response.status_code}")
         print(response.text)
 
+def space_keys(space_type='global', limit=100, session=None):
+    """
+    Lists the keys of every space of a type ('global' or 'personal', None for all), following the API's pagination.
+    """
+    url = f"{confluence_url}/space"
+    http = session or requests
+    keys = []
+    start = 0
+    while True:
+        params = {'start': start, 'limit': limit}
+        if space_type:
+            params['type'] = space_type
+        response = http.get(url, headers=HEADERS, params=params, auth=AUTH, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        results = data.get('results', [])
+        keys.extend(space['key'] for space in results)
+        if not results or 'next' not in data.get('_links', {}):
+            return keys
+        start += len(results)
+
 def delete_page(page_id: str) -> None:
     url = f"{confluence_url}/content/{page_id}"
     response = requests.delete(url, headers=HEADERS, auth=AUTH)
@@ -44,79 +67,95 @@ def delete_page(page_id: str) -> None:
         print(f"Failed to delete page with ID {page_id}. Status code: {response.status_code}")
         print(response.text)
 
-def retrieve_confluence_pages():
+def iter_space_pages(space_key, limit=100, session=None):
     """
-    Retrieves and displays Confluence pages from a specified space using the Confluence REST API.
-    Uses environment variables for authentication and configuration.
+    Yields every page of a space, expanded like `get_page`, following the API's pagination.
+
+    Only one response of `limit` pages is held at a time. Request errors are raised, so a caller
+    that checkpoints its progress can simply be rerun.
     """
-    
-    if not all([confluence_api_token, confluence_username, confluence_url, confluence_space_key, confluence_user_email]):
-        print("Missing one or more environment variables.")
-        return
+    url = f"{confluence_url}/content"
+    http = session or requests
+    start = 0
+    while True:
+        params = {
+            'spaceKey': space_key,
+            'type': 'page',
+            'expand': 'body.storage,version,space,ancestors,metadata.labels',
+            'start': start,
+            'limit': limit,
+        }
+        response = http.get(url, headers=HEADERS, params=params, auth=AUTH, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+        results = data.get('results', [])
+        yield from results
+        if not results or 'next' not in data.get('_links', {}):
+            return
+        start += len(results)
 
-    params = {
-        "spaceKey": confluence_space_key,
-        "expand": "body.storage,version",
-        "limit": 100,
-        "start": 0,
+def page_facets(page):
+    """
+    Extracts the filterable facets of a page expanded with `version`, `space`, `ancestors` and
+    `metadata.labels`: the raw `version.when` timestamp, space key, label names and ancestor ids.
+    """
+    return {
+        'when': page['version'].get('when'),
+        'space_key': page.get('space', {}).get('key'),
+        'labels': [label['name'] for label in page.get('metadata', {}).get('labels', {}).get('results', [])],
+        'ancestor_ids': [ancestor['id'] for ancestor in page.get('ancestors', [])],
     }
 
-    url = f"{confluence_url}/content"
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+def content_attachments(page_id: str, limit: int = 100, session=None):
+    """
+    Lists every attachment of a page, following the API's pagination.
 
-    try:
-        response = requests.get(
-            url,
-            headers=headers,
-            params=params,
-            auth=HTTPBasicAuth(confluence_user_email, confluence_api_token),
-        )
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to retrieve pages. Error: {e}")
-        return
+    Returns a list of attachment JSON objects (expanded with `version`), or an empty list if the
+    page's attachments could not be retrieved.
+    """
+    url = f"{confluence_url}/content/{page_id}/child/attachment"
+    http = session or requests
+    attachments = []
+    start = 0
+    while True:
+        params = {'start': start, 'limit': limit, 'expand': 'version'}
+        try:
+            response = http.get(url, headers=HEADERS, params=params, auth=AUTH, timeout=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to retrieve attachments of page {page_id}. Error: {e}")
+            return attachments
+        data = response.json()
+        results = data.get('results', [])
+        for attachment in results:
+            attachment['_links'].setdefault('base', data.get('_links', {}).get('base'))
+        attachments.extend(results)
+        if not results or 'next' not in data.get('_links', {}):
+            return attachments
+        start += len(results)
 
-    pages = response.json().get("results", [])
-    
-    page_id=[] 
-    email=[]
-    name=[]
-    accountId=[]
-    title=[]
-    page_url=[]
-    date=[]
-    for page in pages:
-        
-        page_id.append(page['id'])
-        email.append(page['version']['by']['email'])
-        name.append(page['version']['by']['publicName'])
-        accountId.append(page['version']['by']['accountId'])
-        title.append(page['title'])
-        date.append(page['version']['friendlyWhen'])
-        page_url.append(page['_links']['webui'])
-        
-        
-    return  page_id, email,name,accountId,title,page_url,date
-def content_attachments(page_id: str) -> None:
-    
-    url = f"{confluence_url}/attachments"
-    
-    headers = {
-    "Accept": "application/json"
-    }
-    response = requests.get(url, headers=headers, auth=AUTH)
-    if response.status_code == 200:
-        print("Attachments retrieved successfully!")
-        attachments = response.json()["results"]
-        print(f"Total attachments: {attachments}")
-        for attachment in attachments:
-            print(f"Attachment ID: {attachment['id']}, Title: {attachment['title']}")
-    else:
-        print(f"Failed to retrieve attachments. Status code: {response.status_code}")
-        print(response.text)
+def download_attachment(attachment, path, max_bytes, session=None, chunk_size=1 << 16):
+    """
+    Streams an attachment to `path` without holding it in memory.
+
+    Returns the number of bytes written, or None if the file exceeds `max_bytes` (the partial
+    file is removed).
+    """
+    url = attachment['_links']['base'] + attachment['_links']['download']
+    http = session or requests
+    written = 0
+    with http.get(url, auth=AUTH, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                written += len(chunk)
+                if written > max_bytes:
+                    break
+                f.write(chunk)
+    if written > max_bytes:
+        os.remove(path)
+        return None
+    return written
 
 def query_search(query):
     url = f"{confluence_url}/content/search"
@@ -132,6 +171,20 @@ def query_search(query):
         print(f"Error making API request: {e}")
         return None
 
+def get_page(page_id):
+    """
+    Fetches a single page with its storage-format body, version, space, ancestors and labels.
+
+    Returns the page JSON, or None if the page no longer exists (or is not visible).
+    """
+    url = f"{confluence_url}/content/{page_id}"
+    params = {'expand': 'body.storage,version,space,ancestors,metadata.labels'}
+    response = requests.get(url, headers=HEADERS, params=params, auth=AUTH, timeout=30)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
 def get_page_text(response):
     page_texts = {}
     for result in response.get('results', []):
@@ -0,0 +1,210 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import helpers
+
+# Settings of an index while it is bulk-loaded: no refreshes, no replicas to copy segments to
+BUILD_SETTINGS = {"number_of_replicas": 0, "refresh_interval": "-1"}
+
+
+def versioned_index_name(alias: str) -> str:
+    """Names a new build of `alias` after the current UTC time, e.g. `confluence-20250301t120000`."""
+    return f"{alias}-{datetime.now(timezone.utc).strftime('%Y%m%dt%H%M%S')}"
+
+
+def alias_targets(client, alias: str) -> List[str]:
+    """
+    Lists the indices an alias points to.
+
+    Args:
+        client: The Elasticsearch client.
+        alias (str): The read alias.
+
+    Returns:
+        List[str]: The aliased indices; empty if the alias does not exist.
+    """
+    if not client.indices.exists_alias(name=alias):
+        return []
+    return list(client.indices.get_alias(name=alias).keys())
+
+
+def create_build_index(client, index: str, mappings: Dict[str, Any], shards: Optional[int] = None) -> None:
+    """
+    Creates a fresh index with bulk-friendly settings (refresh disabled, no replicas).
+
+    Call it before a document store touches the index, since the store creates a missing index
+    with default settings. An existing index (an interrupted build being resumed) only gets the
+    settings applied.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The versioned index to create.
+        mappings (Dict[str, Any]): The index mappings.
+        shards (Optional[int]): Primary shards of a newly created index (default: the cluster's).
+
+    Raises:
+        RuntimeError: If the index does not have `shards` primary shards.
+    """
+    if client.indices.exists(index=index):
+        client.indices.put_settings(index=index, settings=BUILD_SETTINGS)
+    else:
+        settings = {**BUILD_SETTINGS, "number_of_shards": shards} if shards else BUILD_SETTINGS
+        client.indices.create(index=index, mappings=mappings, settings=settings)
+    if shards:
+        actual = int(client.indices.get_settings(index=index)[index]["settings"]["index"]["number_of_shards"])
+        if actual != shards:
+            raise RuntimeError(f"Index {index} has {actual} primary shards, not the {shards} requested.")
+
+
+def bulk_write_documents(client, index: str, documents: List[Any], chunk_size: int = 500,
+                         routing_field: Optional[str] = None, skip_existing: bool = False, refresh: Any = False) -> int:
+    """
+    Bulk-indexes Haystack documents the way `ElasticsearchDocumentStore.write_documents` does,
+    but without asking for a refresh, which would stall on an index whose refresh is disabled.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index being built.
+        documents (List[Document]): The documents, with embeddings.
+        chunk_size (int): Documents per bulk request.
+        routing_field (Optional[str]): Meta field whose value routes each document to its shard
+            (e.g. `Space_Key`), so searches on one value only touch that shard.
+        skip_existing (bool): Keep documents whose id already exists (like `DuplicatePolicy.SKIP`)
+            instead of overwriting them.
+        refresh: The bulk `refresh` parameter, e.g. "wait_for" on a live index.
+
+    Returns:
+        int: The number of documents written.
+    """
+    def actions():
+        for doc in documents:
+            action = {"_op_type": "create" if skip_existing else "index", "_index": index, "_id": doc.id, "_source": doc.to_dict()}
+            if routing_field and doc.meta.get(routing_field):
+                action["_routing"] = doc.meta[routing_field]
+            yield action
+
+    written, errors = helpers.bulk(client, actions(), chunk_size=chunk_size, refresh=refresh, raise_on_error=False)
+    if skip_existing:
+        errors = [error for error in errors if error.get("create", {}).get("status") != 409]
+    if errors:
+        raise RuntimeError(f"Failed to write {len(errors)} documents to {index}: {errors[:3]}")
+    return written
+
+
+def bulk_update_documents(client, index: str, updates: Dict[str, Dict[str, Any]], routing: Optional[Dict[str, str]] = None,
+                          chunk_size: int = 500, refresh: Any = False) -> int:
+    """
+    Replaces some fields of stored documents by id, without reindexing their vectors.
+
+    Updates address documents by id, so they also reach documents of an index whose refresh is
+    disabled.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index holding the documents.
+        updates (Dict[str, Dict[str, Any]]): The new field values per document id.
+        routing (Optional[Dict[str, str]]): The routing value per document id, for routed indices.
+        chunk_size (int): Updates per bulk request.
+        refresh: The bulk `refresh` parameter.
+
+    Returns:
+        int: The number of documents updated.
+    """
+    routing = routing or {}
+
+    def actions():
+        for doc_id, fields in updates.items():
+            action = {"_op_type": "update", "_index": index, "_id": doc_id, "doc": fields}
+            if routing.get(doc_id):
+                action["_routing"] = routing[doc_id]
+            yield action
+
+    updated, errors = helpers.bulk(client, actions(), chunk_size=chunk_size, refresh=refresh, raise_on_error=False)
+    if errors:
+        raise RuntimeError(f"Failed to update {len(errors)} documents in {index}: {errors[:3]}")
+    return updated
+
+
+def alias_chunks(client, index: str, page_ids: List[str], include_attachments: bool = False) -> List[Dict[str, Any]]:
+    """
+    Reads the chunks of some pages that stand in for other pages' collapsed duplicates.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index holding the chunks.
+        page_ids (List[str]): The pages whose chunks to read.
+        include_attachments (bool): Whether to read the chunks of the pages' attachments too.
+
+    Returns:
+        List[Dict[str, Any]]: Each chunk's page, routing and alias fields, with its `id`.
+    """
+    query = {"bool": {"filter": [{"terms": {"Page_ID": list(page_ids)}}, {"exists": {"field": "alias_page_ids"}}]}}
+    if not include_attachments:
+        query["bool"]["must_not"] = [{"exists": {"field": "Attachment_ID"}}]
+    fields = ["Page_ID", "Space_Key", "alias_page_ids", "alias_page_titles", "alias_page_urls"]
+    return [{**hit["_source"], "id": hit["_id"]}
+            for hit in helpers.scan(client, index=index, query={"query": query}, _source=fields)]
+
+
+def finalize_index(client, index: str, replicas: int = 1, refresh_interval: Optional[str] = None) -> None:
+    """
+    Prepares a bulk-loaded index for serving: restores refreshes and replicas, refreshes once and
+    force-merges to a single segment so the kNN graph is searched in one piece.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index that was built.
+        replicas (int): The replica count to serve with.
+        refresh_interval (Optional[str]): The refresh interval to serve with; None restores the default.
+    """
+    client.indices.put_settings(index=index, settings={"number_of_replicas": replicas, "refresh_interval": refresh_interval})
+    client.indices.refresh(index=index)
+    client.indices.forcemerge(index=index, max_num_segments=1, request_timeout=3600)
+    client.cluster.health(index=index, wait_for_status="yellow", timeout="10m")
+
+
+def swap_alias(client, alias: str, index: str) -> List[str]:
+    """
+    Points the read alias at `index` in one atomic `_aliases` call.
+
+    Indices previously behind the alias are detached in the same call. A concrete index that
+    holds the alias name itself (an index written before aliases were used) is deleted in that
+    call too, so readers never see a moment without the alias.
+
+    Args:
+        client: The Elasticsearch client.
+        alias (str): The read alias (`ELASTICSEARCH_INDEXNAME`).
+        index (str): The freshly built index.
+
+    Returns:
+        List[str]: The indices that were behind the alias before the swap.
+    """
+    previous = alias_targets(client, alias)
+    actions = [{"remove": {"index": old, "alias": alias}} for old in previous if old != index]
+    if not previous and client.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index, "alias": alias, "is_write_index": True}})
+    client.indices.update_aliases(actions=actions)
+    return previous
+
+
+def retire_indices(client, alias: str, keep: int = 1) -> List[str]:
+    """
+    Deletes old builds of an alias, keeping the newest `keep` unaliased ones for rollback.
+
+    Args:
+        client: The Elasticsearch client.
+        alias (str): The read alias.
+        keep (int): Previous builds to keep.
+
+    Returns:
+        List[str]: The deleted indices.
+    """
+    live = set(alias_targets(client, alias))
+    builds = sorted(client.indices.get(index=f"{alias}-*", expand_wildcards="open,closed").keys(), reverse=True)
+    # Only indices named like `versioned_index_name` builds; side indices such as `<alias>-summaries` are left alone
+    builds = [name for name in builds if name[len(alias) + 1:][:8].isdigit() and name not in live]
+    retired = builds[keep:]
+    for name in retired:
+        client.indices.delete(index=name)
+    return retired
@@ -0,0 +1,466 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils.filters import document_matches_filter
+
+try:
+    import hnswlib
+except ImportError:  # Vector search falls back to an exact scan of the memory-mapped matrix
+    hnswlib = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    content TEXT,
+    meta TEXT NOT NULL,
+    page_id TEXT,
+    has_embedding INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS documents_id ON documents (id) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS documents_page ON documents (page_id) WHERE deleted = 0;
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    content, content = 'documents', content_rowid = 'row', tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def matches_filter(filters: Dict[str, Any], document: Document) -> bool:
+    """
+    `document_matches_filter`, except that `==` and `in` on a list-valued meta field match when any
+    element matches, as Elasticsearch `term`/`terms` queries do on multi-valued keyword fields.
+    """
+    if "conditions" in filters:
+        results = [matches_filter(condition, document) for condition in filters["conditions"]]
+        if filters["operator"] == "AND":
+            return all(results)
+        if filters["operator"] == "OR":
+            return any(results)
+        return not all(results)
+    value = document.meta.get(filters["field"].removeprefix("meta."))
+    if isinstance(value, list) and filters["operator"] in ("==", "in"):
+        wanted = filters["value"] if filters["operator"] == "in" else [filters["value"]]
+        return any(item in wanted for item in value)
+    return document_matches_filter(filters, document)
+
+
+class LocalDocumentStore:
+    """
+    An embedded, file-backed document store for deployments without Elasticsearch.
+
+    Everything lives under one directory:
+    - `documents.sqlite3`: chunk content and meta, plus an FTS5 inverted index scored with BM25;
+    - `vectors.f16`: the normalized embeddings as a float16 matrix, memory-mapped rather than loaded;
+    - `vectors.hnsw`: an HNSW graph over the vectors (when `hnswlib` is installed; otherwise vector
+      search scans the memory-mapped matrix exactly).
+
+    Row `n` of the SQLite table is row `n - 1` of the matrix and label `n - 1` of the graph. Deleted
+    and overwritten chunks are tombstoned, not removed.
+    """
+
+    def __init__(self, path: str, embedding_dim: int = 1024, hnsw_m: int = 16, hnsw_ef_construction: int = 200,
+                 hnsw_ef: int = 128):
+        self.path = path
+        self.embedding_dim = embedding_dim
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        os.makedirs(path, exist_ok=True)
+        self._db_path = os.path.join(path, "documents.sqlite3")
+        self._vectors_path = os.path.join(path, "vectors.f16")
+        self._hnsw_path = os.path.join(path, "vectors.hnsw")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._row_bytes = embedding_dim * np.dtype(np.float16).itemsize
+        self._repair_vectors()
+        self._vectors = self._map_vectors()
+        self._excluded = {row - 1 for (row,) in self._conn.execute("SELECT row FROM documents WHERE deleted = 1 OR has_embedding = 0")}
+        self._hnsw = self._load_hnsw()
+
+    # Persistence
+
+    def _row_count(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(row), 0) FROM documents").fetchone()[0]
+
+    def _repair_vectors(self) -> None:
+        # Vectors are appended before their rows are committed; drop any left over from an interrupted write
+        rows = self._row_count()
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > rows * self._row_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(rows * self._row_bytes)
+
+    def _map_vectors(self) -> np.ndarray:
+        rows = os.path.getsize(self._vectors_path) // self._row_bytes if os.path.exists(self._vectors_path) else 0
+        if rows == 0:
+            return np.zeros((0, self.embedding_dim), dtype=np.float16)
+        return np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(rows, self.embedding_dim))
+
+    def _new_hnsw(self, capacity: int):
+        index = hnswlib.Index(space="ip", dim=self.embedding_dim)
+        index.init_index(max_elements=max(capacity, 1024), ef_construction=self.hnsw_ef_construction, M=self.hnsw_m,
+                         allow_replace_deleted=False)
+        index.set_ef(self.hnsw_ef)
+        return index
+
+    def _load_hnsw(self):
+        if hnswlib is None:
+            return None
+        rows = len(self._vectors)
+        if os.path.exists(self._hnsw_path):
+            index = hnswlib.Index(space="ip", dim=self.embedding_dim)
+            index.load_index(self._hnsw_path, max_elements=max(rows, 1024))
+            index.set_ef(self.hnsw_ef)
+            # Every row written with an embedding was added to the graph, including ones deleted since
+            embedded = self._conn.execute("SELECT COUNT(*) FROM documents WHERE has_embedding = 1").fetchone()[0]
+            if index.element_count == embedded:
+                return index
+        # No graph yet, or it lags the vectors: rebuild it from the memory-mapped matrix
+        index = self._new_hnsw(rows)
+        embedded = [row - 1 for (row,) in self._conn.execute("SELECT row FROM documents WHERE has_embedding = 1 ORDER BY row")]
+        self._add_to_hnsw(index, embedded)
+        for row in embedded:
+            if row in self._excluded:
+                index.mark_deleted(row)
+        if rows:
+            index.save_index(self._hnsw_path)
+        return index
+
+    def _add_to_hnsw(self, index, rows: Iterable[int], batch_size: int = 10000) -> None:
+        rows = list(rows)
+        if len(rows) + index.element_count > index.get_max_elements():
+            index.resize_index(max(2 * index.get_max_elements(), len(rows) + index.element_count))
+        for start in range(0, len(rows), batch_size):
+            labels = np.asarray(rows[start:start + batch_size])
+            index.add_items(np.asarray(self._vectors[labels], dtype=np.float32), labels)
+
+    # Haystack DocumentStore protocol
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, path=self.path, embedding_dim=self.embedding_dim, hnsw_m=self.hnsw_m,
+                               hnsw_ef_construction=self.hnsw_ef_construction, hnsw_ef=self.hnsw_ef)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LocalDocumentStore":
+        return default_from_dict(cls, data)
+
+    def count_documents(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE deleted = 0").fetchone()[0]
+
+    def _to_document(self, row: int, doc_id: str, content: Optional[str], meta: str, score: Optional[float] = None,
+                     return_embedding: bool = False) -> Document:
+        embedding = None
+        if return_embedding and row - 1 not in self._excluded:
+            embedding = np.asarray(self._vectors[row - 1], dtype=np.float32).tolist()
+        return Document(id=doc_id, content=content, meta=json.loads(meta), score=score, embedding=embedding)
+
+    def _fetch(self, rows: List[int]) -> Dict[int, tuple]:
+        records = {}
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                records.update((record[0], record) for record in self._conn.execute(
+                    f"SELECT row, id, content, meta FROM documents WHERE deleted = 0 AND row IN ({','.join('?' * len(batch))})", batch))
+        return records
+
+    def filter_documents(self, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Returns the documents matching Haystack `filters` (all documents if None), with embeddings.
+        """
+        with self._lock:
+            records = self._conn.execute("SELECT row, id, content, meta FROM documents WHERE deleted = 0 ORDER BY row").fetchall()
+        documents = [self._to_document(*record, return_embedding=True) for record in records]
+        if filters:
+            documents = [doc for doc in documents if matches_filter(filters, doc)]
+        return documents
+
+    def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE) -> int:
+        """
+        Appends documents to the matrix, the table, the BM25 index and the HNSW graph.
+
+        Args:
+            documents (List[Document]): The documents, normally with embeddings.
+            policy (DuplicatePolicy): What to do with ids that are already stored; NONE behaves like FAIL.
+
+        Returns:
+            int: The number of documents written.
+        """
+        with self._lock:
+            seen = {}
+            for doc in documents:
+                seen[doc.id] = doc
+            ids = list(seen)
+            existing = set()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                existing.update(doc_id for (doc_id,) in self._conn.execute(
+                    f"SELECT id FROM documents WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})", batch))
+            if existing and policy in (DuplicatePolicy.NONE, DuplicatePolicy.FAIL):
+                raise DuplicateDocumentError(f"IDs '{sorted(existing)[:5]}' already exist in the document store.")
+            if policy == DuplicatePolicy.SKIP:
+                to_write = [doc for doc_id, doc in seen.items() if doc_id not in existing]
+            else:
+                to_write = list(seen.values())
+                if existing:
+                    self._delete_ids(list(existing))
+            if not to_write:
+                return 0
+
+            first_row = self._row_count() + 1
+            vectors = np.zeros((len(to_write), self.embedding_dim), dtype=np.float32)
+            for i, doc in enumerate(to_write):
+                if doc.embedding is not None:
+                    vector = np.asarray(doc.embedding, dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    vectors[i] = vector / norm if norm else vector
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float16).tobytes())
+
+            with self._conn:
+                for i, doc in enumerate(to_write):
+                    row = first_row + i
+                    self._conn.execute(
+                        "INSERT INTO documents (row, id, content, meta, page_id, has_embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                        (row, doc.id, doc.content, json.dumps(doc.meta, default=str), doc.meta.get("Page_ID"),
+                         int(doc.embedding is not None)),
+                    )
+                    self._conn.execute("INSERT INTO documents_fts (rowid, content) VALUES (?, ?)", (row, doc.content or ""))
+                    if doc.embedding is None:
+                        self._excluded.add(row - 1)
+
+            self._vectors = self._map_vectors()
+            if self._hnsw is not None:
+                self._add_to_hnsw(self._hnsw, [first_row - 1 + i for i, doc in enumerate(to_write) if doc.embedding is not None])
+                self._hnsw.save_index(self._hnsw_path)
+            return len(to_write)
+
+    def _delete_ids(self, document_ids: List[str]) -> None:
+        rows = []
+        for start in range(0, len(document_ids), 500):
+            batch = document_ids[start:start + 500]
+            rows.extend(self._conn.execute(
+                f"SELECT row, content FROM documents WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})", batch).fetchall())
+        with self._conn:
+            for row, content in rows:
+                self._conn.execute("UPDATE documents SET deleted = 1 WHERE row = ?", (row,))
+                self._conn.execute("INSERT INTO documents_fts (documents_fts, rowid, content) VALUES ('delete', ?, ?)",
+                                   (row, content or ""))
+        for row, _ in rows:
+            if self._hnsw is not None and row - 1 not in self._excluded:
+                self._hnsw.mark_deleted(row - 1)
+            self._excluded.add(row - 1)
+
+    def delete_documents(self, document_ids: List[str]) -> None:
+        with self._lock:
+            self._delete_ids(document_ids)
+            if self._hnsw is not None:
+                self._hnsw.save_index(self._hnsw_path)
+
+    def update_meta(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Replaces some meta fields of stored documents by id, keeping their ids, content and vectors.
+
+        A new `Page_ID` moves the document to that page.
+
+        Args:
+            updates (Dict[str, Dict[str, Any]]): The new meta values per document id.
+
+        Returns:
+            int: The number of documents updated.
+        """
+        updated = 0
+        with self._lock, self._conn:
+            for doc_id, fields in updates.items():
+                record = self._conn.execute("SELECT row, meta FROM documents WHERE deleted = 0 AND id = ?", (doc_id,)).fetchone()
+                if record is None:
+                    continue
+                meta = {**json.loads(record[1]), **fields}
+                self._conn.execute("UPDATE documents SET meta = ?, page_id = ? WHERE row = ?",
+                                   (json.dumps(meta, default=str), meta.get("Page_ID"), record[0]))
+                updated += 1
+        return updated
+
+    # Retrieval
+
+    def _live_count(self) -> int:
+        return len(self._vectors) - len(self._excluded)
+
+    def _nearest(self, query: np.ndarray, k: int) -> List[tuple]:
+        k = min(k, self._live_count())
+        if k <= 0:
+            return []
+        if self._hnsw is not None:
+            labels, distances = self._hnsw.knn_query(query, k=k)
+            return [(int(label) + 1, 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(self._vectors), 65536):
+            scores = np.asarray(self._vectors[start:start + 65536], dtype=np.float32) @ query
+            for row in (r - start for r in self._excluded if start <= r < start + len(scores)):
+                scores[row] = -np.inf
+            best_rows = np.concatenate([best_rows, np.arange(start, start + len(scores))])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return [(int(best_rows[i]) + 1, float(best_scores[i])) for i in order]
+
+    def _filtered(self, scored: List[tuple], filters: Optional[Dict[str, Any]], top_k: int,
+                  return_embedding: bool = False) -> List[Document]:
+        records = self._fetch([row for row, _ in scored])
+        documents = []
+        for row, score in scored:
+            if row not in records:
+                continue
+            doc = self._to_document(*records[row], score=score, return_embedding=return_embedding)
+            if filters and not matches_filter(filters, doc):
+                continue
+            documents.append(doc)
+            if len(documents) == top_k:
+                break
+        return documents
+
+    def embedding_retrieval(self, query_embedding: List[float], top_k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                            return_embedding: bool = False) -> List[Document]:
+        """
+        Finds the documents closest to `query_embedding` by cosine similarity.
+
+        Scores use the (1 + cosine) / 2 scale of Elasticsearch. With `filters`, candidates are
+        oversampled until `top_k` of them match or the whole store has been considered.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        k = top_k if not filters else top_k * 4
+        while True:
+            scored = [(row, (1.0 + score) / 2.0) for row, score in self._nearest(query, k)]
+            documents = self._filtered(scored, filters, top_k, return_embedding)
+            if len(documents) >= top_k or k >= self._live_count():
+                return documents
+            k *= 4
+
+    def bm25_retrieval(self, query: str, top_k: int = 10, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Ranks documents by BM25 over the FTS5 index; any query term may match.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        k = top_k if not filters else top_k * 4
+        while True:
+            with self._lock:
+                scored = self._conn.execute(
+                    "SELECT rowid, -bm25(documents_fts) FROM documents_fts WHERE documents_fts MATCH ? "
+                    "ORDER BY bm25(documents_fts) LIMIT ?", (match, k)
+                ).fetchall()
+            documents = self._filtered(scored, filters, top_k)
+            if len(documents) >= top_k or len(scored) < k:
+                return documents
+            k *= 4
+
+    # Page-level reads used by the API in place of Elasticsearch aggregations
+
+    def list_pages(self) -> List[Dict[str, Any]]:
+        """Returns one entry per page (title and id) with its URL and chunk count, like `PageCatalog`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT json_extract(meta, '$.Page_Title') AS title, page_id, MIN(json_extract(meta, '$.Page_URL')), COUNT(*) "
+                "FROM documents WHERE deleted = 0 AND title IS NOT NULL GROUP BY title, page_id ORDER BY title, page_id"
+            ).fetchall()
+        return [{"Page_Title": title, "Page_ID": page_id, "Page_URL": url, "chunks": chunks} for title, page_id, url, chunks in rows]
+
+    def page_sources(self, page_id: str) -> List[Dict[str, Any]]:
+        """
+        Returns the chunks of a page in `split_id` order, followed by those standing in for its
+        collapsed duplicates (excluding attachments), shaped like Elasticsearch `_source` documents.
+        """
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT id, content, meta FROM documents WHERE deleted = 0 "
+                "AND json_extract(meta, '$.Attachment_ID') IS NULL "
+                "AND (page_id = ? OR EXISTS (SELECT 1 FROM json_each(documents.meta, '$.alias_page_ids') WHERE value = ?)) "
+                "ORDER BY COALESCE(page_id, '') != ?, COALESCE(json_extract(meta, '$.split_id'), 0), row",
+                (page_id, page_id, page_id),
+            ).fetchall()
+        return [{**json.loads(meta), "id": doc_id, "content": content} for doc_id, content, meta in records]
+
+    def page_document_ids(self, page_id: str, include_attachments: bool = False) -> List[str]:
+        """Returns the ids of the chunks whose `Page_ID` is `page_id`, optionally with its attachments' chunks."""
+        query = "SELECT id FROM documents WHERE deleted = 0 AND page_id = ?"
+        if not include_attachments:
+            query += " AND json_extract(meta, '$.Attachment_ID') IS NULL"
+        with self._lock:
+            return [doc_id for (doc_id,) in self._conn.execute(query, (page_id,))]
+
+    def alias_chunks(self, page_ids: List[str], include_attachments: bool = False) -> List[Dict[str, Any]]:
+        """Returns the chunks of `page_ids` that stand in for other pages' duplicates, as meta dicts with their `id`."""
+        query = ("SELECT id, meta FROM documents WHERE deleted = 0 AND page_id IN ({}) "
+                 "AND json_array_length(meta, '$.alias_page_ids') > 0").format(",".join("?" * len(page_ids)))
+        if not include_attachments:
+            query += " AND json_extract(meta, '$.Attachment_ID') IS NULL"
+        with self._lock:
+            return [{**json.loads(meta), "id": doc_id} for doc_id, meta in self._conn.execute(query, list(page_ids))]
+
+
+@component
+class LocalEmbeddingRetriever:
+    """
+    Retrieves documents from a `LocalDocumentStore` by embedding similarity.
+    """
+
+    def __init__(self, document_store: LocalDocumentStore, top_k: int = 10, filters: Optional[Dict[str, Any]] = None):
+        self.document_store = document_store
+        self.top_k = top_k
+        self.filters = filters
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, document_store=self.document_store.to_dict(), top_k=self.top_k, filters=self.filters)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LocalEmbeddingRetriever":
+        data["init_parameters"]["document_store"] = LocalDocumentStore.from_dict(data["init_parameters"]["document_store"])
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], filters: Optional[Dict[str, Any]] = None, top_k: Optional[int] = None):
+        documents = self.document_store.embedding_retrieval(
+            query_embedding, top_k=top_k or self.top_k, filters=filters or self.filters
+        )
+        return {"documents": documents}
+
+
+@component
+class LocalBM25Retriever:
+    """
+    Retrieves documents from a `LocalDocumentStore` by BM25.
+    """
+
+    def __init__(self, document_store: LocalDocumentStore, top_k: int = 10, filters: Optional[Dict[str, Any]] = None):
+        self.document_store = document_store
+        self.top_k = top_k
+        self.filters = filters
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, document_store=self.document_store.to_dict(), top_k=self.top_k, filters=self.filters)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LocalBM25Retriever":
+        data["init_parameters"]["document_store"] = LocalDocumentStore.from_dict(data["init_parameters"]["document_store"])
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, filters: Optional[Dict[str, Any]] = None, top_k: Optional[int] = None):
+        documents = self.document_store.bm25_retrieval(query, top_k=top_k or self.top_k, filters=filters or self.filters)
+        return {"documents": documents}
@@ -0,0 +1,164 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from elasticsearch import helpers
+from haystack import Document
+
+from docstore.utils.vector_index import FACET_MAPPINGS, INDEX_TYPES
+
+
+def page_mapping(quantization: str = "int8", dims: int = 1024) -> Dict[str, Any]:
+    """Builds the mapping of the page vector index: one document per page, keyed by `Page_ID`."""
+    return {
+        "properties": {
+            "Page_ID": {"type": "keyword"},
+            "Page_Title": {"type": "keyword"},
+            "Page_URL": {"type": "keyword"},
+            "chunks": {"type": "integer"},
+            **FACET_MAPPINGS,
+            "embedding": {
+                "type": "dense_vector",
+                "dims": dims,
+                "index": True,
+                "similarity": "cosine",
+                "index_options": {"type": INDEX_TYPES[quantization]},
+            },
+        }
+    }
+
+
+def page_vectors(documents) -> List[Dict[str, Any]]:
+    """
+    Computes one vector per page as the normalized mean of its chunks' normalized embeddings.
+
+    A chunk that stands in for collapsed duplicates of other pages (`alias_page_ids`) counts
+    towards those pages too, so they can still be selected by the first retrieval stage. Each page
+    keeps the `FACET_MAPPINGS` fields of its own chunks, so query filters apply to both stages.
+
+    Args:
+        documents (List[Document]): Embedded chunks.
+
+    Returns:
+        List[Dict[str, Any]]: `Page_ID`, `Page_Title`, `Page_URL`, `chunks`, the facets and `embedding` per page.
+    """
+    sums, pages = {}, {}
+    for doc in documents:
+        if doc.embedding is None:
+            continue
+        vector = np.asarray(doc.embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        owners = [(doc.meta.get("Page_ID"), doc.meta.get("Page_Title"), doc.meta.get("Page_URL"))]
+        owners += zip(doc.meta.get("alias_page_ids") or [], doc.meta.get("alias_page_titles") or [],
+                      doc.meta.get("alias_page_urls") or [])
+        for page_id, title, url in owners:
+            if page_id is None:
+                continue
+            if page_id not in sums:
+                sums[page_id] = np.zeros_like(vector)
+                pages[page_id] = {"Page_ID": page_id, "Page_Title": title, "Page_URL": url, "chunks": 0}
+            sums[page_id] += vector
+            pages[page_id]["chunks"] += 1
+            if page_id == doc.meta.get("Page_ID"):
+                pages[page_id].update({field: doc.meta[field] for field in FACET_MAPPINGS if doc.meta.get(field) is not None})
+    for page_id, total in sums.items():
+        pages[page_id]["embedding"] = (total / (np.linalg.norm(total) or 1.0)).tolist()
+    return list(pages.values())
+
+
+def page_documents(pages: List[Dict[str, Any]]) -> List[Document]:
+    """Wraps page vectors as Documents keyed by `Page_ID`, for a `LocalDocumentStore` of pages."""
+    return [
+        Document(id=page["Page_ID"], content=page["Page_Title"],
+                 meta={key: value for key, value in page.items() if key != "embedding"}, embedding=page["embedding"])
+        for page in pages
+    ]
+
+
+def page_filter(page_ids: List[str]) -> Dict[str, Any]:
+    """Builds the Elasticsearch filter clause restricting chunk searches to `page_ids` (and chunks aliasing them)."""
+    return {"bool": {"should": [{"terms": {"Page_ID": page_ids}}, {"terms": {"alias_page_ids": page_ids}}],
+                     "minimum_should_match": 1}}
+
+
+class PageVectorIndex:
+    """
+    A side index of page-level vectors for two-stage retrieval.
+
+    The first stage searches this small index for the pages closest to the query; the second
+    runs the usual chunk-level kNN and BM25 searches restricted to those pages with `page_filter`.
+    """
+
+    def __init__(self, client, index: str):
+        self.client = client
+        self.index = index
+
+    def ensure_index(self, quantization: str = "int8", dims: int = 1024) -> None:
+        """Creates the page index if it does not exist yet."""
+        if not self.client.indices.exists(index=self.index):
+            self.client.indices.create(index=self.index, mappings=page_mapping(quantization, dims))
+
+    def write(self, pages: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        Upserts page vectors, one document per `Page_ID`.
+
+        Returns:
+            int: The number of pages written.
+        """
+        actions = ({"_index": self.index, "_id": page["Page_ID"], "_source": page} for page in pages)
+        written, _ = helpers.bulk(self.client, actions, chunk_size=chunk_size, refresh="wait_for")
+        return written
+
+    def delete(self, page_id: str) -> None:
+        self.client.options(ignore_status=404).delete(index=self.index, id=page_id, refresh="wait_for")
+
+    def retain(self, page_ids: List[str]) -> int:
+        """
+        Deletes the vectors of every page not in `page_ids` (pages gone from a full rebuild).
+
+        Returns:
+            int: The number of deleted pages.
+        """
+        response = self.client.delete_by_query(
+            index=self.index, query={"bool": {"must_not": [{"ids": {"values": list(page_ids)}}]}},
+            refresh=True, conflicts="proceed",
+        )
+        return response.get("deleted", 0)
+
+    def search_body(self, embedding: List[float], top_pages: int, num_candidates: Optional[int],
+                    filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Builds the kNN search body of the first retrieval stage."""
+        knn = {"field": "embedding", "query_vector": embedding, "k": top_pages, "num_candidates": max(top_pages, num_candidates or 0)}
+        if filters:
+            knn["filter"] = filters
+        return {"size": top_pages, "knn": knn, "_source": ["Page_ID"]}
+
+    def top_pages(self, embedding: List[float], top_pages: int = 20, num_candidates: Optional[int] = None,
+                  filters: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        Finds the pages whose vectors are closest to a query.
+
+        Args:
+            embedding (List[float]): The query embedding.
+            top_pages (int): Pages to return.
+            num_candidates (Optional[int]): HNSW candidates per shard (default: `top_pages`).
+            filters (Optional[List[Dict[str, Any]]]): Elasticsearch filter clauses on the page facets.
+
+        Returns:
+            List[str]: The page ids, best first.
+        """
+        response = self.client.search(index=self.index, **self.search_body(embedding, top_pages, num_candidates, filters))
+        return [hit["_source"]["Page_ID"] for hit in response["hits"]["hits"]]
+
+    def msearch_top_pages(self, embeddings: List[List[float]], top_pages: int = 20, num_candidates: Optional[int] = None,
+                          filters: Optional[List[Dict[str, Any]]] = None) -> List[List[str]]:
+        """Runs `top_pages` for many queries in a single `_msearch` round trip."""
+        searches = []
+        for embedding in embeddings:
+            searches.append({"index": self.index})
+            searches.append(self.search_body(list(embedding), top_pages, num_candidates, filters))
+        results = []
+        for response in self.client.msearch(searches=searches)["responses"]:
+            if "error" in response:
+                raise RuntimeError(f"Elasticsearch msearch failed: {response['error']}")
+            results.append([hit["_source"]["Page_ID"] for hit in response["hits"]["hits"]])
+        return results
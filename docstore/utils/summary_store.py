@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+SUMMARY_MAPPINGS = {
+    "properties": {
+        "Page_ID": {"type": "keyword"},
+        "Version": {"type": "long"},
+        "Page_Title": {"type": "keyword"},
+        "model": {"type": "keyword"},
+        "summary": {"type": "text", "index": False},
+        "created_at": {"type": "date"},
+    }
+}
+
+
+class SummaryStore:
+    """
+    A side index of precomputed page summaries keyed by `Page_ID` and page version.
+
+    A summary is only served for the exact version it was generated from, so an edited page falls
+    back to live generation until the next ingestion run summarizes the new version.
+    """
+
+    def __init__(self, client, index: str):
+        self.client = client
+        self.index = index
+
+    @staticmethod
+    def doc_id(page_id: str, version: Any) -> str:
+        return f"{page_id}:{version}"
+
+    def ensure_index(self) -> None:
+        """Creates the summary index if it does not exist yet."""
+        if not self.client.indices.exists(index=self.index):
+            self.client.indices.create(index=self.index, mappings=SUMMARY_MAPPINGS)
+
+    def get(self, page_id: str, version: Any) -> Optional[Dict[str, Any]]:
+        """
+        Looks up the summary of one page version.
+
+        Args:
+            page_id (str): The Confluence page id.
+            version (Any): The Confluence page version number.
+
+        Returns:
+            Optional[Dict[str, Any]]: The stored summary document, or None if there is none.
+        """
+        if version is None:
+            return None
+        response = self.client.options(ignore_status=404).get(index=self.index, id=self.doc_id(page_id, version))
+        return response["_source"] if response.get("found") else None
+
+    def exists(self, page_id: str, version: Any) -> bool:
+        return bool(self.client.options(ignore_status=404).exists(index=self.index, id=self.doc_id(page_id, version)))
+
+    def put(self, page_id: str, version: Any, summary: str, title: str, model: str) -> None:
+        """
+        Stores the summary of one page version, replacing any previous summary of that version.
+
+        Args:
+            page_id (str): The Confluence page id.
+            version (Any): The Confluence page version number.
+            summary (str): The generated summary.
+            title (str): The page title.
+            model (str): The model that generated the summary.
+        """
+        self.client.index(
+            index=self.index,
+            id=self.doc_id(page_id, version),
+            document={
+                "Page_ID": page_id,
+                "Version": version,
+                "Page_Title": title,
+                "model": model,
+                "summary": summary,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
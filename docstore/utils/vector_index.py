@@ -0,0 +1,132 @@
+import math
+from typing import Any, Dict, List, Optional
+
+# `VECTOR_QUANTIZATION` values and the HNSW index type each one maps to
+INDEX_TYPES = {
+    "none": "hnsw",
+    "int8": "int8_hnsw",
+    "int4": "int4_hnsw",
+    "binary": "bbq_hnsw",
+}
+
+# Page facets that queries filter on; explicit so `Last_Modified` is a date and not left to date detection
+FACET_MAPPINGS = {
+    "Space_Key": {"type": "keyword"},
+    "Labels": {"type": "keyword"},
+    "Ancestor_IDs": {"type": "keyword"},
+    "Author_Name": {"type": "keyword"},
+    "Last_Modified": {"type": "date"},
+}
+
+# Rescores kNN candidates with the full-precision vectors kept alongside the quantized graph,
+# on the same (1 + cosine) / 2 scale Elasticsearch uses for cosine kNN scores
+RESCORE_SCRIPT = "(cosineSimilarity(params.query_vector, 'embedding') + 1.0) / 2.0"
+
+
+def document_mapping(quantization: str = "int8", dims: int = 1024, similarity: str = "cosine",
+                     m: int = 16, ef_construction: int = 100) -> Dict[str, Any]:
+    """
+    Builds the chunk index mapping, with the embedding's HNSW graph optionally quantized.
+
+    It mirrors the default mapping of `ElasticsearchDocumentStore` (text content, string meta as
+    keywords) and only adds explicit `dense_vector` dims and `index_options`. Quantization only
+    affects the graph; Elasticsearch keeps the float32 vectors for rescoring. The `FACET_MAPPINGS`
+    fields are mapped explicitly for filtering.
+
+    Args:
+        quantization (str): "none", "int8", "int4" or "binary".
+        dims (int): The embedding size (1024 for bge-m3).
+        similarity (str): The vector similarity function.
+        m (int): HNSW neighbours per node.
+        ef_construction (int): HNSW candidates considered while building the graph.
+
+    Returns:
+        Dict[str, Any]: A mapping for the store's `custom_mapping`.
+    """
+    if quantization not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector quantization '{quantization}', expected one of {sorted(INDEX_TYPES)}")
+    return {
+        "properties": {
+            "embedding": {
+                "type": "dense_vector",
+                "dims": dims,
+                "index": True,
+                "similarity": similarity,
+                "index_options": {"type": INDEX_TYPES[quantization], "m": m, "ef_construction": ef_construction},
+            },
+            "content": {"type": "text"},
+            **FACET_MAPPINGS,
+        },
+        "dynamic_templates": [
+            {"strings": {"path_match": "*", "match_mapping_type": "string", "mapping": {"type": "keyword"}}}
+        ],
+    }
+
+
+def knn_body(embedding: List[float], top_k: int, num_candidates: int, oversample: float = 1.0,
+             rescore: bool = False, filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Builds a kNN search body that oversamples candidates and optionally rescores them at full precision.
+
+    The quantized graph picks `top_k * oversample` candidates per shard; with `rescore`, those are
+    re-ranked by exact cosine similarity on the float32 vectors before the top `top_k` are returned.
+
+    Args:
+        embedding (List[float]): The query embedding.
+        top_k (int): Documents to return.
+        num_candidates (int): Minimum HNSW candidates per shard.
+        oversample (float): Candidates kept per returned document.
+        rescore (bool): Whether to rescore the candidates with full-precision vectors.
+        filters (Optional[List[Dict[str, Any]]]): Elasticsearch filter clauses applied during the search.
+
+    Returns:
+        Dict[str, Any]: The search body.
+    """
+    window = max(top_k, math.ceil(top_k * oversample))
+    knn = {"field": "embedding", "query_vector": embedding, "num_candidates": max(num_candidates, window)}
+    if filters:
+        knn["filter"] = filters
+    body = {
+        "size": top_k,
+        "query": {"knn": knn},
+        "_source": {"excludes": ["embedding"]},
+    }
+    if rescore:
+        body["rescore"] = {
+            "window_size": window,
+            "query": {
+                "rescore_query": {
+                    "script_score": {
+                        "query": {"match_all": {}},
+                        "script": {"source": RESCORE_SCRIPT, "params": {"query_vector": embedding}},
+                    }
+                },
+                "query_weight": 0.0,
+                "rescore_query_weight": 1.0,
+            },
+        }
+    return body
+
+
+def knn_search(client, index: str, embedding: List[float], top_k: int, num_candidates: int,
+               oversample: float = 1.0, rescore: bool = False,
+               filters: Optional[List[Dict[str, Any]]] = None, routing: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Runs one (optionally rescored) kNN search.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index (or alias) to search.
+        embedding (List[float]): The query embedding.
+        top_k (int): Documents to return.
+        num_candidates (int): Minimum HNSW candidates per shard.
+        oversample (float): Candidates kept per returned document.
+        rescore (bool): Whether to rescore the candidates with full-precision vectors.
+        filters (Optional[List[Dict[str, Any]]]): Elasticsearch filter clauses applied during the search.
+        routing (Optional[str]): Comma-separated routing values; only their shards are searched.
+
+    Returns:
+        List[Dict[str, Any]]: The raw hits.
+    """
+    body = knn_body(embedding, top_k, num_candidates, oversample, rescore, filters)
+    return client.search(index=index, routing=routing, **body)["hits"]["hits"]
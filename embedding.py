@@ -1,170 +1,607 @@
-import pandas as pd
-import uuid
-import docx
+import argparse
+import atexit
+import itertools
 import json
-import re
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import torch
 from haystack.utils import ComponentDevice
-from haystack.components.preprocessors import DocumentSplitter
 from haystack.document_stores.types import DuplicatePolicy
 from haystack_integrations.document_stores.elasticsearch import ElasticsearchDocumentStore
 from haystack import Document
-from haystack.components.preprocessors import DocumentCleaner
 from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+from elasticsearch import Elasticsearch
 
 from confluence.utils import confluence_program
+from ingestion.utils.profiling import IngestionProfiler
+from ingestion.utils.checkpoint import IngestCheckpoint, run_key
+from ingestion.utils.chunker import StructureChunker
+from ingestion.utils.preprocessing import build_page_docx, chunk_pairs, page_metadata, page_pair, make_cleaner, make_splitter
+from ingestion.utils.dedup import CanonicalIndex, collapse_near_duplicates, rehome_aliases, restore_aliases
+from ingestion.utils.attachments import attachment_pairs, delete_replaced_versions
+from ingestion.utils.summaries import summarize_pages
+from docstore.utils.summary_store import SummaryStore
+from docstore.utils.vector_index import document_mapping
+from docstore.utils.local_store import LocalDocumentStore
+from docstore.utils.page_index import PageVectorIndex, page_documents, page_vectors
+from docstore.utils.index_lifecycle import (
+    versioned_index_name,
+    create_build_index,
+    alias_chunks,
+    bulk_write_documents,
+    bulk_update_documents,
+    finalize_index,
+    swap_alias,
+    retire_indices,
+)
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
 elasticsearch_url =os.getenv('ELASTICSEARCH_URL')
 elasticsearch_username=os.getenv('ELASTICSEARCH_USERNAME')
 elasticsearch_password=os.getenv("ELASTICSEARCH_PASSWORD")
 elasticsearch_indexname=os.getenv("ELASTICSEARCH_INDEXNAME")
+elasticsearch_summary_indexname=os.getenv("ELASTICSEARCH_SUMMARY_INDEXNAME", f"{elasticsearch_indexname}-summaries")
+elasticsearch_page_indexname=os.getenv("ELASTICSEARCH_PAGE_INDEXNAME", f"{elasticsearch_indexname}-pages")
+api_url = os.getenv("API_URL", "http://localhost")
+ingest_summaries = os.getenv("INGEST_SUMMARIES", "false").lower() in ("1", "true", "yes")
+summary_model = os.getenv("INGEST_SUMMARY_MODEL")
+summary_workers = int(os.getenv("INGEST_SUMMARY_WORKERS", "4"))
+chunker_mode = os.getenv("INGEST_CHUNKER", "structure").lower()
+chunk_max_tokens = int(os.getenv("INGEST_CHUNK_MAX_TOKENS", "480"))
+chunk_min_tokens = int(os.getenv("INGEST_CHUNK_MIN_TOKENS", "240"))
+ingest_dedup = os.getenv("INGEST_DEDUP", "true").lower() in ("1", "true", "yes")
+dedup_threshold = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.9"))
+vector_quantization = os.getenv("VECTOR_QUANTIZATION", "int8").lower()
+# Rebuild into a new versioned index and switch the ELASTICSEARCH_INDEXNAME alias to it when done
+ingest_reindex = os.getenv("INGEST_REINDEX", "false").lower() in ("1", "true", "yes")
+index_replicas = int(os.getenv("ELASTICSEARCH_REPLICAS", "1"))
+keep_indices = int(os.getenv("INGEST_KEEP_INDICES", "1"))
+ingest_attachments = os.getenv("INGEST_ATTACHMENTS", "true").lower() in ("1", "true", "yes")
+attachment_max_bytes = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 2**20)))
+attachment_timeout = float(os.getenv("ATTACHMENT_TIMEOUT", "60"))
+attachment_max_chars = int(os.getenv("ATTACHMENT_MAX_CHARS", "2000000"))
+attachment_download_workers = int(os.getenv("ATTACHMENT_DOWNLOAD_WORKERS", "8"))
+attachment_extract_workers = int(os.getenv("ATTACHMENT_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+local_store = os.getenv("DOCUMENT_STORE", "elasticsearch").lower() == "local"
+local_store_path = os.getenv("LOCAL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "local_store"))
+page_batch_size = int(os.getenv("INGEST_PAGE_BATCH_SIZE", "200"))
+embed_batch_size = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))
+embedding_device = os.getenv("INGEST_DEVICE")
+checkpoint_path = os.getenv("INGEST_CHECKPOINT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "ingest_checkpoint.sqlite3"))
+space_workers = int(os.getenv("INGEST_SPACE_WORKERS", "4"))
+# Route chunks to shards by Space_Key; the shard count only applies to indices built with --reindex
+space_routing = os.getenv("ELASTICSEARCH_SPACE_ROUTING", "false").lower() in ("1", "true", "yes")
+index_shards = int(os.getenv("ELASTICSEARCH_SHARDS", "0")) or None
+
+
+def content_bytes(documents):
+    return sum(len((doc.content or "").encode("utf-8")) for doc in documents)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingests Confluence spaces into the document store in checkpointed page batches. "
+                    "Defaults come from the environment (see README)."
+    )
+    parser.add_argument("--space", dest="spaces", action="append",
+                        help="Space key to ingest; repeat or separate with commas for several spaces (default: SPACE_KEY).")
+    parser.add_argument("--all-spaces", action="store_true", help="Ingest every global space.")
+    parser.add_argument("--space-workers", type=int, default=space_workers,
+                        help="Spaces ingested in parallel; the worker counts below are shared between them (default: %(default)s).")
+    parser.add_argument("--page-batch-size", type=int, default=page_batch_size,
+                        help="Pages per batch; a batch is checkpointed once its chunks are written (default: %(default)s).")
+    parser.add_argument("--embed-batch-size", type=int, default=embed_batch_size,
+                        help="Chunks per embedding model forward pass (default: %(default)s).")
+    parser.add_argument("--download-workers", type=int, default=attachment_download_workers,
+                        help="Concurrent attachment listings and downloads, across all spaces (default: %(default)s).")
+    parser.add_argument("--extract-workers", type=int, default=attachment_extract_workers,
+                        help="Attachment extraction processes, across all spaces (default: %(default)s).")
+    parser.add_argument("--summary-workers", type=int, default=summary_workers,
+                        help="Concurrent summary requests, across all spaces (default: %(default)s).")
+    parser.add_argument("--device", default=embedding_device,
+                        help="Embedding device, e.g. cpu, cuda:0 or mps (default: cuda:0 when available).")
+    parser.add_argument("--reindex", action=argparse.BooleanOptionalAction, default=ingest_reindex,
+                        help="Build a new versioned index and swap the alias to it when done.")
+    parser.add_argument("--attachments", action=argparse.BooleanOptionalAction, default=ingest_attachments,
+                        help="Ingest page attachments.")
+    parser.add_argument("--summaries", action=argparse.BooleanOptionalAction, default=ingest_summaries,
+                        help="Precompute page summaries through the API.")
+    parser.add_argument("--checkpoint", default=checkpoint_path, help="Checkpoint database (default: %(default)s).")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint of an interrupted run and start over.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Fetch and chunk the pages that would be ingested and report the counts, without embedding or writing.")
+    args = parser.parse_args(argv)
+    spaces = [key.strip() for value in args.spaces or [] for key in value.split(",") if key.strip()]
+    if args.all_spaces:
+        spaces = confluence_program.space_keys()
+    args.spaces = list(dict.fromkeys(spaces or confluence_program.confluence_space_keys))
+    if not args.spaces:
+        parser.error("no space given: pass --space or --all-spaces, or set SPACE_KEY")
+    if min(args.page_batch_size, args.embed_batch_size, args.space_workers) < 1:
+        parser.error("batch sizes and --space-workers must be positive")
+    if local_store and (args.reindex or args.summaries):
+        # Embedded store (SQLite + memory-mapped vectors) instead of Elasticsearch; aliases and summaries need Elasticsearch
+        print("--reindex and --summaries are ignored with DOCUMENT_STORE=local")
+        args.reindex = args.summaries = False
+    return args
+
+
+def ingestion_run_key(args):
+    return run_key(
+        spaces="*" if args.all_spaces else sorted(args.spaces),
+        store=f"local:{local_store_path}" if local_store else elasticsearch_indexname,
+        reindex=args.reindex,
+        attachments=args.attachments,
+        chunker=[chunker_mode, chunk_max_tokens, chunk_min_tokens],
+        routing=space_routing,
+    )
 
 
-
-def read_docx(doc):
-    content = []
-
-    for para in doc.paragraphs:
-        content.append(para.text)
-
-    for table in doc.tables:
-        table_data = []
-        for row in table.rows:
-            row_data = [cell.text for cell in row.cells]
-            table_data.append(row_data)
-        content.append(table_data)
-
-    return content
-
-def read_files(content):
-    processed_data = {
-        "tables": [],
-        "queries": [],
-        "data_types": [],
-        "json_data": [],
-        "hierarchical_data": []
-    }
-
-    for item in content:
-        if isinstance(item, list):
-            
-            processed_data["tables"].append(item)
-        elif re.match(r"SELECT .* FROM .*", item, re.IGNORECASE | re.DOTALL):
-            
-            processed_data["queries"].append(item)
-        elif re.match(r"^\{.*\}$", item, re.DOTALL):
-            
-            try:
-                json_data = json.loads(item)
-                processed_data["json_data"].append(json_data)
-            except json.JSONDecodeError:
-                pass
-        elif re.match(r"├──|└──", item):
-            
-            processed_data["hierarchical_data"].append(item)
+def page_batches(spaces, batch_size, completed, profiler):
+    """
+    Streams the pages of `spaces` in batches, leaving out pages already checkpointed at their current version.
+
+    Args:
+        spaces (List[str]): Space keys.
+        batch_size (int): Pages per batch.
+        completed (Dict[str, int]): Checkpointed version per page id.
+        profiler (IngestionProfiler): Records the fetch time under "confluence_fetch".
+
+    Yields:
+        Tuple[List[dict], int]: The batch of page JSON objects and the pages skipped while filling it.
+    """
+    pages = itertools.chain.from_iterable(confluence_program.iter_space_pages(space) for space in spaces)
+    while True:
+        batch, skipped = [], 0
+        with profiler.stage("confluence_fetch") as stage:
+            for page in pages:
+                if completed.get(page["id"]) == page["version"]["number"]:
+                    skipped += 1
+                    continue
+                batch.append(page)
+                if len(batch) == batch_size:
+                    break
+            stage.add(items=len(batch) + skipped)
+        if batch or skipped:
+            yield batch, skipped
+        if len(batch) < batch_size:
+            return
+
+
+class IngestionRun:
+    """
+    Ingests page batches into the document store and checkpoints each completed batch.
+
+    Every batch goes through the same stages as a single-pass run (docx build, attachments,
+    chunking, near-duplicate collapsing, embedding, write, page vectors, summaries), so the
+    profiler report adds up across batches. Near-duplicates are collapsed within a batch, and
+    against the canonical chunks of the batches the run has already checkpointed. A page that was
+    indexed before is rewritten: its new chunks replace the old ones, which are then deleted.
+
+    Up to `--space-workers` spaces are ingested at the same time, each on its own thread with a
+    share of the download, extraction and summary workers. Fetching, attachments and writes of one
+    space overlap with the embedding of another; the embedding model itself runs one batch at a time.
+    """
+
+    def __init__(self, args, key, checkpoint, profiler):
+        self.args = args
+        self.key = key
+        self.checkpoint = checkpoint
+        self.profiler = profiler
+        self.totals = Counter()
+        self.token_counts = Counter()
+        self.dedup = Counter()
+        self.attachments = Counter()
+        self.spaces = {space: Counter() for space in args.spaces}
+        self._lock = threading.Lock()
+        self._embed_lock = threading.Lock()
+        self._local = threading.local()
+        # Canonical chunks written by this run, shared by every space and guarded by self._lock
+        self.canonicals = CanonicalIndex(threshold=dedup_threshold) if ingest_dedup else None
+
+        # The global worker budget, split between the spaces ingested concurrently
+        concurrency = min(args.space_workers, len(args.spaces))
+        self.download_workers = max(1, args.download_workers // concurrency)
+        self.extract_workers = max(1, args.extract_workers // concurrency)
+        self.summary_workers = max(1, args.summary_workers // concurrency)
+
+        new_index = None if local_store else versioned_index_name(elasticsearch_indexname) if args.reindex else elasticsearch_indexname
+        self.write_index, self.resumed = checkpoint.start(key, new_index)
+        if args.reindex:
+            # Created with a plain client first: the document store would create it with default settings on first use
+            print(f"Building index {self.write_index} for alias {elasticsearch_indexname}")
+            client = Elasticsearch(elasticsearch_url, basic_auth=(elasticsearch_username, elasticsearch_password), verify_certs=False)
+            create_build_index(client, self.write_index, document_mapping(vector_quantization), shards=index_shards)
+            client.close()
+        if local_store:
+            self.document_store = LocalDocumentStore(local_store_path)
         else:
-            
-            processed_data["data_types"].append(item)
-
-    return processed_data
-
-
-
-
-document_store = ElasticsearchDocumentStore(hosts = elasticsearch_url,basic_auth=(elasticsearch_username, elasticsearch_password), index=elasticsearch_indexname, embedding_similarity_function = "cosine",verify_certs=False)
-
-response = confluence_program.query_search('type = page')
-if response:
-    page_texts = confluence_program.get_page_text(response)
-    page_dict = {}
-    for page_id, content in page_texts.items():
-        plain_text = confluence_program.extract_plain_text(content['text'])
-        
-        page_dict[page_id] = {
-            "title": content['title'],
-            "text": confluence_program.text_to_docx(plain_text, f"{content['title']}.docx")
-        }
-            
-data_list = []
-for page_id, content in page_dict.items():
-    data_list.append({
-        "Page_ID": page_id,
-        "Page_Title": content['title'],
-        "Page": content['text']
-    })
+            self.document_store = ElasticsearchDocumentStore(hosts = elasticsearch_url,basic_auth=(elasticsearch_username, elasticsearch_password), index=self.write_index, embedding_similarity_function = "cosine", custom_mapping=document_mapping(vector_quantization), verify_certs=False)
 
-# Create a pandas DataFrame
-df_1 = pd.DataFrame(data_list)
-
-
-page_id, email, name, accountId, title, page_url,date = confluence_program.retrieve_confluence_pages()
-page_data = [page_id, email, name, accountId, page_url,date]
-pages_list_data = [lst[1:] for lst in page_data]
-
-data=[]
-for i in range(len(page_data)):
-    data.append(page_data[i])
-
-transposed_data = list(map(list, zip(*data)))
-columns = ["Page_ID", "Author_Email", "Author_Name", "Author_ID", "Page_URL", "Date"]
-
-df_2 = pd.DataFrame(transposed_data, columns=columns)
-
-
-df = pd.merge(df_1, df_2, on="Page_ID", how="inner")
-
-df["UUID"] = [str(uuid.uuid4()) for _ in range(len(df))]
-
-col = ["UUID", "Page_ID", "Author_Email", "Author_Name", "Author_ID", "Page_Title", "Page_URL", "Date"]
-
-files_path=list(df["Page"])
-
-metadata_df=df[col]
-metadata_list = metadata_df.to_dict(orient="records")
-file_metadata_pairs = []
-for i in range(len(files_path)):
-    content=read_docx(files_path[i])
-    processed_data = read_files(content)
-    metadata = metadata_list[i]
-    processed_data_str = json.dumps(processed_data, indent=2)  
-    pair = {"content": processed_data_str, "meta": metadata}
-    file_metadata_pairs.append(pair)
-
-print(f"Len of Metadata Pair {len(file_metadata_pairs)}")
-
-print(f"Checking First Pair of Data {file_metadata_pairs[1].get('content')}")
-    
-cleaner = DocumentCleaner(
-    unicode_normalization="NFKC",  
-    ascii_only=False,              
-    remove_empty_lines=True,       
-    remove_extra_whitespaces=True, 
-    remove_repeated_substrings=False   
-)
-splitter = DocumentSplitter(
-    split_by="word", 
-    split_length=500, 
-    split_overlap=50, 
-    split_threshold=200
-)
-
-docs = [Document(content=pair["content"], meta=pair["meta"]) for pair in file_metadata_pairs]
+        if local_store:
+            self.page_store = LocalDocumentStore(os.path.join(local_store_path, "pages"))
+        else:
+            self.page_store = PageVectorIndex(self.document_store.client, elasticsearch_page_indexname)
+            self.page_store.ensure_index(vector_quantization)
+        self.summary_store = SummaryStore(self.document_store.client, elasticsearch_summary_indexname) if args.summaries else None
+
+        device = args.device or ("cuda:0" if torch.cuda.is_available() else None)
+        print(f"Using {device or 'CPU'}")
+        self.document_embedder = SentenceTransformersDocumentEmbedder(
+            model="BAAI/bge-m3", device=ComponentDevice.from_str(device) if device else None, batch_size=args.embed_batch_size
+        )
+
+    @property
+    def chunker(self):
+        """The structure chunker of the current thread (tokenizers must not be shared between threads)."""
+        if not hasattr(self._local, "chunker"):
+            self._local.chunker = make_chunker()
+        return self._local.chunker
+
+    def page_pairs(self, pages):
+        """Converts a batch of page JSON objects into content/meta pairs."""
+        pairs = []
+        for page in pages:
+            html = page.get("body", {}).get("storage", {}).get("value", "")
+            with self.profiler.stage("html_extraction") as stage:
+                plain_text = confluence_program.extract_plain_text(html)
+                stage.add(items=1, nbytes=len(html.encode("utf-8")))
+            with self.profiler.stage("docx_build") as stage:
+                doc = confluence_program.text_to_docx(plain_text, f"{page['title']}.docx")
+                stage.add(items=1, nbytes=len(plain_text.encode("utf-8")))
+            with self.profiler.stage("docx_read") as stage:
+                pair = page_pair(doc, page_metadata(page), chunker_mode)
+                pairs.append(pair)
+                stage.add(items=1, nbytes=len(pair["content"].encode("utf-8")))
+        return pairs
+
+    def split(self, sources):
+        docs = [Document(content=pair["content"], meta=pair["meta"]) for pair in sources]
+        if self.chunker is not None:
+            # Chunks follow headings, tables and code blocks and are sized with the bge-m3 tokenizer
+            with self.profiler.stage("splitting") as stage:
+                split_documents = self.chunker.run(sources)
+                stage.add(items=len(docs), nbytes=content_bytes(docs))
+            with self._lock:
+                for doc in split_documents:
+                    tokens = doc.meta["token_count"]
+                    self.token_counts["count"] += 1
+                    self.token_counts["sum"] += tokens
+                    self.token_counts["min"] = min(self.token_counts.get("min", tokens), tokens)
+                    self.token_counts["max"] = max(self.token_counts["max"], tokens)
+            return split_documents
+        cleaner = make_cleaner()
+        splitter = make_splitter()
+        with self.profiler.stage("cleaning") as stage:
+            cleaned_docs = cleaner.run(docs)
+            stage.add(items=len(docs), nbytes=content_bytes(docs))
+        with self.profiler.stage("splitting") as stage:
+            split_docs = splitter.run(cleaned_docs.get("documents"))
+            stage.add(items=len(cleaned_docs.get("documents")), nbytes=content_bytes(cleaned_docs.get("documents")))
+        return split_docs.get("documents")
+
+    def ingest_batch(self, space, pages):
+        """
+        Ingests one batch of pages and checkpoints it.
+
+        Args:
+            space (str): The space key the pages belong to.
+            pages (List[dict]): Page JSON objects from `confluence_program.iter_space_pages`.
+
+        Returns:
+            int: The number of chunks written.
+        """
+        file_metadata_pairs = self.page_pairs(pages)
+        metadata_list = [pair["meta"] for pair in file_metadata_pairs]
+
+        attachment_sources = []
+        replaced_attachments = []
+        if self.args.attachments:
+            # PDFs, Office files and text attachments are chunked with their parent page's metadata
+            with self.profiler.stage("attachments") as stage:
+                attachment_result = attachment_pairs(
+                    metadata_list,
+                    client=None if local_store else self.document_store.client,
+                    index=self.write_index,
+                    max_bytes=attachment_max_bytes,
+                    time_limit=attachment_timeout,
+                    max_chars=attachment_max_chars,
+                    download_workers=self.download_workers,
+                    extract_workers=self.extract_workers,
+                    profiler_stage=stage,
+                )
+            attachment_sources = attachment_result["pairs"]
+            replaced_attachments = attachment_result["replaced"]
+            with self._lock:
+                self.attachments.update(attachment_result["stats"])
+
+        split_documents = self.split(file_metadata_pairs + attachment_sources)
+
+        signatures, alias_updates = None, set()
+        if ingest_dedup:
+            # Copied templates and boilerplate are embedded and indexed once; the copy keeps the other pages as aliases
+            with self.profiler.stage("dedup") as stage:
+                stage.add(items=len(split_documents), nbytes=content_bytes(split_documents))
+                split_documents, dedup_report = collapse_near_duplicates(split_documents, threshold=dedup_threshold)
+                with self._lock:
+                    split_documents, signatures, alias_updates, run_report = self.canonicals.collapse(split_documents)
+            for field, value in run_report.items():
+                dedup_report[field] = dedup_report.get(field, 0) + value
+            dedup_report["chunks_out"] = len(split_documents)
+            with self._lock:
+                self.dedup.update({k: v for k, v in dedup_report.items() if k != "bytes_saved_ratio"})
+                self.dedup["bytes_in"] += content_bytes(split_documents) + dedup_report["bytes_saved"]
+
+        with self._embed_lock, self.profiler.stage("embedding") as stage:
+            self.document_embedder.warm_up()
+            documents = self.document_embedder.run(split_documents).get("documents")
+            stage.add(items=len(split_documents), nbytes=content_bytes(split_documents))
+
+        with self.profiler.stage("es_write") as stage:
+            page_ids = [meta["Page_ID"] for meta in metadata_list]
+            # Pages indexed before (by an earlier run or an interrupted attempt) are replaced
+            replace_previous = not self.args.reindex or self.resumed
+            stored = self.stored_alias_chunks(page_ids) if replace_previous else []
+            restore_aliases(documents, stored)
+            routing_field = "Space_Key" if space_routing else None
+            if self.args.reindex:
+                written = bulk_write_documents(self.document_store.client, self.write_index, documents, routing_field=routing_field)
+            elif routing_field and not local_store:
+                written = bulk_write_documents(self.document_store.client, self.write_index, documents, routing_field=routing_field,
+                                               refresh="wait_for")
+            else:
+                written = self.document_store.write_documents(documents, policy=DuplicatePolicy.OVERWRITE)
+            stage.add(items=written, nbytes=content_bytes(documents))
+            if replace_previous:
+                # They lose the chunks they no longer have, except those other pages are aliased onto
+                stale, rehomed = self.remove_stale_chunks(page_ids, [doc.id for doc in documents], stored)
+                with self._lock:
+                    self.totals.update(stale_chunks_deleted=stale, alias_chunks_rehomed=rehomed)
+            if alias_updates:
+                self.update_aliases(alias_updates)
+            if replaced_attachments and not self.args.reindex:
+                delete_replaced_versions(self.document_store.client, self.write_index, replaced_attachments)
+            if local_store and attachment_sources:
+                # Every attachment was re-extracted; drop the chunks of versions other than the current one
+                current_versions = {pair["meta"]["Attachment_ID"]: pair["meta"]["Attachment_Version"] for pair in attachment_sources}
+                stored = self.document_store.filter_documents({"field": "meta.Attachment_ID", "operator": "in", "value": list(current_versions)})
+                self.document_store.delete_documents([doc.id for doc in stored
+                                                      if doc.meta.get("Attachment_Version") != current_versions[doc.meta["Attachment_ID"]]])
+
+        with self.profiler.stage("page_vectors") as stage:
+            # One vector per page (the mean of its chunk vectors) for two-stage retrieval in the API
+            page_vector_list = page_vectors(documents)
+            if local_store:
+                self.page_store.write_documents(page_documents(page_vector_list), policy=DuplicatePolicy.OVERWRITE)
+            else:
+                self.page_store.write(page_vector_list)
+            stage.add(items=len(page_vector_list))
+
+        if self.summary_store is not None:
+            with self.profiler.stage("summaries") as stage:
+                summary_pages = [{**pair["meta"], "content": pair["content"]} for pair in file_metadata_pairs]
+                summary_counts = summarize_pages(summary_pages, self.summary_store, api_url, summary_model, max_workers=self.summary_workers)
+                stage.add(items=summary_counts["summarized"], nbytes=sum(len(page["content"].encode("utf-8")) for page in summary_pages))
+            with self._lock:
+                self.totals.update({f"summaries_{k}": v for k, v in summary_counts.items()})
+
+        chunks_per_page = Counter(doc.meta.get("Page_ID") for doc in documents)
+        self.checkpoint.record_batch(self.key, [(meta["Page_ID"], meta["Version"], chunks_per_page[meta["Page_ID"]]) for meta in metadata_list])
+        with self._lock:
+            if signatures is not None:
+                # Only checkpointed pages, which this run will not rewrite, hold other pages' aliases
+                self.canonicals.add(documents, signatures)
+            self.totals.update(batches=1, pages=len(pages), chunks=len(documents), attachments=len(attachment_sources))
+            self.spaces[space].update(batches=1, pages=len(pages), chunks=len(documents), bytes=content_bytes(documents))
+        return written
+
+    def stored_alias_chunks(self, page_ids):
+        """Reads the stored chunks of a batch's pages that hold other pages' aliases."""
+        if local_store:
+            return self.document_store.alias_chunks(page_ids)
+        client = self.document_store.client
+        if self.args.reindex:
+            # A build index is not refreshed on its own; an interrupted attempt's chunks must be searchable to be found
+            client.indices.refresh(index=self.write_index)
+        return alias_chunks(client, self.write_index, page_ids)
+
+    def remove_stale_chunks(self, page_ids, keep_ids, stored):
+        """
+        Deletes the chunks of re-ingested pages that this batch did not write, like `remove_page` in the API.
+
+        A stale chunk that holds other pages' aliases is handed over to the first aliased page
+        instead, so pages collapsed into it in an earlier run, and not re-ingested by this one,
+        keep their content. Attachment chunks are left alone; replaced attachment versions are
+        deleted separately.
+
+        Args:
+            page_ids (List[str]): The pages of the batch.
+            keep_ids (List[str]): The ids of the chunks the batch wrote.
+            stored (List[dict]): The pages' alias-holding chunks, from `stored_alias_chunks`.
+
+        Returns:
+            Tuple[int, int]: The number of deleted chunks and of chunks handed over to an aliased page.
+        """
+        rehomed = rehome_aliases(stored, keep_ids)
+        keep_ids = set(keep_ids) | set(rehomed)
+        if local_store:
+            self.document_store.update_meta(rehomed)
+            ids = [doc_id for page_id in page_ids for doc_id in self.document_store.page_document_ids(page_id) if doc_id not in keep_ids]
+            self.document_store.delete_documents(ids)
+            return len(ids), len(rehomed)
+        client = self.document_store.client
+        if rehomed:
+            routing = {chunk["id"]: chunk.get("Space_Key") for chunk in stored} if space_routing else None
+            bulk_update_documents(client, self.write_index, rehomed, routing=routing)
+        query = {"bool": {"filter": [{"terms": {"Page_ID": list(page_ids)}}],
+                          "must_not": [{"ids": {"values": list(keep_ids)}}, {"exists": {"field": "Attachment_ID"}}]}}
+        response = client.delete_by_query(index=self.write_index, query=query, refresh=not self.args.reindex, conflicts="proceed")
+        return response.get("deleted", 0), len(rehomed)
+
+    def update_aliases(self, chunk_ids):
+        """
+        Writes the current alias fields of canonical chunks from earlier batches that gained aliases.
+
+        The fields are read and written under the run lock, so concurrent batches cannot overwrite
+        each other's aliases with an older list.
+
+        Args:
+            chunk_ids (Set[str]): The ids of the canonical chunks to update.
+        """
+        with self._lock:
+            updates = {chunk_id: self.canonicals.aliases(chunk_id) for chunk_id in chunk_ids}
+            routing = {chunk_id: fields.pop("Space_Key") for chunk_id, fields in updates.items()}
+            if local_store:
+                self.document_store.update_meta(updates)
+            else:
+                bulk_update_documents(self.document_store.client, self.write_index, updates,
+                                      routing=routing if space_routing else None)
+
+    def ingest_space(self, space, completed):
+        """Ingests the pages of one space batch by batch, recording its throughput."""
+        started = time.perf_counter()
+        try:
+            for pages, skipped in page_batches([space], self.args.page_batch_size, completed, self.profiler):
+                with self._lock:
+                    self.totals.update(skipped=skipped)
+                    self.spaces[space].update(skipped=skipped)
+                if pages:
+                    written = self.ingest_batch(space, pages)
+                    print(f"[{space}] batch {self.spaces[space]['batches']}: {len(pages)} pages, {written} chunks written "
+                          f"({self.totals['pages']} pages done in all spaces, {self.totals['skipped']} skipped as checkpointed)")
+        finally:
+            self.spaces[space]["wall_time_s"] += time.perf_counter() - started
+
+    def run(self, completed):
+        """
+        Ingests every space, `--space-workers` at a time.
+
+        A failing space does not stop the others; once all have ended, the first error is raised
+        and the run stays open in the checkpoint, to be resumed.
+
+        Args:
+            completed (Dict[str, int]): Checkpointed version per page id.
+        """
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.args.space_workers, thread_name_prefix="space") as pool:
+            futures = {pool.submit(self.ingest_space, space, completed): space for space in self.args.spaces}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{futures[future]}] ingestion failed: {e}")
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+        self.finish()
+
+    def finish(self):
+        """Swaps the alias to a rebuilt index and closes the checkpointed run."""
+        if self.args.reindex:
+            with self.profiler.stage("page_vectors") as stage:
+                stage.add(items=self.page_store.retain(self.checkpoint.page_ids(self.key)))
+            with self.profiler.stage("alias_swap") as stage:
+                finalize_index(self.document_store.client, self.write_index, replicas=index_replicas)
+                previous_indices = swap_alias(self.document_store.client, elasticsearch_indexname, self.write_index)
+                retired_indices = retire_indices(self.document_store.client, elasticsearch_indexname, keep=keep_indices)
+                stage.add(items=1)
+            self.profiler.extra["reindex"] = {"index": self.write_index, "alias": elasticsearch_indexname,
+                                              "previous": previous_indices, "retired": retired_indices}
+            print(f"Alias {elasticsearch_indexname} now points to {self.write_index}; retired {retired_indices}")
+        self.checkpoint.finish(self.key)
+
+    def report(self):
+        """Adds the run totals, chunk sizes, attachment and dedup figures to the profiler report."""
+        self.profiler.extra["run"] = {"spaces": self.args.spaces, "resumed": self.resumed, **self.totals}
+        self.profiler.extra["spaces"] = {}
+        for space, counts in self.spaces.items():
+            seconds = counts["wall_time_s"]
+            self.profiler.extra["spaces"][space] = {
+                **{key: value for key, value in counts.items() if key != "wall_time_s"},
+                "wall_time_s": round(seconds, 2),
+                "pages_per_s": round(counts["pages"] / seconds, 2) if seconds else None,
+                "chunks_per_s": round(counts["chunks"] / seconds, 2) if seconds else None,
+                "bytes_per_s": round(counts["bytes"] / seconds, 2) if seconds else None,
+            }
+        if self.token_counts["count"]:
+            self.profiler.extra["chunks"] = {
+                "count": self.token_counts["count"],
+                "mean_tokens": self.token_counts["sum"] / self.token_counts["count"],
+                "min_tokens": self.token_counts["min"],
+                "max_tokens": self.token_counts["max"],
+            }
+        if self.attachments:
+            self.profiler.extra["attachments"] = dict(self.attachments)
+        if self.dedup:
+            dedup = dict(self.dedup)
+            bytes_in = dedup.pop("bytes_in")
+            self.profiler.extra["dedup"] = {**dedup, "bytes_saved_ratio": dedup["bytes_saved"] / bytes_in if bytes_in else 0.0}
+
+
+def make_chunker():
+    if chunker_mode == "structure":
+        return StructureChunker(tokenizer_model="BAAI/bge-m3", max_tokens=chunk_max_tokens, min_tokens=chunk_min_tokens)
+    return None
+
+
+def dry_run(args, completed, profiler):
+    """
+    Counts the pages and chunks a run would process, without embedding or writing anything.
+
+    Attachments are not downloaded, so their chunks are not counted.
+    """
+    chunker = make_chunker()
+    counts = Counter()
+    for pages, skipped in page_batches(args.spaces, args.page_batch_size, completed, profiler):
+        counts.update(checkpointed=skipped)
+        if not pages:
+            continue
+        pairs = [page_pair(build_page_docx(page["title"], page.get("body", {}).get("storage", {}).get("value", "")),
+                           page_metadata(page), chunker_mode) for page in pages]
+        documents = chunk_pairs(pairs, chunker_mode, chunker)
+        counts.update(batches=1, pages=len(pages), chunks=len(documents),
+                      tokens=sum(doc.meta.get("token_count", 0) for doc in documents))
+        counts.update(f"space:{page.get('space', {}).get('key')}" for page in pages)
+    return {
+        "spaces": args.spaces,
+        "pages_checkpointed": counts["checkpointed"],
+        "pages_to_process": counts["pages"],
+        "pages_per_space": {key[len("space:"):]: value for key, value in counts.items() if key.startswith("space:")},
+        "batches": counts["batches"],
+        "chunks": counts["chunks"],
+        "tokens": counts["tokens"] if chunker is not None else None,
+        "note": "chunk counts are before near-duplicate collapsing and exclude attachments",
+    }
 
-cleaned_docs = cleaner.run(docs)
-split_docs = splitter.run(cleaned_docs.get("documents"))
 
-if torch.cuda.is_available():
-    print("Using GPU")
-    document_embedder = SentenceTransformersDocumentEmbedder(
-        model="BAAI/bge-m3" ,device = ComponentDevice.from_str("cuda:0")
-    )
-else:
-    print("Using CPU")
-    document_embedder = SentenceTransformersDocumentEmbedder(
-        model="BAAI/bge-m3" )
-document_embedder.warm_up()
-documents_with_embeddings = document_embedder.run(split_docs.get("documents"))
-document_store.write_documents(documents_with_embeddings.get("documents"), policy=DuplicatePolicy.SKIP)
\ No newline at end of file
+def main(argv=None):
+    args = parse_args(argv)
+    key = ingestion_run_key(args)
+    checkpoint = IngestCheckpoint(args.checkpoint)
+
+    if args.dry_run:
+        # Read-only: an interrupted run's pages count as done unless --restart would discard them
+        resumable = checkpoint.open_run(key) is not None and not args.restart
+        completed = checkpoint.completed(key) if resumable else {}
+        print(json.dumps(dry_run(args, completed, IngestionProfiler()), indent=2))
+        return
+
+    if args.restart:
+        checkpoint.reset(key)
+    profiler = IngestionProfiler()
+    atexit.register(profiler.write_report)
+    run = IngestionRun(args, key, checkpoint, profiler)
+    atexit.register(run.report)
+    completed = checkpoint.completed(key)
+    if run.resumed:
+        print(f"Resuming the interrupted run into {run.write_index or local_store_path}: {len(completed)} pages already done")
+    run.run(completed)
+
+
+if __name__ == "__main__":
+    main()
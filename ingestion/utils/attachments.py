@@ -0,0 +1,300 @@
+import csv
+import multiprocessing
+import os
+import re
+import signal
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from confluence.utils import confluence_program
+from ingestion.utils.chunker import blocks_to_text, extract_blocks
+
+# File extensions text can be extracted from, and the extractor each one uses
+EXTRACTORS = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".pptx": "pptx",
+    ".csv": "csv",
+    ".txt": "text",
+    ".md": "text",
+    ".json": "text",
+    ".xml": "text",
+    ".log": "text",
+}
+
+# Chunk fields describing the attachment a chunk came from
+ATTACHMENT_FIELDS = ("Attachment_ID", "Attachment_Title", "Attachment_Version", "Attachment_URL", "Media_Type")
+
+
+def attachment_kind(title: str) -> Optional[str]:
+    return EXTRACTORS.get(os.path.splitext(title.lower())[1])
+
+
+def _paragraph_blocks(text: str, section: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {"kind": "text", "text": paragraph.strip(), "section_path": section}
+        for paragraph in re.split(r"\n\s*\n", text)
+        if paragraph.strip()
+    ]
+
+
+def _table_block(rows, section: List[str]) -> Optional[Dict[str, Any]]:
+    lines = [" | ".join("" if cell is None else str(cell).strip() for cell in row) for row in rows]
+    lines = [line for line in lines if line.strip(" |")]
+    return {"kind": "table", "text": "\n".join(lines), "section_path": section} if lines else None
+
+
+def _extract(path: str, kind: str, title: str) -> List[Dict[str, Any]]:
+    section = [title]
+    if kind == "pdf":
+        from pypdf import PdfReader
+
+        blocks = []
+        for number, page in enumerate(PdfReader(path).pages, start=1):
+            blocks.extend(_paragraph_blocks(page.extract_text() or "", section + [f"Page {number}"]))
+        return blocks
+    if kind == "docx":
+        import docx
+
+        return [{**block, "section_path": section + block["section_path"]} for block in extract_blocks(docx.Document(path))]
+    if kind == "xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        blocks = []
+        for sheet in workbook.worksheets:
+            block = _table_block(sheet.iter_rows(values_only=True), section + [sheet.title])
+            if block:
+                blocks.append(block)
+        workbook.close()
+        return blocks
+    if kind == "pptx":
+        from pptx import Presentation
+
+        blocks = []
+        for number, slide in enumerate(Presentation(path).slides, start=1):
+            text = "\n\n".join(shape.text_frame.text for shape in slide.shapes if shape.has_text_frame)
+            blocks.extend(_paragraph_blocks(text, section + [f"Slide {number}"]))
+        return blocks
+    if kind == "csv":
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            block = _table_block(csv.reader(f), section)
+        return [block] if block else []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return _paragraph_blocks(f.read(), section)
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("attachment extraction timed out")
+
+
+def extract_attachment_blocks(path: str, kind: str, title: str, time_limit: float, max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Extracts the text of one downloaded attachment as chunker blocks; runs in a worker process.
+
+    The extraction is interrupted after `time_limit` seconds (where `SIGALRM` is available and it
+    runs on a process's main thread), and the text is cut off after `max_chars` characters.
+
+    Args:
+        path (str): The downloaded file.
+        kind (str): The extractor, from `EXTRACTORS`.
+        title (str): The attachment title, used as the root of every block's `section_path`.
+        time_limit (float): Seconds the extraction may take.
+        max_chars (int): Characters of text to keep.
+
+    Returns:
+        List[Dict[str, Any]]: Blocks in the format of `chunker.extract_blocks`.
+    """
+    alarm = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        blocks = _extract(path, kind, title)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    kept, total = [], 0
+    for block in blocks:
+        if total + len(block["text"]) > max_chars:
+            break
+        kept.append(block)
+        total += len(block["text"])
+    return kept
+
+
+def extraction_pool(workers: Optional[int]):
+    """
+    Creates the pool that extracts attachment text.
+
+    Forked worker processes are used where available, spawned ones elsewhere (the ingestion
+    command keeps its work behind a `__main__` guard, so spawned workers only import it).
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def indexed_versions(client, index: str, attachment_ids: List[str]) -> Dict[str, Any]:
+    """
+    Looks up which version of each attachment is already indexed.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index (or alias) being written.
+        attachment_ids (List[str]): The attachments to look up.
+
+    Returns:
+        Dict[str, Any]: The indexed version per attachment id.
+    """
+    if not attachment_ids or not client.indices.exists(index=index):
+        return {}
+    response = client.search(
+        index=index,
+        size=len(attachment_ids),
+        query={"bool": {"filter": [{"terms": {"Attachment_ID": attachment_ids}}]}},
+        collapse={"field": "Attachment_ID"},
+        _source=["Attachment_ID", "Attachment_Version"],
+    )
+    return {hit["_source"]["Attachment_ID"]: hit["_source"].get("Attachment_Version") for hit in response["hits"]["hits"]}
+
+
+def delete_replaced_versions(client, index: str, replaced: List[Dict[str, Any]]) -> int:
+    """
+    Deletes the chunks of older versions of re-ingested attachments.
+
+    Args:
+        client: The Elasticsearch client.
+        index (str): The index (or alias) that was written.
+        replaced (List[Dict[str, Any]]): `Attachment_ID` and new `Attachment_Version` of each attachment.
+
+    Returns:
+        int: The number of deleted chunks.
+    """
+    deleted = 0
+    for attachment in replaced:
+        response = client.delete_by_query(
+            index=index,
+            query={"bool": {
+                "filter": [{"term": {"Attachment_ID": attachment["Attachment_ID"]}}],
+                "must_not": [{"term": {"Attachment_Version": attachment["Attachment_Version"]}}],
+            }},
+            conflicts="proceed",
+        )
+        deleted += response.get("deleted", 0)
+    return deleted
+
+
+def attachment_pairs(pages: List[Dict[str, Any]], client=None, index: Optional[str] = None, max_bytes: int = 50 * 2**20,
+                     time_limit: float = 60.0, max_chars: int = 2_000_000, download_workers: int = 8,
+                     extract_workers: Optional[int] = None, profiler_stage=None) -> Dict[str, Any]:
+    """
+    Lists, downloads and extracts the attachments of many pages.
+
+    Attachments are listed per page with pagination, skipped when they have no extractor, are
+    larger than `max_bytes` or are already indexed at the same version, streamed to a temporary
+    directory by a bounded thread pool, and extracted in a process pool as downloads complete.
+
+    Args:
+        pages (List[Dict[str, Any]]): The parent pages' chunk metadata (with `Page_ID`).
+        client: The Elasticsearch client, to skip unchanged attachments (optional).
+        index (Optional[str]): The index (or alias) being written.
+        max_bytes (int): The largest attachment to download.
+        time_limit (float): Seconds each extraction may take.
+        max_chars (int): Characters of text kept per attachment.
+        download_workers (int): Concurrent downloads.
+        extract_workers (Optional[int]): Extraction processes (default: CPU count).
+        profiler_stage: A `StageStats` to record downloaded items and bytes (optional).
+
+    Returns:
+        Dict[str, Any]: `pairs` (content/meta/blocks, like `preprocessing.page_pair`), `stats`, and
+        `replaced`: the attachments whose older indexed version should be deleted once the new one is written.
+    """
+    stats = {"listed": 0, "unsupported": 0, "too_large": 0, "unchanged": 0, "downloaded": 0, "extracted": 0, "failed": 0}
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    with ThreadPoolExecutor(max_workers=download_workers) as listing:
+        listed = list(listing.map(lambda page: (page, confluence_program.content_attachments(page["Page_ID"], session=session)), pages))
+
+    candidates = []
+    for page, attachments in listed:
+        for attachment in attachments:
+            stats["listed"] += 1
+            kind = attachment_kind(attachment["title"])
+            size = attachment.get("extensions", {}).get("fileSize") or 0
+            if kind is None:
+                stats["unsupported"] += 1
+            elif size > max_bytes:
+                stats["too_large"] += 1
+            else:
+                candidates.append((page, attachment, kind))
+
+    replaced = []
+    if client is not None and index:
+        known = indexed_versions(client, index, [attachment["id"] for _, attachment, _ in candidates])
+        unchanged = [c for c in candidates if known.get(c[1]["id"]) == c[1]["version"]["number"]]
+        stats["unchanged"] = len(unchanged)
+        candidates = [c for c in candidates if known.get(c[1]["id"]) != c[1]["version"]["number"]]
+        replaced = [{"Attachment_ID": a["id"], "Attachment_Version": a["version"]["number"]} for _, a, _ in candidates if a["id"] in known]
+
+    pairs = []
+    with tempfile.TemporaryDirectory() as directory, \
+            ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            extraction_pool(extract_workers) as extractors:
+
+        def download(candidate):
+            _, attachment, _ = candidate
+            path = os.path.join(directory, f"{attachment['id']}-{attachment['version']['number']}")
+            return path, confluence_program.download_attachment(attachment, path, max_bytes, session=session)
+
+        extracting = {}
+        download_futures = {downloads.submit(download, c): c for c in candidates}
+        for future in as_completed(download_futures):
+            page, attachment, kind = download_futures[future]
+            try:
+                path, written = future.result()
+            except Exception as e:
+                print(f"Failed to download attachment {attachment['title']}: {e}")
+                stats["failed"] += 1
+                continue
+            if written is None:
+                stats["too_large"] += 1
+                continue
+            stats["downloaded"] += 1
+            if profiler_stage is not None:
+                profiler_stage.add(items=1, nbytes=written)
+            extracting[extractors.submit(extract_attachment_blocks, path, kind, attachment["title"], time_limit, max_chars)] = (page, attachment, path)
+
+        for future in as_completed(extracting):
+            page, attachment, path = extracting[future]
+            try:
+                blocks = future.result()
+            except Exception as e:
+                print(f"Failed to extract attachment {attachment['title']}: {e}")
+                stats["failed"] += 1
+                continue
+            finally:
+                os.remove(path)
+            if not blocks:
+                continue
+            stats["extracted"] += 1
+            meta = {
+                **page,
+                "Attachment_ID": attachment["id"],
+                "Attachment_Title": attachment["title"],
+                "Attachment_Version": attachment["version"]["number"],
+                "Attachment_URL": attachment["_links"].get("webui") or attachment["_links"]["download"],
+                "Media_Type": attachment.get("metadata", {}).get("mediaType") or attachment.get("mediaType"),
+            }
+            pairs.append({"content": blocks_to_text(blocks), "meta": meta, "blocks": blocks})
+    return {"pairs": pairs, "stats": stats, "replaced": replaced}
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def run_key(**settings: Any) -> str:
+    """Identifies an ingestion run by the settings that decide what it writes (spaces, target index, chunker)."""
+    return json.dumps(settings, sort_keys=True)
+
+
+class IngestCheckpoint:
+    """
+    Durable record of the page batches an ingestion run has completed, backed by SQLite.
+
+    A batch is recorded only after its chunks, page vectors and summaries were written, in one
+    transaction, so a run that dies mid-batch redoes just that batch. A run stays open until
+    `finish` is called; rerunning with the same `run_key` resumes it, skipping every page
+    already recorded at its current version and writing into the same index. Once finished, the
+    next run with that key starts from scratch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_key TEXT PRIMARY KEY, write_index TEXT, started_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " run_key TEXT NOT NULL, page_id TEXT NOT NULL, version INTEGER, chunks INTEGER NOT NULL,"
+            " completed_at REAL NOT NULL, PRIMARY KEY (run_key, page_id))"
+        )
+
+    def open_run(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the unfinished run with this key (`write_index`, `started_at`, `pages`), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT write_index, started_at FROM runs WHERE run_key = ? AND finished_at IS NULL", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages WHERE run_key = ?", (key,)).fetchone()[0]
+        return {"write_index": row[0], "started_at": row[1], "pages": pages}
+
+    def start(self, key: str, write_index: Optional[str]) -> Tuple[Optional[str], bool]:
+        """
+        Resumes the unfinished run with this key, or starts a new one.
+
+        Args:
+            key (str): The run key, see `run_key`.
+            write_index (Optional[str]): The index a new run writes to.
+
+        Returns:
+            Tuple[Optional[str], bool]: The index to write to (the resumed run's own) and whether the run was resumed.
+        """
+        resumed = self.open_run(key)
+        if resumed is not None:
+            return resumed["write_index"], True
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM pages WHERE run_key = ?", (key,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs (run_key, write_index, started_at, finished_at) VALUES (?, ?, ?, NULL)",
+                (key, write_index, time.time()),
+            )
+            self._conn.execute("COMMIT")
+        return write_index, False
+
+    def reset(self, key: str) -> None:
+        """Forgets the run with this key, so the next `start` begins from scratch."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM pages WHERE run_key = ?", (key,))
+            self._conn.execute("DELETE FROM runs WHERE run_key = ?", (key,))
+            self._conn.execute("COMMIT")
+
+    def completed(self, key: str) -> Dict[str, Optional[int]]:
+        """Returns the recorded version of every page the run has completed."""
+        with self._lock:
+            rows = self._conn.execute("SELECT page_id, version FROM pages WHERE run_key = ?", (key,)).fetchall()
+        return dict(rows)
+
+    def record_batch(self, key: str, pages: Iterable[Tuple[str, Optional[int], int]]) -> None:
+        """
+        Records a completed batch atomically.
+
+        Args:
+            key (str): The run key.
+            pages (Iterable[Tuple[str, Optional[int], int]]): Page id, version and chunk count per page.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (run_key, page_id, version, chunks, completed_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, page_id, version, chunks, now) for page_id, version, chunks in pages],
+            )
+            self._conn.execute("COMMIT")
+
+    def page_ids(self, key: str) -> List[str]:
+        """Returns the ids of every page the run has completed."""
+        return list(self.completed(key))
+
+    def finish(self, key: str) -> None:
+        """Marks the run finished; its pages are no longer skipped by later runs."""
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_key = ?", (time.time(), key))
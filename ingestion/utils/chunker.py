@@ -0,0 +1,245 @@
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from haystack import Document
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).strip()
+
+
+def extract_blocks(doc) -> List[Dict[str, Any]]:
+    """
+    Walks a page's docx body in order and returns its structural blocks.
+
+    Consecutive `Code` paragraphs are merged into one code block, tables become one block with
+    their rows as `|`-separated lines, and every block carries the path of headings it sits under.
+
+    Args:
+        doc: The python-docx Document built by `confluence_program.text_to_docx`.
+
+    Returns:
+        List[Dict[str, Any]]: Blocks with `kind` ("heading", "text", "table" or "code"), `text`
+        and `section_path`.
+    """
+    blocks = []
+    headings: List[tuple] = []
+    code_lines: List[str] = []
+    list_number = 0
+
+    def flush_code():
+        if code_lines:
+            blocks.append({"kind": "code", "text": "\n".join(code_lines), "section_path": [h for _, h in headings]})
+            code_lines.clear()
+
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn("w:tbl"):
+            flush_code()
+            rows = []
+            for row in Table(child, doc).rows:
+                cells = [_normalize(cell.text) for cell in row.cells]
+                rows.append(" | ".join(cells))
+            if rows:
+                blocks.append({"kind": "table", "text": "\n".join(rows), "section_path": [h for _, h in headings]})
+            continue
+        if child.tag != qn("w:p"):
+            continue
+
+        paragraph = Paragraph(child, doc)
+        style = paragraph.style.name if paragraph.style is not None else ""
+        if style == "Code":
+            code_lines.append(paragraph.text.rstrip())
+            continue
+        flush_code()
+        text = _normalize(paragraph.text)
+        if not text:
+            continue
+
+        if style == "Title" or style.startswith("Heading"):
+            level = int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+            headings = [(lvl, h) for lvl, h in headings if lvl < level] + [(level, text)]
+            blocks.append({"kind": "heading", "text": text, "section_path": [h for _, h in headings]})
+            list_number = 0
+        elif style == "List Number":
+            list_number += 1
+            blocks.append({"kind": "text", "text": f"{list_number}. {text}", "section_path": [h for _, h in headings]})
+        elif style == "List Bullet":
+            blocks.append({"kind": "text", "text": f"- {text}", "section_path": [h for _, h in headings]})
+        else:
+            list_number = 0
+            blocks.append({"kind": "text", "text": text, "section_path": [h for _, h in headings]})
+    flush_code()
+    return blocks
+
+
+def blocks_to_text(blocks: List[Dict[str, Any]]) -> str:
+    """
+    Renders blocks as plain page text, marking tables and code the way `extract_plain_text` does.
+
+    Args:
+        blocks (List[Dict[str, Any]]): Blocks from `extract_blocks`.
+
+    Returns:
+        str: The page text.
+    """
+    parts = []
+    for block in blocks:
+        if block["kind"] == "table":
+            parts.append(f"[Table Start]\n{block['text']}\n[Table End]")
+        elif block["kind"] == "code":
+            parts.append(f"[Code Block]\n{block['text']}\n[End Code Block]")
+        elif block["kind"] == "heading":
+            parts.append(f"## {block['text']}")
+        else:
+            parts.append(block["text"])
+    return "\n\n".join(parts)
+
+
+class StructureChunker:
+    """
+    Splits pages into chunks along their headings, tables and code blocks, sized in real tokens.
+
+    Block sizes are measured in one batched call to the embedding model's fast tokenizer. Blocks
+    are packed greedily up to `max_tokens`, and a chunk is closed early at a heading once it holds at
+    least `min_tokens`, so chunks stay close to a uniform size without cutting through structure.
+    A block that is too large on its own is split along rows (tables, repeating the header row),
+    lines (code) or sentences (text).
+    """
+
+    def __init__(self, tokenizer_model: str = "BAAI/bge-m3", max_tokens: int = 480, min_tokens: int = 240):
+        self.tokenizer_model = tokenizer_model
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.tokenizer = None
+
+    def warm_up(self) -> None:
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_model, use_fast=True)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Counts the tokens of many texts in one batched tokenizer call.
+
+        Args:
+            texts (List[str]): The texts to measure.
+
+        Returns:
+            List[int]: The token count of each text, without special tokens.
+        """
+        self.warm_up()
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False, return_attention_mask=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _pieces(self, block: Dict[str, Any], tokens: int) -> List[str]:
+        if block["kind"] in ("table", "code"):
+            return block["text"].split("\n")
+        sentences = re.split(r"(?<=[.!?])\s+", block["text"])
+        if len(sentences) > 1:
+            return sentences
+        words = block["text"].split()
+        # Runs of words of about a quarter of the budget each
+        step = max(1, len(words) * self.max_tokens // (4 * tokens))
+        return [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+    def _split_oversized(self, block: Dict[str, Any], tokens: int) -> List[Dict[str, Any]]:
+        if tokens <= self.max_tokens:
+            return [{**block, "tokens": tokens}]
+        pieces = self._pieces(block, tokens)
+        # Every part of a split table repeats its header row
+        header = pieces.pop(0) if block["kind"] == "table" and len(pieces) > 2 else None
+        if len(pieces) <= 1:
+            return [{**block, "tokens": tokens}]
+        counts = self.count_tokens(([header] if header is not None else []) + pieces)
+        header_tokens = counts.pop(0) if header is not None else 0
+
+        groups, current, current_tokens = [], [], header_tokens
+        for piece, count in zip(pieces, counts):
+            if current and current_tokens + count > self.max_tokens:
+                groups.append(current)
+                current, current_tokens = [], header_tokens
+            current.append(piece)
+            current_tokens += count
+        if current:
+            groups.append(current)
+
+        separator = " " if block["kind"] == "text" else "\n"
+        parts = [{**block, "text": separator.join(([header] if header is not None else []) + group)} for group in groups]
+        split = []
+        for part, size in zip(parts, self.count_tokens([part["text"] for part in parts])):
+            # A single sentence can still exceed the budget; it is split again on words
+            if size > self.max_tokens and part["text"] != block["text"]:
+                split.extend(self._split_oversized(part, size))
+            else:
+                split.append({**part, "tokens": size})
+        return split
+
+    def chunk_blocks(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Packs one page's blocks into chunks.
+
+        Args:
+            blocks (List[Dict[str, Any]]): Blocks from `extract_blocks`, each with a `tokens` count.
+
+        Returns:
+            List[Dict[str, Any]]: Chunks with `content`, `section_path` and `tokens`.
+        """
+        chunks, current, current_tokens = [], [], 0
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                chunks.append({
+                    "content": blocks_to_text(current),
+                    "section_path": " > ".join(current[0]["section_path"]),
+                    "tokens": current_tokens,
+                })
+            current, current_tokens = [], 0
+
+        sized = [part for block in blocks for part in self._split_oversized(block, block["tokens"])]
+        for block in sized:
+            at_heading = block["kind"] == "heading" and current_tokens >= self.min_tokens
+            if current and (at_heading or current_tokens + block["tokens"] > self.max_tokens):
+                # Headings at the end of a full chunk move on with the content they introduce
+                carried = []
+                while not at_heading and current and current[-1]["kind"] == "heading":
+                    carried.insert(0, current.pop())
+                current_tokens -= sum(heading["tokens"] for heading in carried)
+                flush()
+                current, current_tokens = carried, sum(heading["tokens"] for heading in carried)
+            current.append(block)
+            current_tokens += block["tokens"]
+        flush()
+        return chunks
+
+    def run(self, pages: List[Dict[str, Any]]) -> List[Document]:
+        """
+        Chunks many pages, measuring every block of every page in a single tokenizer batch.
+
+        Args:
+            pages (List[Dict[str, Any]]): Pages with `blocks` (from `extract_blocks`) and `meta`.
+
+        Returns:
+            List[Document]: The chunks, each with the page meta plus `split_id`, `section_path`
+            and `token_count`.
+        """
+        counts = iter(self.count_tokens([block["text"] for page in pages for block in page["blocks"]]))
+        documents = []
+        for page in pages:
+            blocks = [{**block, "tokens": next(counts)} for block in page["blocks"]]
+            for split_id, chunk in enumerate(self.chunk_blocks(blocks)):
+                meta: Dict[str, Optional[Any]] = {
+                    **page["meta"],
+                    "split_id": split_id,
+                    "section_path": chunk["section_path"],
+                    "token_count": chunk["tokens"],
+                }
+                documents.append(Document(content=chunk["content"], meta=meta))
+        return documents
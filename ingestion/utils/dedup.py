@@ -0,0 +1,327 @@
+import hashlib
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Page fields copied onto the canonical chunk for every duplicate that was collapsed into it
+ALIAS_FIELDS = {"Page_ID": "alias_page_ids", "Page_Title": "alias_page_titles", "Page_URL": "alias_page_urls"}
+
+
+def shingles(text: str, size: int = 5) -> List[str]:
+    """
+    Splits text into overlapping word shingles after lower-casing and collapsing whitespace.
+
+    Args:
+        text (str): The chunk text.
+        size (int): Words per shingle.
+
+    Returns:
+        List[str]: The shingles; a text shorter than `size` words is a single shingle.
+    """
+    words = re.sub(r"\s+", " ", text.lower()).strip().split(" ")
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with `num_perm` universal hash functions, vectorized with numpy.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str, shingle_size: int = 5) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in set(shingles(text, shingle_size))),
+            dtype=np.uint64,
+        )
+        permuted = ((np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+
+    Signatures are cut into `bands` bands of `num_perm / bands` rows; two signatures become
+    candidates when any band matches exactly.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+    def _keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def candidates(self, signature: np.ndarray) -> List[int]:
+        found = []
+        for band, key in enumerate(self._keys(signature)):
+            for item in self.buckets[band].get(key, ()):
+                if item not in found:
+                    found.append(item)
+        return found
+
+    def insert(self, item: int, signature: np.ndarray) -> None:
+        for band, key in enumerate(self._keys(signature)):
+            self.buckets[band][key].append(item)
+
+
+def collapse_near_duplicates(documents: List[Any], threshold: float = 0.9, num_perm: int = 128,
+                             bands: int = 16, shingle_size: int = 5) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Collapses near-duplicate chunks (copied templates, boilerplate, page copies) to one canonical chunk.
+
+    Chunks are visited in order; a chunk whose estimated Jaccard similarity with an earlier
+    canonical chunk reaches `threshold` is dropped, and the canonical chunk records the page of the
+    duplicate in its `alias_page_ids`, `alias_page_titles` and `alias_page_urls` meta. Every page
+    keeps at least one chunk of its own so that it stays listed and its metadata stays readable.
+
+    Args:
+        documents (List[Document]): The split chunks.
+        threshold (float): The minimum estimated Jaccard similarity of two duplicates.
+        num_perm (int): MinHash permutations.
+        bands (int): LSH bands.
+        shingle_size (int): Words per shingle.
+
+    Returns:
+        Tuple[List[Document], Dict[str, Any]]: The kept chunks in their original order, and a report
+        of chunks, bytes and tokens saved.
+    """
+    hasher = MinHasher(num_perm)
+    index = LSHIndex(num_perm, bands)
+    signatures: Dict[int, np.ndarray] = {}
+    canonical_of: Dict[int, int] = {}
+
+    for i, doc in enumerate(documents):
+        if not (doc.content or "").strip():
+            continue
+        signature = hasher.signature(doc.content, shingle_size)
+        match = None
+        for candidate in index.candidates(signature):
+            if np.mean(signatures[candidate] == signature) >= threshold:
+                match = candidate
+                break
+        if match is None:
+            signatures[i] = signature
+            index.insert(i, signature)
+        else:
+            canonical_of[i] = match
+
+    # Restore the first chunk of any page whose chunks were all collapsed into other pages
+    kept_pages = {documents[i].meta.get("Page_ID") for i in range(len(documents)) if i not in canonical_of}
+    for i in sorted(canonical_of):
+        page_id = documents[i].meta.get("Page_ID")
+        if page_id not in kept_pages:
+            del canonical_of[i]
+            kept_pages.add(page_id)
+
+    for duplicate, canonical in canonical_of.items():
+        source, target = documents[duplicate].meta, documents[canonical].meta
+        if source.get("Page_ID") == target.get("Page_ID"):
+            continue
+        if source.get("Page_ID") in target.get("alias_page_ids", []):
+            continue
+        for field, alias_field in ALIAS_FIELDS.items():
+            target.setdefault(alias_field, []).append(source.get(field))
+
+    kept = [doc for i, doc in enumerate(documents) if i not in canonical_of]
+    dropped = [documents[i] for i in canonical_of]
+    total_bytes = sum(len((doc.content or "").encode("utf-8")) for doc in documents)
+    saved_bytes = sum(len((doc.content or "").encode("utf-8")) for doc in dropped)
+    report = {
+        "chunks_in": len(documents),
+        "chunks_out": len(kept),
+        "collapsed": len(dropped),
+        "bytes_saved": saved_bytes,
+        "bytes_saved_ratio": saved_bytes / total_bytes if total_bytes else 0.0,
+        "tokens_saved": sum(doc.meta.get("token_count", 0) for doc in dropped),
+        "cross_page_duplicates": sum(
+            1 for duplicate, canonical in canonical_of.items()
+            if documents[duplicate].meta.get("Page_ID") != documents[canonical].meta.get("Page_ID")
+        ),
+    }
+    return kept, report
+
+
+class CanonicalIndex:
+    """
+    The canonical chunks an ingestion run has written so far, so that duplicates are collapsed
+    across batches and not only within one.
+
+    A chunk of a later batch that matches a written canonical chunk of another page is dropped, and
+    its page joins the canonical chunk's alias fields; `collapse` reports which written chunks need
+    their alias fields updated in the store. Chunks are only `add`ed once their batch is
+    checkpointed, so a resumed run never rewrites a chunk that holds other pages' aliases. Not
+    thread-safe: callers serialize access with their own lock.
+
+    Args:
+        threshold (float): The minimum estimated Jaccard similarity of two duplicates.
+        num_perm (int): MinHash permutations.
+        bands (int): LSH bands.
+        shingle_size (int): Words per shingle.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.lsh = LSHIndex(num_perm, bands)
+        self.signatures: List[np.ndarray] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def signature(self, text: Optional[str]) -> Optional[np.ndarray]:
+        """The MinHash signature of a chunk text, or None for an empty chunk."""
+        return self.hasher.signature(text, self.shingle_size) if (text or "").strip() else None
+
+    def match(self, signature: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Returns the first written canonical chunk similar to `signature`, or None."""
+        for candidate in self.lsh.candidates(signature):
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                return self.chunks[candidate]
+        return None
+
+    def collapse(self, documents: List[Any]) -> Tuple[List[Any], List[Optional[np.ndarray]], Set[str], Dict[str, Any]]:
+        """
+        Drops the chunks that duplicate a written canonical chunk of another page.
+
+        As in `collapse_near_duplicates`, every page keeps at least one chunk of its own. A dropped
+        chunk passes its own aliases on to the canonical chunk.
+
+        Args:
+            documents (List[Document]): One batch's chunks, already collapsed within the batch.
+
+        Returns:
+            Tuple[List[Document], List[Optional[np.ndarray]], Set[str], Dict[str, Any]]: The kept
+            chunks, their signatures (for `add`), the ids of the written chunks whose aliases
+            changed, and a report of the chunks, bytes and tokens saved.
+        """
+        own_chunks: Dict[Any, int] = defaultdict(int)
+        for doc in documents:
+            own_chunks[doc.meta.get("Page_ID")] += 1
+        kept, signatures, updated, dropped = [], [], set(), []
+        for doc in documents:
+            signature = self.signature(doc.content)
+            canonical = self.match(signature) if signature is not None else None
+            page_id = doc.meta.get("Page_ID")
+            if canonical is None or canonical["Page_ID"] == page_id or own_chunks[page_id] <= 1:
+                kept.append(doc)
+                signatures.append(signature)
+                continue
+            own_chunks[page_id] -= 1
+            dropped.append(doc)
+            aliases = [(page_id, doc.meta.get("Page_Title"), doc.meta.get("Page_URL"))]
+            aliases += zip(*(doc.meta.get(alias_field) or [] for alias_field in ALIAS_FIELDS.values()))
+            for alias in aliases:
+                if alias[0] != canonical["Page_ID"] and alias[0] not in canonical["alias_page_ids"]:
+                    for value, alias_field in zip(alias, ALIAS_FIELDS.values()):
+                        canonical[alias_field].append(value)
+                    updated.add(canonical["id"])
+        saved_bytes = sum(len((doc.content or "").encode("utf-8")) for doc in dropped)
+        report = {
+            "collapsed": len(dropped),
+            "cross_page_duplicates": len(dropped),
+            "cross_batch_duplicates": len(dropped),
+            "bytes_saved": saved_bytes,
+            "tokens_saved": sum(doc.meta.get("token_count", 0) for doc in dropped),
+        }
+        return kept, signatures, updated, report
+
+    def add(self, documents: List[Any], signatures: List[Optional[np.ndarray]]) -> None:
+        """
+        Registers written chunks as canonical chunks for later batches.
+
+        Args:
+            documents (List[Document]): The written chunks.
+            signatures (List[Optional[np.ndarray]]): Their signatures, from `collapse`.
+        """
+        for doc, signature in zip(documents, signatures):
+            if signature is None or doc.id in self._positions or self.match(signature) is not None:
+                continue
+            chunk = {"id": doc.id, "Page_ID": doc.meta.get("Page_ID"), "Space_Key": doc.meta.get("Space_Key")}
+            chunk.update({alias_field: list(doc.meta.get(alias_field) or []) for alias_field in ALIAS_FIELDS.values()})
+            self._positions[doc.id] = len(self.chunks)
+            self.lsh.insert(len(self.chunks), signature)
+            self.signatures.append(signature)
+            self.chunks.append(chunk)
+
+    def aliases(self, chunk_id: str) -> Dict[str, Any]:
+        """Returns the current alias fields of a canonical chunk, plus its `Space_Key` for routing."""
+        chunk = self.chunks[self._positions[chunk_id]]
+        return {key: value for key, value in chunk.items() if key in ALIAS_FIELDS.values() or key == "Space_Key"}
+
+
+def restore_aliases(documents: List[Any], stored: List[Dict[str, Any]]) -> int:
+    """
+    Carries the aliases of a page's stored chunks over to its new chunks with the same id.
+
+    Rewriting a chunk replaces the stored one whole, so without this the pages collapsed into it
+    would lose that content until they are ingested again.
+
+    Args:
+        documents (List[Document]): The page's new chunks; their meta is updated in place.
+        stored (List[Dict[str, Any]]): The page's stored chunks that hold aliases, each with its `id`.
+
+    Returns:
+        int: The number of new chunks that took over aliases.
+    """
+    by_id = {chunk["id"]: chunk for chunk in stored}
+    restored = 0
+    for doc in documents:
+        chunk = by_id.get(doc.id)
+        if chunk is None:
+            continue
+        fields = {alias_field: list(doc.meta.get(alias_field) or []) for alias_field in ALIAS_FIELDS.values()}
+        for alias in zip(*(chunk.get(alias_field) or [] for alias_field in ALIAS_FIELDS.values())):
+            if alias[0] != doc.meta.get("Page_ID") and alias[0] not in fields["alias_page_ids"]:
+                for value, alias_field in zip(alias, ALIAS_FIELDS.values()):
+                    fields[alias_field].append(value)
+        doc.meta.update(fields)
+        restored += 1
+    return restored
+
+
+def rehome_aliases(stored: List[Dict[str, Any]], keep_ids) -> Dict[str, Dict[str, Any]]:
+    """
+    Hands each stored chunk that is about to be deleted, but holds other pages' aliases, over to
+    the first of those pages.
+
+    The chunk becomes that page's own chunk (`Page_ID`, `Page_Title`, `Page_URL`) and keeps the
+    remaining pages as aliases, so no page loses the content that was collapsed into it.
+
+    Args:
+        stored (List[Dict[str, Any]]): A page's stored chunks that hold aliases, each with its `id`.
+        keep_ids (Iterable[str]): The ids of the chunks the page keeps; these are left alone.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The meta updates per chunk id; such chunks must not be deleted.
+    """
+    keep_ids = set(keep_ids)
+    updates = {}
+    for chunk in stored:
+        aliases = list(zip(*(chunk.get(alias_field) or [] for alias_field in ALIAS_FIELDS.values())))
+        if chunk["id"] in keep_ids or not aliases:
+            continue
+        fields = dict(zip(ALIAS_FIELDS, aliases[0]))
+        for position, alias_field in enumerate(ALIAS_FIELDS.values()):
+            fields[alias_field] = [alias[position] for alias in aliases[1:]]
+        updates[chunk["id"]] = fields
+    return updates
@@ -0,0 +1,183 @@
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from haystack import Document
+from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
+
+from confluence.utils import confluence_program
+from ingestion.utils.chunker import StructureChunker, blocks_to_text, extract_blocks
+
+# Metadata columns stored with every chunk
+METADATA_COLUMNS = ["UUID", "Page_ID", "Author_Email", "Author_Name", "Author_ID", "Page_Title", "Page_URL", "Date", "Version",
+                    "Last_Modified", "Space_Key", "Labels", "Ancestor_IDs"]
+
+
+def read_docx(doc):
+    content = []
+
+    for para in doc.paragraphs:
+        content.append(para.text)
+
+    for table in doc.tables:
+        table_data = []
+        for row in table.rows:
+            row_data = [cell.text for cell in row.cells]
+            table_data.append(row_data)
+        content.append(table_data)
+
+    return content
+
+def read_files(content):
+    processed_data = {
+        "tables": [],
+        "queries": [],
+        "data_types": [],
+        "json_data": [],
+        "hierarchical_data": []
+    }
+
+    for item in content:
+        if isinstance(item, list):
+            
+            processed_data["tables"].append(item)
+        elif re.match(r"SELECT .* FROM .*", item, re.IGNORECASE | re.DOTALL):
+            
+            processed_data["queries"].append(item)
+        elif re.match(r"^\{.*\}$", item, re.DOTALL):
+            
+            try:
+                json_data = json.loads(item)
+                processed_data["json_data"].append(json_data)
+            except json.JSONDecodeError:
+                pass
+        elif re.match(r"├──|└──", item):
+            
+            processed_data["hierarchical_data"].append(item)
+        else:
+            
+            processed_data["data_types"].append(item)
+
+    return processed_data
+
+
+def iso_timestamp(value: Optional[str]) -> Optional[str]:
+    """Normalizes a Confluence timestamp such as `2024-03-01T12:34:56.789Z` to UTC ISO 8601 (None if unparseable)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).isoformat()
+    except ValueError:
+        return None
+
+
+def facet_metadata(facets: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns `confluence_program.page_facets` into the filterable chunk metadata fields."""
+    return {
+        "Last_Modified": iso_timestamp(facets.get("when")),
+        "Space_Key": facets.get("space_key"),
+        "Labels": facets.get("labels") or [],
+        "Ancestor_IDs": facets.get("ancestor_ids") or [],
+    }
+
+
+def build_page_docx(title: str, html: str):
+    """
+    Converts a page's storage-format HTML into the docx document the rest of preprocessing reads.
+
+    Args:
+        title (str): The page title.
+        html (str): The page body in Confluence storage format.
+
+    Returns:
+        docx.Document: The page as a docx document.
+    """
+    plain_text = confluence_program.extract_plain_text(html)
+    return confluence_program.text_to_docx(plain_text, f"{title}.docx")
+
+
+def page_metadata(page: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the chunk metadata of a page from its Confluence content JSON (expanded as in
+    `confluence_program.get_page`).
+
+    Args:
+        page (Dict[str, Any]): The page as returned by the Confluence content API.
+
+    Returns:
+        Dict[str, Any]: The metadata, with the same fields as a full ingestion run.
+    """
+    version = page["version"]
+    return {
+        "UUID": str(uuid.uuid4()),
+        "Page_ID": page["id"],
+        "Author_Email": version["by"].get("email"),
+        "Author_Name": version["by"].get("publicName"),
+        "Author_ID": version["by"].get("accountId"),
+        "Page_Title": page["title"],
+        "Page_URL": page["_links"]["webui"],
+        "Date": version.get("friendlyWhen"),
+        "Version": version["number"],
+        **facet_metadata(confluence_program.page_facets(page)),
+    }
+
+
+def page_pair(doc, metadata: Dict[str, Any], chunker_mode: str = "structure") -> Dict[str, Any]:
+    """
+    Reads a page's docx into the content/meta pair that is split into chunks.
+
+    Args:
+        doc: The page's docx document.
+        metadata (Dict[str, Any]): The page metadata.
+        chunker_mode (str): "structure" keeps the page's blocks for `StructureChunker`; "word"
+            serializes the classified content as JSON for the word splitter.
+
+    Returns:
+        Dict[str, Any]: The pair, with `content`, `meta` and (structure mode) `blocks`.
+    """
+    if chunker_mode == "structure":
+        blocks = extract_blocks(doc)
+        return {"content": blocks_to_text(blocks), "meta": metadata, "blocks": blocks}
+    processed_data = read_files(read_docx(doc))
+    return {"content": json.dumps(processed_data, indent=2), "meta": metadata}
+
+
+def make_cleaner() -> DocumentCleaner:
+    return DocumentCleaner(
+        unicode_normalization="NFKC",
+        ascii_only=False,
+        remove_empty_lines=True,
+        remove_extra_whitespaces=True,
+        remove_repeated_substrings=False
+    )
+
+
+def make_splitter() -> DocumentSplitter:
+    return DocumentSplitter(
+        split_by="word",
+        split_length=500,
+        split_overlap=50,
+        split_threshold=200
+    )
+
+
+def chunk_pairs(pairs: List[Dict[str, Any]], chunker_mode: str = "structure",
+                chunker: Optional[StructureChunker] = None) -> List[Document]:
+    """
+    Splits page pairs into chunks exactly as a full ingestion run does.
+
+    Args:
+        pairs (List[Dict[str, Any]]): Pairs from `page_pair`.
+        chunker_mode (str): "structure" or "word".
+        chunker (Optional[StructureChunker]): The structure chunker to reuse (structure mode).
+
+    Returns:
+        List[Document]: The chunks.
+    """
+    if chunker_mode == "structure":
+        return (chunker or StructureChunker()).run(pairs)
+    docs = [Document(content=pair["content"], meta=pair["meta"]) for pair in pairs]
+    cleaned = make_cleaner().run(docs)["documents"]
+    return make_splitter().run(cleaned)["documents"]
@@ -0,0 +1,193 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # RSS tracking is skipped when psutil is unavailable
+    psutil = None
+
+
+class StageStats:
+    """
+    Accumulates timing, throughput and memory figures for one ingestion stage.
+
+    A stage may be entered many times (e.g. once per page), also concurrently from several threads;
+    every entry adds to the same totals, so the wall time of concurrent entries adds up.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.items = 0
+        self.bytes = 0
+        self.rss_start = None
+        self.rss_peak_delta = 0
+        self._lock = threading.Lock()
+
+    def add(self, items: int = 0, nbytes: int = 0) -> None:
+        """
+        Records the work done by the current stage entry.
+
+        Args:
+            items (int): Number of items (pages, chunks, documents) processed.
+            nbytes (int): Number of bytes processed.
+        """
+        with self._lock:
+            self.items += items
+            self.bytes += nbytes
+
+    def observe_rss(self, rss: int, entry_rss: Optional[int]) -> None:
+        """
+        Records the RSS seen during one stage entry.
+
+        Args:
+            rss (int): The current RSS.
+            entry_rss (Optional[int]): The RSS when that entry started.
+        """
+        if entry_rss is not None:
+            with self._lock:
+                self.rss_peak_delta = max(self.rss_peak_delta, rss - entry_rss)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "wall_time_s": round(self.wall_time, 4),
+            "items": self.items,
+            "items_per_s": round(self.items / self.wall_time, 2) if self.wall_time else None,
+            "bytes": self.bytes,
+            "bytes_per_s": round(self.bytes / self.wall_time, 2) if self.wall_time else None,
+            "rss_start_mb": round(self.rss_start / 2**20, 2) if self.rss_start is not None else None,
+            "rss_peak_delta_mb": round(self.rss_peak_delta / 2**20, 2) if psutil else None,
+        }
+
+
+class IngestionProfiler:
+    """
+    Collects per-stage wall time, items/sec, bytes processed and peak RSS delta for an ingestion run
+    and writes them as a JSON report.
+
+    When a profile directory is given, every stage is also run under cProfile and dumped to
+    `<profile_dir>/<stage>.prof` (loadable with pstats, snakeviz or any cProfile viewer). The report
+    records the process id and the wall-clock window of every stage so an external py-spy recording
+    of the same run can be sliced per stage.
+    """
+
+    def __init__(self, report_path: Optional[str] = None, profile_dir: Optional[str] = None,
+                 sample_interval: float = 0.05):
+        started = datetime.now(timezone.utc)
+        self.run_id = started.strftime("%Y%m%dT%H%M%SZ")
+        self.started_at = started
+        self.report_path = Path(report_path or os.getenv("INGEST_REPORT_PATH") or f"reports/ingestion_{self.run_id}.json")
+        profile_dir = profile_dir or os.getenv("INGEST_PROFILE_DIR")
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.stages: Dict[str, StageStats] = {}
+        self.extra: Dict[str, Any] = {}
+        self._windows: Dict[str, list] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        # Every running stage entry, with the RSS at its start
+        self._active: Dict[object, Tuple[StageStats, Optional[int]]] = {}
+        self._lock = threading.Lock()
+        # cProfile can only be active for one stage at a time, so stages running concurrently on other threads go unprofiled
+        self._profile_lock = threading.Lock()
+        self._process = psutil.Process() if psutil else None
+        self._stop = threading.Event()
+        self._sampler = None
+        if self._process is not None:
+            self._sampler = threading.Thread(target=self._sample_rss, args=(sample_interval,), daemon=True)
+            self._sampler.start()
+
+    def _rss(self) -> Optional[int]:
+        return self._process.memory_info().rss if self._process is not None else None
+
+    def _sample_rss(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            rss = self._rss()
+            with self._lock:
+                for stats, entry_rss in self._active.values():
+                    stats.observe_rss(rss, entry_rss)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Times one entry into an ingestion stage.
+
+        Args:
+            name (str): The stage name, e.g. "confluence_fetch" or "embedding".
+
+        Yields:
+            StageStats: The stage accumulator; call `add(items=..., nbytes=...)` to record throughput.
+        """
+        with self._lock:
+            stats = self.stages.setdefault(name, StageStats(name))
+            stats.calls += 1
+        entry_rss = self._rss()
+        with stats._lock:
+            if stats.rss_start is None:
+                stats.rss_start = entry_rss
+
+        profile = None
+        if self.profile_dir is not None and self._profile_lock.acquire(blocking=False):
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+
+        # One key per entry, so concurrent and nested entries of a stage each keep their own entry RSS
+        key = object()
+        with self._lock:
+            self._active[key] = (stats, entry_rss)
+        window_start = time.time()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._profile_lock.release()
+            with self._lock:
+                stats.wall_time += elapsed
+                self._active.pop(key, None)
+            end_rss = self._rss()
+            if end_rss is not None:
+                stats.observe_rss(end_rss, entry_rss)
+            window = self._windows.setdefault(name, [window_start, window_start])
+            window[1] = time.time()
+
+    def report(self) -> Dict[str, Any]:
+        finished = datetime.now(timezone.utc)
+        return {
+            "run_id": self.run_id,
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": finished.isoformat(),
+            "total_wall_time_s": round((finished - self.started_at).total_seconds(), 4),
+            "stages": {name: {**stats.to_dict(), "window": self._windows.get(name)}
+                       for name, stats in self.stages.items()},
+            **self.extra,
+        }
+
+    def write_report(self) -> Path:
+        """
+        Stops RSS sampling, dumps the per-stage cProfile data (if enabled) and writes the JSON report.
+
+        Returns:
+            Path: The location of the written report.
+        """
+        self._stop.set()
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            for name, profile in self._profiles.items():
+                profile.dump_stats(str(self.profile_dir / f"{name}.prof"))
+
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Ingestion report written to {self.report_path}")
+        return self.report_path
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import requests
+
+
+def request_summary(api_url: str, content: str, title: str, model: Optional[str] = None, timeout: int = 900) -> Dict[str, Any]:
+    """
+    Summarizes one page through the API's map-reduce `/summarize` endpoint.
+
+    Args:
+        api_url (str): The base URL of the FastAPI backend.
+        content (str): The page content.
+        title (str): The page title.
+        model (Optional[str]): The model name; the API's summarization model when None.
+        timeout (int): The request timeout in seconds.
+
+    Returns:
+        Dict[str, Any]: The API response, with the `summary` and the `model` that produced it.
+    """
+    response = requests.post(
+        f"{api_url}/summarize",
+        json={"content": content, "title": title, "model": model},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def summarize_pages(pages: List[Dict[str, Any]], store, api_url: str, model: Optional[str] = None, max_workers: int = 4) -> Dict[str, int]:
+    """
+    Generates and stores a summary for every page version that does not have one yet.
+
+    Each summary is written as soon as it is generated, so an interrupted run resumes by skipping
+    the page versions that were already summarized. At most `max_workers` pages are summarized at
+    the same time.
+
+    Args:
+        pages (List[Dict[str, Any]]): Pages with `Page_ID`, `Version`, `Page_Title` and `content`.
+        store: The `SummaryStore` to read from and write to.
+        api_url (str): The base URL of the FastAPI backend.
+        model (Optional[str]): The model name; the API's summarization model when None.
+        max_workers (int): The maximum number of concurrent summarization requests.
+
+    Returns:
+        Dict[str, int]: Counts of `summarized`, `skipped` and `failed` pages.
+    """
+    store.ensure_index()
+    pending = [page for page in pages if not store.exists(page["Page_ID"], page["Version"])]
+    counts = {"summarized": 0, "skipped": len(pages) - len(pending), "failed": 0}
+
+    def summarize(page):
+        result = request_summary(api_url, page["content"], page["Page_Title"], model)
+        store.put(page["Page_ID"], page["Version"], result["summary"], page["Page_Title"], result["model"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(summarize, page): page for page in pending}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                counts["summarized"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed to summarize page {futures[future]['Page_ID']}: {e}")
+
+    print(f"Page summaries: {counts}")
+    return counts
@@ -1,83 +1,167 @@
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
 import streamlit as st
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from streamlitapp.utils import extractive_generative_api, extract_text_after_tag,retrieve_confluence_pages,query_analyzer,generative,check_string,doc_filters,concatenate_content_and_metadata,summary_prompt
+from streamlitapp.utils import stream_query, visible_answer, extract_text_after_tag,page_catalog,route_query,summarize_page
 
 
 st.set_page_config(page_title="RAG", page_icon=None, layout="centered", initial_sidebar_state="auto", menu_items=None)
 
+# Answers are kept for the browser session, so reruns redraw them without calling the API
+if "messages" not in st.session_state:
+    st.session_state.messages = []
 
-page_id, email, name, accountId, title, page_url,date = retrieve_confluence_pages()
-page_data = [page_id, title,email, name, accountId, page_url,date]
-pages_list_data = [lst[1:] for lst in page_data]
-filenames=pages_list_data[1]
 
-def retrival_func(query: str) -> str:
+def render_metadata(container, meta_data: dict):
     """
-    Sends a query to an API and extracts text following the 'think' tag from the response.
+    Renders the metadata of the Confluence page an answer came from.
 
     Args:
-        query (str): The query to be sent to the API.
+        container: The Streamlit container to write into.
+        meta_data (dict): The page metadata returned by the API.
+    """
+    container.markdown("### 📄 **Confluence Page Metadata**")
+    container.markdown(f"**📌 Title:** {meta_data.get('Page_Title', 'Unknown')}")
+    if meta_data.get('Attachment'):
+        container.markdown(f"**📎 Attachment:** {meta_data['Attachment']}")
+    container.markdown(f"**👤 Author:** {meta_data.get('Author_Name', 'Unknown')}")
+    container.markdown(f"**📅 Date:** {meta_data.get('Date', 'Unknown')}")
+    if meta_data.get('Author_Email'):
+        container.markdown(f"**📧 Contact:** [{meta_data['Author_Email']}](mailto:{meta_data['Author_Email']})")
+    if meta_data.get('Also_In'):
+        container.markdown(f"**🔁 Also in:** {', '.join(meta_data['Also_In'])}")
+
+
+def render_message(message: dict):
+    """Redraws a chat message kept in the session state."""
+    with st.chat_message(message["role"]):
+        st.write(message["content"])
+        for meta_data in message.get("metadata", []):
+            render_metadata(st, meta_data)
+
+
+def stream_answer(query: str):
+    """
+    Streams the answer to a query into the current chat message, showing the source page as soon as
+    retrieval is done and the answer text as it is generated.
+
+    Args:
+        query (str): The user's query.
 
     Returns:
-        str: The text extracted after the 'think' tag from the API response.
+        tuple: The final answer text (after the 'think' tag) and the metadata of each source page.
     """
-    response = extractive_generative_api(query)
-    for response in response["responses"]:
-        text = response["response"]
-        meta_data=response["metadata"]
-    refine_response = extract_text_after_tag(text, 'think')
-    return refine_response,meta_data
+    answer_slot = st.empty()
+    metadata_slot = st.container()
+    answer_slot.markdown("_Searching Confluence..._")
+    texts, metadata, error = [], [], None
+    for event in stream_query(query):
+        if event["event"] == "metadata":
+            texts.append("")
+            metadata.append(event["metadata"])
+            render_metadata(metadata_slot, event["metadata"])
+        elif event["event"] == "token":
+            texts[-1] += event["text"]
+        elif event["event"] == "error":
+            error = event["detail"]
+            break
+        else:
+            break
+        shown = "\n\n".join(answer for answer in map(visible_answer, texts) if answer)
+        answer_slot.markdown(f"{shown} ▌" if shown else "_Thinking..._")
+
+    answer = "\n\n".join(extract_text_after_tag(text, 'think') for text in texts)
+    if error is not None:
+        answer = f"{answer}\n\nFailed to get a complete answer: {error}".strip()
+    elif not texts:
+        answer = "No matching Confluence page was found."
+    answer_slot.markdown(answer)
+    return answer, metadata
+
+
+def show_summary(page_id: str, title: str, query=None):
+    """
+    Summarizes an indexed page into the current chat message.
+
+    Args:
+        page_id (str): The Confluence page id.
+        title (str): The page title, for the progress message.
+        query (Optional[str]): The user's request; without one, the summary precomputed at ingestion is served if there is one.
+
+    Returns:
+        tuple: The summary text and the page metadata.
+    """
+    with st.spinner(f"Summarizing {title}..."):
+        summary=summarize_page(page_id,query)
+    if summary is None:
+        final_answer,meta_data="The page could not be summarized.",[]
+    else:
+        final_answer,meta_data=summary['summary'],[summary['metadata']]
+    st.write(f"{final_answer}")
+    if summary is not None and summary.get('precomputed'):
+        st.caption("Summary precomputed at ingestion for the current page version.")
+    for page_meta in meta_data:
+        render_metadata(st, page_meta)
+    return final_answer,meta_data
+
 
 prompt = st.chat_input("Say something")
+
+with ThreadPoolExecutor(max_workers=1) as executor:
+    # The intent routing request runs while the page catalog is fetched (or read from the cache)
+    route = executor.submit(route_query, prompt) if prompt else None
+
+    try:
+        pages=page_catalog()
+    except requests.RequestException as e:
+        print(f"Request failed: {e}")
+        st.sidebar.warning("The list of indexed pages is unavailable right now.")
+        pages=[]
+    # Pages are keyed by id: several pages may share a title
+    titles={page['Page_ID']: page['Page_Title'] for page in pages}
+    page_ids={}
+    for page in pages:
+        page_ids.setdefault(page['Page_Title'], []).append(page['Page_ID'])
+    with st.sidebar.expander(f"Indexed pages ({len(titles)})"):
+        for page_id, title in titles.items():
+            st.markdown(f"- {title} ({page_id})")
+    # Summary mode: a plain summary of the chosen page, served from the ingest-time summary when available
+    with st.sidebar.form("summary"):
+        summary_page=st.selectbox("Summarize a page", list(titles), format_func=lambda page_id: f"{titles[page_id]} ({page_id})")
+        summary_requested=st.form_submit_button("Summarize")
+
+    for message in st.session_state.messages:
+        render_message(message)
+
+    if prompt:
+        route = route.result()
+
 if prompt:
-    query_analyzer_prompt=query_analyzer(prompt,filenames) 
-    response_query_analyzer=generative(query_analyzer_prompt)   
-    refine_response=extract_text_after_tag(response_query_analyzer,'think')
-    type,which_file=check_string(refine_response,filenames)
-    
-    if type=='Retrieval':
-        retrive_text,meta_data=retrival_func(prompt)
-        
-        with st.chat_message("user"):
-            st.write(f"{prompt}")
-        
-        message = st.chat_message("assistant")
-        message.write(f"{retrive_text}")
-        message.markdown("### 📄 **Confluence Page Metadata**")
-        message.markdown(f"**📌 Title:** {meta_data['Page_Title']}")
-        message.markdown(f"**👤 Author:** {meta_data['Author_Name']}")
-        message.markdown(f"**📅 Date:** {meta_data['Date']}")
-        message.markdown(f"**📧 Contact:** [{meta_data['Author_Email']}](mailto:{meta_data['Author_Email']})")
-        
-    elif type=='Summarization' and which_file is not None :
-        
-        filter_data=doc_filters(which_file)
-        
-        complete_context,meta_data=concatenate_content_and_metadata(filter_data)
-        response=generative(summary_prompt(complete_context,prompt))
-        final_answer=extract_text_after_tag(response,'think')
-        with st.chat_message("user"):
-            st.write(f"{prompt}")
-        message = st.chat_message("assistant")
-        message.write(f"{final_answer}")
-        message.markdown("### 📄 **Confluence Page Metadata**")
-        message.markdown(f"**📌 Title:** {meta_data['Page_Title']}")
-        message.markdown(f"**👤 Author:** {meta_data['Author_Name']}")
-        message.markdown(f"**📅 Date:** {meta_data['Date']}")
-        message.markdown(f"**📧 Contact:** [{meta_data['Author_Email']}](mailto:{meta_data['Author_Email']})")
-        
-    else:
-        
-        retrive_text,meta_data=retrival_func(prompt)
-        with st.chat_message("user"):
-            st.write(f"{prompt}")
-        
-        message = st.chat_message("assistant")
-        message.write(f"{retrive_text}")
-        message.markdown("### 📄 **Confluence Page Metadata**")
-        message.markdown(f"**📌 Title:** {meta_data['Page_Title']}")
-        message.markdown(f"**👤 Author:** {meta_data['Author_Name']}")
-        message.markdown(f"**📅 Date:** {meta_data['Date']}")
-        message.markdown(f"**📧 Contact:** [{meta_data['Author_Email']}](mailto:{meta_data['Author_Email']})")
\ No newline at end of file
+    type,which_file=route['type'],route['files']
+    st.session_state.messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.write(f"{prompt}")
+
+    with st.chat_message("assistant"):
+        matches=page_ids.get(which_file[0], []) if type=='Summarization' and which_file else []
+        if len(matches)==1:
+            final_answer,meta_data=show_summary(matches[0],which_file[0],prompt)
+        elif matches:
+            # The title alone does not say which page is meant
+            choices=", ".join(f"{which_file[0]} ({page_id})" for page_id in matches)
+            final_answer,meta_data=f"Several pages are titled {which_file[0]}: {choices}. Pick one under *Summarize a page* in the sidebar.",[]
+            st.write(final_answer)
+        else:
+            final_answer,meta_data=stream_answer(prompt)
+
+    st.session_state.messages.append({"role": "assistant", "content": final_answer, "metadata": meta_data})
+elif summary_requested and summary_page:
+    request=f"Summarize {titles[summary_page]}"
+    st.session_state.messages.append({"role": "user", "content": request})
+    with st.chat_message("user"):
+        st.write(request)
+    with st.chat_message("assistant"):
+        final_answer,meta_data=show_summary(summary_page,titles[summary_page])
+    st.session_state.messages.append({"role": "assistant", "content": final_answer, "metadata": meta_data})
@@ -1,335 +1,164 @@
-from typing import Union, Optional, Dict, Any,List, Tuple, Optional 
+from typing import Union, Optional, Dict, Any,List, Tuple, Optional, Iterator
 from dotenv import load_dotenv
+import json
 import os
 import requests
-from requests.auth import HTTPBasicAuth
-
-from haystack.components.retrievers import FilterRetriever
-from haystack_integrations.document_stores.elasticsearch import ElasticsearchDocumentStore
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from api.utils.llm import extract_text_after_tag
+
 env_path = Path(__file__).resolve().parents[2] / ".env"  # Navigate up to project root
 load_dotenv(dotenv_path=env_path)
 
-confluence_api_token = os.getenv('CONFLUENCE_API_TOKEN')
-confluence_username = os.getenv('CONFLUENCE_USERNAME')
-confluence_url = os.getenv('CONFLUENCE_URL')
-confluence_space_key = os.getenv('SPACE_KEY')
-confluence_user_email = os.getenv('USER_EMAIL')
-elasticsearch_url =os.getenv('ELASTICSEARCH_URL')
-elasticsearch_username=os.getenv('ELASTICSEARCH_USERNAME')
-elasticsearch_password=os.getenv("ELASTICSEARCH_PASSWORD")
-elasticsearch_indexname=os.getenv("ELASTICSEARCH_INDEXNAME")
-
-
-def retrieve_confluence_pages():
-    """
-    Retrieves and displays Confluence pages from a specified space using the Confluence REST API.
+api_url = os.getenv("API_URL", "http://localhost")
+page_catalog_ttl = int(os.getenv("PAGE_CATALOG_TTL", "300"))
+api_connect_timeout = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+api_read_timeout = float(os.getenv("API_READ_TIMEOUT", "120"))
+summary_read_timeout = float(os.getenv("SUMMARY_READ_TIMEOUT", "600"))
+api_pool_size = int(os.getenv("API_POOL_SIZE", "10"))
+api_retries = int(os.getenv("API_RETRIES", "2"))
 
-    This function uses environment variables for authentication and configuration, including
-    the API token, username, URL, space key, and user email. It fetches pages from the specified
-    Confluence space, extracting details such as page ID, author email, author name, account ID,
-    title, and creation date. The function returns these details as lists. If any required
-    environment variable is missing, or if the API request fails, an error message is printed.
 
-    Returns:
-        tuple: Lists containing page IDs, author emails, author names, account IDs, titles,
-        page URLs, and creation dates.
+def build_session(pool_size: int = 10, retries: int = 2) -> requests.Session:
     """
-    
-    if not all([confluence_api_token, confluence_username, confluence_url, confluence_space_key, confluence_user_email]):
-        print("Missing one or more environment variables.")
-        return
-
-    params = {
-        "spaceKey": confluence_space_key,
-        "expand": "body.storage,version",
-        "limit": 100,
-        "start": 0,
-    }
-
-    url = f"{confluence_url}/content"
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+    Creates the HTTP session shared by every request of the app.
 
-    try:
-        response = requests.get(
-            url,
-            headers=headers,
-            params=params,
-            auth=HTTPBasicAuth(confluence_user_email, confluence_api_token),
-        )
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to retrieve pages. Error: {e}")
-        return
-
-    pages = response.json().get("results", [])
-    
-    page_id=[] 
-    email=[]
-    name=[]
-    accountId=[]
-    title=[]
-    page_url=[]
-    date=[]
-    for page in pages:
-        
-        page_id.append(page['id'])
-        email.append(page['version']['by']['email'])
-        name.append(page['version']['by']['publicName'])
-        accountId.append(page['version']['by']['accountId'])
-        title.append(page['title'])
-        date.append(page['version']['friendlyWhen'])
-        page_url.append(page['_links']['webui'])
-        
-        
-    return  page_id, email,name,accountId,title,page_url,date
-
-def extractive_generative_api(query: str) -> Optional[Dict[str, Any]]:
-    """
-    Sends a GET request to a local server with a query parameter and returns the JSON response if successful.
+    Connections are pooled, so script reruns and concurrent sessions reuse open connections to the
+    API. GET requests that fail to connect or get a 429/502/503/504 are retried `retries` times
+    with exponential backoff (honouring `Retry-After`); POSTs are never retried.
 
     Args:
-        query (str): A string representing the query to be sent to the API.
+        pool_size (int): Connections kept open per host.
+        retries (int): Retries of a failed GET request.
 
     Returns:
-        Optional[Dict[str, Any]]: A JSON object if the request is successful, None otherwise.
+        requests.Session: The session.
     """
-    url = 'http://localhost/query/'
-    params = {'query': query}
-    headers = {'accept': 'application/json'}
+    retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=0.5,
+                  status_forcelist=(429, 502, 503, 504), allowed_methods=frozenset({"GET"}), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"accept": "application/json"})
+    return session
 
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Request failed: {e}")
-        return None
-    
-    
 
-def query_analyzer(query: str, file_names: list[str]) -> str:
-    """
-    Generates a prompt for an AI assistant to classify a user query into either
-    a "Retrieval" or "Summarization" category and checks for filename matches.
-
-    :param query: A string representing the user's query.
-    :param file_names: A list of strings representing filenames to check against the query.
-    :return: A string prompt for an AI assistant.
-    """
-    file_list_str = "\n".join(f"- **{file}**" for file in file_names)
-
-    prompt = f"""
-    You are an intelligent AI assistant that classifies user queries into two categories:
-
-    ### **1. Retrieval Query**
-    Classify the query as **Retrieval** if the user is searching for specific information, facts, or details that require looking up content from a document.  
-    **Example Queries:**  
-    - "What is our company's vacation policy?"  
-    - "Provide details about our AWS infrastructure security measures."  
-    - "How does our organization handle network segmentation?"  
-
-    ### **2. Summarization Query**
-    Classify the query as **Summarization** if the user asks for a summary of a specific document, law, or policy.  
-    **Example Queries:**  
-    - "Summarize the contents of the DevOps Ramp-up Plan."  
-    - "Give me a brief summary of the Technical Infrastructure FAQ."  
-    - "What are the main points covered in the Employee Handbook?"  
-
-    ### **Filename Matching**
-    Determine if the query references a document name, even partially, from the following list:
-    {file_list_str}
-
-    A filename match should be considered **if the query directly mentions or implies content that is likely found in a specific document** (e.g., "vacation policy" relates to the Employee Handbook & Policies).  
+# Imported modules are not re-executed on reruns, so every rerun and browser session shares this pool
+api_session = build_session(api_pool_size, api_retries)
+api_timeout = (api_connect_timeout, api_read_timeout)
 
-    ### **Response Format:**
-    1. Classify the query as either `"Retrieval"` or `"Summarization"`.
-    2. If a filename is matched, return the filename.
 
-    #### **Example Responses:**
-    - **Retrieval only:** `"Retrieval"`
-    - **Summarization only:** `"Summarization"`
-    - **Summarization with filename:** `"Summarization - Employee Handbook & Policies"`
-    - **Retrieval with filename:** `"Retrieval - Technical Infrastructure FAQ"`
-
-    ---
-
-    Now, analyze the following user query and classify it accordingly:
-
-    **User Query:** `{query}`
-    """
-    return prompt
-
-
-def doc_filters(file_name: Union[str, List[str]]):
-    """
-    Connects to an Elasticsearch document store and retrieves documents based on a filter applied to the "Page_Title" field.
-    
-    :param file_name: A string or a list containing a single string representing the title of the document to be retrieved.
-    :return: The result of the document retrieval operation, which includes documents matching the specified "Page_Title".
+@st.cache_data(ttl=page_catalog_ttl, show_spinner=False)
+def page_catalog() -> List[Dict[str, Any]]:
     """
-    document_store = ElasticsearchDocumentStore(
-        hosts=elasticsearch_url,
-        basic_auth=(elasticsearch_username, elasticsearch_password),
-        index=elasticsearch_indexname,
-        embedding_similarity_function="cosine",
-        verify_certs=False,
-        ca_certs=None, 
-    )
-    retriever = FilterRetriever(document_store)
-    
-    title = file_name[0] if isinstance(file_name, list) else file_name
-    result = retriever.run(filters={"field": "Page_Title", "operator": "==", "value": title})
-    
-    return result
-
-
-def summary_prompt(context: str, query: str) -> str:
-    """
-    Generates a structured prompt for an AI assistant to create a professional summary of given content.
+    Fetches the list of indexed pages from the API's `/pages/` endpoint.
 
-    Parameters:
-    context (str): The content to be summarized.
-    query (str): The user's request or question related to the content.
+    The result is cached by Streamlit for `PAGE_CATALOG_TTL` seconds, so script reruns do not
+    issue any request. A failed request raises instead, and Streamlit does not cache exceptions,
+    so the next rerun tries again. The API itself serves the catalog from an Elasticsearch aggregation.
 
     Returns:
-    str: A formatted prompt containing instructions for generating a professional summary.
-    """
-    prompt=f""" 
-    You are an expert AI assistant specializing in fact-based, structured, and professional summarization. Your task is to generate a concise yet detailed summary of the provided content while maintaining its original intent, technical accuracy, and key takeaways.
-
-    **Instructions**:
-        Summarize the given content professionally by following these key principles:
-
-    1. Concise Yet Comprehensive:
-
-        - Capture all essential information without losing depth.
-        - Avoid unnecessary repetition or verbose explanations.
-    2.  **Well-Structured Format**:
-
-        - Use clear headings, bullet points, or sections to improve readability.
-        - If the content includes tables, code snippets, JSON structures, or SQL queries, ensure their integrity.
-
-    3. **Context & Relation Preservation**:
-
-        - Maintain relationships between concepts, hierarchical data, and technical components.
-        - If summarizing legal, academic, or technical documents, retain accuracy and key terminology.
+        List[Dict[str, Any]]: One entry per page with `Page_Title`, `Page_ID` and `Page_URL`.
 
-    4. **Technical Depth (if applicable)**:
-
-        - If the content is technical, explain key concepts, best practices, and relevant optimizations.
-        - Use examples when necessary but avoid unnecessary elaboration.
-
-    5. **Professional & Neutral Tone**:
-
-        - Use formal and authoritative language.
-        - Avoid assumptions or adding external information.
-    6. **Handling Unclear or Insufficient Information**:
+    Raises:
+        requests.RequestException: If the request fails.
+    """
+    url = f'{api_url}/pages/'
 
-        - If the provided content lacks enough details, clearly state:
-        - "The given content does not provide sufficient details for a comprehensive summary."
-        - Do not attempt to fabricate missing information.
-        
-    **Input Content**:{context}
+    response = api_session.get(url, timeout=api_timeout)
+    response.raise_for_status()
+    return response.json()["pages"]
 
-    ** User Query**:{query}
-        
-    """
-    return prompt
 
-    
-def concatenate_content_and_metadata(data):
+def stream_query(query: str) -> Iterator[Dict[str, Any]]:
     """
-    Concatenates document content by their split identifiers and extracts unique metadata.
+    Sends a query to the API's `/query/stream` endpoint and yields its events as they arrive.
 
     Args:
-        data (dict): A dictionary containing a list of documents under the key 'documents'.
-                     Each document is expected to have 'meta' and 'content' attributes.
+        query (str): The user's query.
 
-    Returns:
-        tuple: A tuple containing:
-            - str: Concatenated document content ordered by 'split_id'.
-            - dict: Unique metadata extracted from the documents.
+    Yields:
+        Dict[str, Any]: `metadata` events (the source page), `token` events (a piece of the answer
+        in `text`) and a final `done` event, or an `error` event with a `detail` if the request fails.
     """
-    split_content = {}
-    unique_metadata = {}
-
-    for doc in data['documents']:
-        split_id = doc.meta['split_id']
-        content = doc.content
-        if split_id not in split_content:
-            split_content[split_id] = ""
-        split_content[split_id] += content
-
-        for key, value in doc.meta.items():
-            if key not in unique_metadata:
-                unique_metadata[key] = value
-
-    sorted_content = {k: v for k, v in sorted(split_content.items())}
-    concatenated_content = " ".join(sorted_content.values())
+    url = f'{api_url}/query/stream'
+    params = {'query': query}
 
-    return concatenated_content, unique_metadata
+    try:
+        with api_session.get(url, params=params, timeout=api_timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    except requests.RequestException as e:
+        print(f"Request failed: {e}")
+        yield {"event": "error", "detail": str(e)}
 
 
-def check_string(input_string: str, file_names: List[str]) -> Tuple[Optional[str], List[str]]:
+def route_query(query: str) -> Dict[str, Any]:
     """
-    Check if the input string contains specific terms and which file names are mentioned.
+    Asks the API's local intent router whether the query is a retrieval or summarization request.
 
     Args:
-    - input_string (str): The string to be checked.
-    - file_names (List[str]): A list of file names to check for mentions.
+        query (str): The user's query.
 
     Returns:
-    - Tuple[Optional[str], List[str]]: A tuple containing the found term and mentioned files.
+        Dict[str, Any]: The routing decision with `type` and `files`; `type` is None if the request fails.
     """
-    contains_term = None
-    if "Retrieval" in input_string:
-        contains_term = "Retrieval"
-    elif "Summarization" in input_string:
-        contains_term = "Summarization"
-    mentioned_files = [file_name for file_name in file_names if file_name in input_string]
+    url = f'{api_url}/route/'
+    params = {'query': query}
 
-    return contains_term, mentioned_files
+    try:
+        response = api_session.get(url, params=params, timeout=api_timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        print(f"Request failed: {e}")
+        return {"type": None, "files": []}
 
 
-def generative(prompt: str) -> Optional[Dict[str, Any]]:
+def summarize_page(page_id: str, query: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
-    Sends a GET request to a local server to generate content based on a given prompt using a specified AI model.
+    Sends a POST request to the API's `/summarize` endpoint to summarize an indexed page.
+
     Args:
-        prompt (str): The input for the content generation request.
+        page_id (str): The Confluence page id.
+        query (Optional[str]): The user's request, used to focus the summary. Without one (or for a
+            plain "summarize this page" request), the API serves the summary precomputed at ingestion.
+
     Returns:
-        Optional[Dict[str, Any]]: The JSON response if successful, otherwise None.
+        Optional[Dict[str, Any]]: The `summary`, page `metadata` and whether it was `precomputed`, or None if the request fails.
     """
-    
-    url = 'http://localhost/generate/'
-    params = {
-        'prompt': prompt,
-        'model': 'deepseek-ai/DeepSeek-R1'
-    }
-    headers = {'accept': 'application/json'}
+    url = f'{api_url}/summarize'
+    payload = {'page_id': page_id, 'query': query}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = api_session.post(url, json=payload, timeout=(api_connect_timeout, summary_read_timeout))
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
         print(f"Request failed: {e}")
         return None
 
-def extract_text_after_tag(input_text: str, tag: str) -> str:
+
+def visible_answer(partial_text: str, tag: str = "think") -> str:
     """
-    Extracts and returns the text following a specified HTML-like closing tag from a given input string.
+    Returns the part of a partially streamed answer that should be shown.
+
+    While a reasoning model is still inside its opening tag nothing is shown; afterwards, and for
+    models that do not use the tag, this is the same as `extract_text_after_tag`.
 
-    :param input_text: A string containing the text with HTML-like tags.
-    :param tag: A string representing the tag name to search for in the input text.
-    :return: A string containing the text after the specified closing tag, or an empty string if the tag is not found.
+    :param partial_text: The answer text received so far.
+    :param tag: The tag name wrapping the model's reasoning.
+    :return: The text to display so far.
     """
-    tag_end = f"</{tag}>"
-    tag_end_index = input_text.find(tag_end)
-    if tag_end_index != -1:
-        return input_text[tag_end_index + len(tag_end):].strip()
-    return ""
\ No newline at end of file
+    opening, received = f"<{tag}>", partial_text.lstrip()
+    if (received.startswith(opening) or opening.startswith(received)) and f"</{tag}>" not in partial_text:
+        return ""
+    return extract_text_after_tag(partial_text, tag)
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The API modules import each other as `utils.*` (they run from api/), everything else from the project root
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "api"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
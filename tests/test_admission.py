@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from utils.admission import DeadlineExceeded, Overloaded, StageLimiter, parse_deadline, reset_deadline, set_deadline
+
+
+def test_parse_deadline_defaults_and_caps_at_the_server_limit():
+    assert parse_deadline(None, 120) == 120
+    assert parse_deadline("2.5", 120) == 2.5
+    assert parse_deadline("600", 120) == 120
+    assert parse_deadline("600", 0) == 600
+
+
+@pytest.mark.parametrize("header", ["soon", "", "0", "-3", "nan", "inf"])
+def test_parse_deadline_rejects_malformed_values(header):
+    with pytest.raises(ValueError):
+        parse_deadline(header, 120)
+
+
+def hold_slot(limiter, entered, release):
+    with limiter.slot():
+        entered.set()
+        release.wait(5)
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    limiter = StageLimiter("es", max_concurrency=1, max_queue=0, max_wait=1)
+    entered, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(limiter, entered, release))
+    holder.start()
+    entered.wait(5)
+    try:
+        with pytest.raises(Overloaded) as error:
+            with limiter.slot():
+                pass
+        assert error.value.status_code == 429
+        assert int(error.value.headers["Retry-After"]) >= 1
+    finally:
+        release.set()
+        holder.join()
+    stats = limiter.stats()
+    assert stats["admitted"] == 1 and stats["rejected"] == 1 and stats["active"] == 0
+
+
+def test_wait_is_bounded_by_the_request_deadline():
+    limiter = StageLimiter("llm", max_concurrency=1, max_queue=1, max_wait=10)
+    entered, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(limiter, entered, release))
+    holder.start()
+    entered.wait(5)
+    token = set_deadline(0.05)
+    try:
+        with pytest.raises(DeadlineExceeded) as error:
+            with limiter.slot():
+                pass
+        assert error.value.status_code == 503
+    finally:
+        reset_deadline(token)
+        release.set()
+        holder.join()
+    stats = limiter.stats()
+    assert stats["timeouts"] == 1 and stats["queue_depth"] == 0
+    assert stats["wait_s"]["max"] < 5
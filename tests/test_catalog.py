@@ -0,0 +1,62 @@
+from utils.catalog import PageCatalog
+
+
+class FakeClient:
+    """Serves composite aggregation pages from a fixed list of (title, page id, url, chunks) buckets."""
+
+    def __init__(self, buckets, page_size):
+        self.buckets = buckets
+        self.page_size = page_size
+        self.requests = []
+
+    def search(self, index, size, aggs):
+        composite = aggs["titles"]["composite"]
+        self.requests.append(composite)
+        start = 0
+        if "after" in composite:
+            start = next(i for i, b in enumerate(self.buckets) if (b[0], b[1]) == (composite["after"]["title"], composite["after"]["page_id"])) + 1
+        page = self.buckets[start:start + self.page_size]
+        result = {"buckets": [
+            {"key": {"title": title, "page_id": page_id}, "doc_count": chunks,
+             "page": {"hits": {"hits": [{"_source": {"Page_URL": url}}]}}}
+            for title, page_id, url, chunks in page
+        ]}
+        if page:
+            result["after_key"] = {"title": page[-1][0], "page_id": page[-1][1]}
+        return {"aggregations": {"titles": result}}
+
+
+class FakeStore:
+    def __init__(self, client):
+        self.client = client
+
+
+def test_pages_sharing_a_title_stay_separate():
+    client = FakeClient([
+        ("Home", "1", "/spaces/OPS/1", 3),
+        ("Home", "2", "/spaces/PLAT/2", 5),
+        ("Runbook", "3", "/spaces/OPS/3", 2),
+    ], page_size=2)
+    catalog = PageCatalog(FakeStore(client), "chunks", page_size=2)
+
+    pages = catalog.get()
+
+    assert [(page["Page_Title"], page["Page_ID"], page["chunks"]) for page in pages] == [("Home", "1", 3), ("Home", "2", 5), ("Runbook", "3", 2)]
+    assert client.requests[0]["sources"] == [
+        {"title": {"terms": {"field": "Page_Title"}}},
+        {"page_id": {"terms": {"field": "Page_ID"}}},
+    ]
+    assert client.requests[1]["after"] == {"title": "Home", "page_id": "2"}
+
+
+def test_version_only_changes_with_the_catalog():
+    client = FakeClient([("Home", "1", "/spaces/OPS/1", 3)], page_size=10)
+    catalog = PageCatalog(FakeStore(client), "chunks")
+
+    catalog.refresh()
+    catalog.refresh()
+    assert catalog.version == 1
+
+    client.buckets.append(("Runbook", "3", "/spaces/OPS/3", 2))
+    catalog.refresh()
+    assert catalog.version == 2
@@ -0,0 +1,52 @@
+from ingestion.utils.checkpoint import IngestCheckpoint, run_key
+
+
+def test_run_key_ignores_setting_order():
+    assert run_key(spaces=["OPS"], reindex=False) == run_key(reindex=False, spaces=["OPS"])
+    assert run_key(spaces=["OPS"]) != run_key(spaces=["PLAT"])
+
+
+def test_a_new_run_starts_empty(tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    assert checkpoint.start("run", "index-1") == ("index-1", False)
+    assert checkpoint.completed("run") == {}
+    assert checkpoint.open_run("run")["pages"] == 0
+
+
+def test_an_interrupted_run_resumes_into_its_own_index(tmp_path):
+    path = str(tmp_path / "checkpoint.sqlite3")
+    checkpoint = IngestCheckpoint(path)
+    checkpoint.start("run", "index-1")
+    checkpoint.record_batch("run", [("10", 3, 4), ("11", 1, 2)])
+
+    resumed = IngestCheckpoint(path)
+    assert resumed.start("run", "index-2") == ("index-1", True)
+    assert resumed.completed("run") == {"10": 3, "11": 1}
+    assert sorted(resumed.page_ids("run")) == ["10", "11"]
+
+
+def test_a_finished_run_is_not_resumed(tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    checkpoint.start("run", "index-1")
+    checkpoint.record_batch("run", [("10", 3, 4)])
+    checkpoint.finish("run")
+    assert checkpoint.open_run("run") is None
+    assert checkpoint.start("run", "index-2") == ("index-2", False)
+    assert checkpoint.completed("run") == {}
+
+
+def test_reset_forgets_the_run(tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    checkpoint.start("run", "index-1")
+    checkpoint.record_batch("run", [("10", 3, 4)])
+    checkpoint.reset("run")
+    assert checkpoint.open_run("run") is None
+    assert checkpoint.completed("run") == {}
+
+
+def test_a_rerecorded_page_keeps_its_latest_version(tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite3"))
+    checkpoint.start("run", None)
+    checkpoint.record_batch("run", [("10", 3, 4)])
+    checkpoint.record_batch("run", [("10", 4, 5)])
+    assert checkpoint.completed("run") == {"10": 4}
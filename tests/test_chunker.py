@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("docx")
+pytest.importorskip("haystack")
+
+from ingestion.utils.chunker import StructureChunker
+
+
+def word_tokenizer(texts, add_special_tokens=False, return_attention_mask=False):
+    """Counts one token per whitespace-separated word."""
+    return {"input_ids": [text.split() for text in texts]}
+
+
+def make_chunker(max_tokens, min_tokens):
+    chunker = StructureChunker(max_tokens=max_tokens, min_tokens=min_tokens)
+    chunker.tokenizer = word_tokenizer
+    return chunker
+
+
+def block(kind, text, path=()):
+    return {"kind": kind, "text": text, "section_path": list(path), "tokens": len(text.split())}
+
+
+def words(count, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_blocks_are_packed_up_to_the_budget():
+    chunker = make_chunker(max_tokens=10, min_tokens=5)
+    chunks = chunker.chunk_blocks([block("text", words(4, "a")), block("text", words(4, "b")), block("text", words(4, "c"))])
+    assert [chunk["tokens"] for chunk in chunks] == [8, 4]
+    assert chunks[0]["content"] == f"{words(4, 'a')}\n\n{words(4, 'b')}"
+
+
+def test_a_heading_closes_a_chunk_once_it_holds_min_tokens():
+    chunker = make_chunker(max_tokens=20, min_tokens=5)
+    chunks = chunker.chunk_blocks([
+        block("heading", "Intro", ["Intro"]), block("text", words(6), ["Intro"]),
+        block("heading", "Setup", ["Setup"]), block("text", words(3), ["Setup"]),
+    ])
+    assert len(chunks) == 2
+    assert chunks[1]["content"].startswith("## Setup")
+    assert chunks[1]["section_path"] == "Setup"
+
+
+def test_a_trailing_heading_moves_on_with_its_content():
+    chunker = make_chunker(max_tokens=8, min_tokens=8)
+    chunks = chunker.chunk_blocks([block("text", words(6)), block("heading", "Next"), block("text", words(4, "n"))])
+    assert chunks[0]["content"] == words(6)
+    assert chunks[1]["content"] == f"## Next\n\n{words(4, 'n')}"
+    assert all(chunk["tokens"] <= 8 for chunk in chunks)
+
+
+def test_an_oversized_table_is_split_by_rows_repeating_the_header():
+    chunker = make_chunker(max_tokens=8, min_tokens=4)
+    rows = ["name | port"] + [f"svc{i} | {8000 + i}" for i in range(6)]
+    chunks = chunker.chunk_blocks([block("table", "\n".join(rows))])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["tokens"] <= 8
+        assert chunk["content"].startswith("[Table Start]\nname | port\n")
+    body = [line for chunk in chunks for line in chunk["content"].split("\n")[2:-1]]
+    assert body == rows[1:]
+
+
+def test_an_oversized_sentence_is_split_on_words():
+    chunker = make_chunker(max_tokens=10, min_tokens=5)
+    chunks = chunker.chunk_blocks([block("text", words(35))])
+    assert all(chunk["tokens"] <= 10 for chunk in chunks)
+    assert " ".join(chunk["content"] for chunk in chunks).split() == words(35).split()
+
+
+def test_run_numbers_chunks_per_page_and_keeps_page_meta():
+    chunker = make_chunker(max_tokens=5, min_tokens=2)
+    pages = [
+        {"blocks": [{"kind": "text", "text": words(4), "section_path": []}] * 2, "meta": {"Page_ID": "1"}},
+        {"blocks": [{"kind": "text", "text": "short", "section_path": ["Top"]}], "meta": {"Page_ID": "2"}},
+    ]
+    documents = chunker.run(pages)
+    assert [(doc.meta["Page_ID"], doc.meta["split_id"]) for doc in documents] == [("1", 0), ("1", 1), ("2", 0)]
+    assert documents[2].meta["section_path"] == "Top"
+    assert documents[0].meta["token_count"] == 4
@@ -0,0 +1,112 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("haystack")
+
+from haystack import Document
+
+from ingestion.utils.dedup import CanonicalIndex, LSHIndex, collapse_near_duplicates, rehome_aliases, restore_aliases, shingles
+
+BOILERPLATE = " ".join(f"This template paragraph {i} explains how to fill in the on-call handover form." for i in range(8))
+
+
+def chunk(page_id, content, **meta):
+    return Document(content=content, meta={"Page_ID": page_id, "Page_Title": f"Page {page_id}",
+                                           "Page_URL": f"/pages/{page_id}", **meta})
+
+
+def test_shingles_normalise_case_and_whitespace():
+    assert shingles("A  b\nC", size=2) == ["a b", "b c"]
+    assert shingles("short text", size=5) == ["short text"]
+
+
+def test_lsh_requires_whole_bands():
+    with pytest.raises(ValueError):
+        LSHIndex(num_perm=128, bands=10)
+
+
+def test_cross_page_duplicate_is_collapsed_into_an_alias():
+    documents = [chunk("1", "Page one intro."), chunk("1", BOILERPLATE), chunk("2", "Page two intro."),
+                 chunk("2", BOILERPLATE, token_count=120)]
+    kept, report = collapse_near_duplicates(documents)
+    assert [doc.content for doc in kept] == ["Page one intro.", BOILERPLATE, "Page two intro."]
+    assert kept[1].meta["alias_page_ids"] == ["2"]
+    assert kept[1].meta["alias_page_titles"] == ["Page 2"]
+    assert kept[1].meta["alias_page_urls"] == ["/pages/2"]
+    assert report["collapsed"] == 1 and report["cross_page_duplicates"] == 1 and report["tokens_saved"] == 120
+
+
+def test_distinct_chunks_are_kept():
+    documents = [chunk("1", BOILERPLATE), chunk("2", BOILERPLATE.replace("on-call handover", "quarterly budget review"))]
+    kept, report = collapse_near_duplicates(documents)
+    assert len(kept) == 2 and report["collapsed"] == 0
+
+
+def test_every_page_keeps_a_chunk_of_its_own():
+    documents = [chunk("1", BOILERPLATE), chunk("2", BOILERPLATE)]
+    kept, _ = collapse_near_duplicates(documents)
+    assert [doc.meta["Page_ID"] for doc in kept] == ["1", "2"]
+    assert "alias_page_ids" not in kept[0].meta
+
+
+def test_repeats_within_a_page_do_not_alias_the_page_to_itself():
+    documents = [chunk("1", BOILERPLATE), chunk("1", BOILERPLATE), chunk("1", "Page one outro.")]
+    kept, report = collapse_near_duplicates(documents)
+    assert len(kept) == 2 and report["cross_page_duplicates"] == 0
+    assert "alias_page_ids" not in kept[0].meta
+
+
+def test_canonical_index_collapses_across_batches():
+    index = CanonicalIndex()
+    first = [chunk("1", "Page one intro."), chunk("1", BOILERPLATE, Space_Key="OPS")]
+    kept, signatures, updated, report = index.collapse(first)
+    assert kept == first and not updated and report["collapsed"] == 0
+    index.add(kept, signatures)
+
+    second = [chunk("2", "Page two intro."), chunk("2", BOILERPLATE, token_count=120)]
+    kept, signatures, updated, report = index.collapse(second)
+    assert [doc.content for doc in kept] == ["Page two intro."]
+    assert updated == {first[1].id}
+    assert index.aliases(first[1].id) == {"Space_Key": "OPS", "alias_page_ids": ["2"], "alias_page_titles": ["Page 2"],
+                                          "alias_page_urls": ["/pages/2"]}
+    assert report["cross_batch_duplicates"] == 1 and report["tokens_saved"] == 120
+
+
+def test_canonical_index_keeps_a_chunk_of_every_page_and_passes_aliases_on():
+    index = CanonicalIndex()
+    index.add([chunk("1", BOILERPLATE)], [index.signature(BOILERPLATE)])
+    assert index.collapse([chunk("2", BOILERPLATE)])[0][0].meta["Page_ID"] == "2"
+
+    carrier = chunk("3", BOILERPLATE, alias_page_ids=["4"], alias_page_titles=["Page 4"], alias_page_urls=["/pages/4"])
+    kept, _, updated, _ = index.collapse([chunk("3", "Page three intro."), carrier])
+    assert len(kept) == 1 and len(updated) == 1
+    assert index.aliases(updated.pop())["alias_page_ids"] == ["3", "4"]
+
+
+def test_canonical_index_does_not_register_a_duplicate_twice():
+    index = CanonicalIndex()
+    documents = [chunk("1", BOILERPLATE), chunk("2", BOILERPLATE), chunk("3", "")]
+    index.add(documents, [index.signature(doc.content) for doc in documents])
+    assert len(index) == 1
+
+
+def aliased(chunk_id, page_id, *alias_ids):
+    return {"id": chunk_id, "Page_ID": page_id, "alias_page_ids": list(alias_ids),
+            "alias_page_titles": [f"Page {alias}" for alias in alias_ids], "alias_page_urls": [f"/pages/{alias}" for alias in alias_ids]}
+
+
+def test_a_rewritten_chunk_keeps_its_aliases():
+    documents = [chunk("1", BOILERPLATE, alias_page_ids=["3"], alias_page_titles=["Page 3"], alias_page_urls=["/pages/3"]),
+                 chunk("1", "Page one intro.")]
+    stored = [aliased(documents[0].id, "1", "2", "3"), aliased("gone", "1", "4")]
+    assert restore_aliases(documents, stored) == 1
+    assert documents[0].meta["alias_page_ids"] == ["3", "2"]
+    assert documents[0].meta["alias_page_urls"] == ["/pages/3", "/pages/2"]
+    assert "alias_page_ids" not in documents[1].meta
+
+
+def test_a_deleted_chunk_is_handed_to_its_first_alias():
+    stored = [aliased("kept", "1", "2"), aliased("gone", "1", "2", "3"), aliased("plain", "1")]
+    assert rehome_aliases(stored, keep_ids=["kept"]) == {"gone": {
+        "Page_ID": "2", "Page_Title": "Page 2", "Page_URL": "/pages/2",
+        "alias_page_ids": ["3"], "alias_page_titles": ["Page 3"], "alias_page_urls": ["/pages/3"]}}
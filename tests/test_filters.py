@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.filters import build_filters, combine_filters, es_clause, parse_date, routing_values
+
+NOW = datetime(2024, 6, 30, 12, 34, 56, 789, tzinfo=timezone.utc)
+
+
+def test_parse_date_reads_relative_ages_rounded_to_the_minute():
+    assert parse_date("30d", now=NOW) == "2024-05-31T12:34:00+00:00"
+    assert parse_date(" 2W ", now=NOW) == "2024-06-16T12:34:00+00:00"
+    assert parse_date("1y", now=NOW) == "2023-07-01T12:34:00+00:00"
+
+
+def test_parse_date_reads_iso_dates_as_utc():
+    assert parse_date("2024-06-01") == "2024-06-01T00:00:00+00:00"
+    assert parse_date("2024-06-01T10:00:00Z") == "2024-06-01T10:00:00+00:00"
+    assert parse_date("2024-06-01T12:00:00+02:00") == "2024-06-01T10:00:00+00:00"
+
+
+def test_parse_date_rejects_anything_else():
+    with pytest.raises(ValueError):
+        parse_date("last week")
+
+
+def test_no_parameters_means_no_filters():
+    assert build_filters() is None
+    assert build_filters(space=[""], label=[]) is None
+
+
+def test_one_facet_is_a_single_condition():
+    assert build_filters(space=["PLAT", "OPS"]) == {"field": "meta.Space_Key", "operator": "in", "value": ["PLAT", "OPS"]}
+
+
+def test_facets_and_dates_are_combined_with_and():
+    filters = build_filters(space=["PLAT"], label=["runbook"], modified_after="2024-01-01", modified_before="2024-06-01")
+    assert filters["operator"] == "AND"
+    assert filters["conditions"] == [
+        {"field": "meta.Space_Key", "operator": "in", "value": ["PLAT"]},
+        {"field": "meta.Labels", "operator": "in", "value": ["runbook"]},
+        {"field": "meta.Last_Modified", "operator": ">=", "value": "2024-01-01T00:00:00+00:00"},
+        {"field": "meta.Last_Modified", "operator": "<=", "value": "2024-06-01T00:00:00+00:00"},
+    ]
+
+
+def test_invalid_dates_raise():
+    with pytest.raises(ValueError):
+        build_filters(modified_after="soon")
+
+
+def test_combine_filters_skips_none():
+    condition = {"field": "meta.Page_ID", "operator": "==", "value": "1"}
+    assert combine_filters(None, None) is None
+    assert combine_filters(None, condition) == condition
+    assert combine_filters(condition, condition) == {"operator": "AND", "conditions": [condition, condition]}
+
+
+def test_es_clause_translates_every_operator():
+    filters = {"operator": "AND", "conditions": [
+        {"field": "meta.Space_Key", "operator": "in", "value": ["PLAT"]},
+        {"field": "meta.Last_Modified", "operator": ">=", "value": "2024-01-01"},
+        {"operator": "NOT", "conditions": [{"field": "meta.Author_Name", "operator": "==", "value": "bot"}]},
+        {"operator": "OR", "conditions": [{"field": "meta.Labels", "operator": "!=", "value": "draft"},
+                                          {"field": "meta.Labels", "operator": "not in", "value": ["old"]}]},
+    ]}
+    assert es_clause(filters) == {"bool": {"filter": [
+        {"terms": {"Space_Key": ["PLAT"]}},
+        {"range": {"Last_Modified": {"gte": "2024-01-01"}}},
+        {"bool": {"must_not": [{"bool": {"filter": [{"term": {"Author_Name": "bot"}}]}}]}},
+        {"bool": {"should": [{"bool": {"must_not": [{"term": {"Labels": "draft"}}]}},
+                             {"bool": {"must_not": [{"terms": {"Labels": ["old"]}}]}}], "minimum_should_match": 1}},
+    ]}}
+    with pytest.raises(ValueError):
+        es_clause({"field": "meta.Labels", "operator": "~", "value": "x"})
+
+
+def test_routing_values_only_when_every_match_is_in_the_spaces():
+    assert routing_values(build_filters(space=["PLAT", "OPS"], label=["runbook"])) == ["PLAT", "OPS"]
+    assert routing_values(build_filters(label=["runbook"])) is None
+    assert routing_values({"operator": "OR", "conditions": [{"field": "meta.Space_Key", "operator": "==", "value": "PLAT"}]}) is None
+    assert routing_values(None) is None
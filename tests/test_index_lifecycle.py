@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("elasticsearch")
+
+from docstore.utils.index_lifecycle import BUILD_SETTINGS, create_build_index
+
+
+class FakeIndices:
+    """Keeps index settings in memory; a new index gets `default_shards` unless told otherwise."""
+
+    def __init__(self, default_shards=1):
+        self.default_shards = default_shards
+        self.settings = {}
+
+    def exists(self, index):
+        return index in self.settings
+
+    def create(self, index, mappings, settings):
+        self.settings[index] = {"number_of_shards": str(self.default_shards), **{k: str(v) for k, v in settings.items()}}
+
+    def put_settings(self, index, settings):
+        self.settings[index].update({k: str(v) for k, v in settings.items()})
+
+    def get_settings(self, index):
+        return {index: {"settings": {"index": dict(self.settings[index])}}}
+
+
+class FakeClient:
+    def __init__(self, default_shards=1):
+        self.indices = FakeIndices(default_shards)
+
+
+def test_a_build_index_gets_the_requested_shards_and_build_settings():
+    client = FakeClient()
+    create_build_index(client, "confluence-1", {"properties": {}}, shards=6)
+    settings = client.indices.get_settings(index="confluence-1")["confluence-1"]["settings"]["index"]
+    assert settings["number_of_shards"] == "6"
+    assert settings["refresh_interval"] == BUILD_SETTINGS["refresh_interval"]
+    assert settings["number_of_replicas"] == "0"
+
+
+def test_an_index_created_with_other_shards_is_rejected():
+    client = FakeClient()
+    # What a document store does on first use: create the index with the cluster's defaults
+    client.indices.create(index="confluence-1", mappings={}, settings={})
+    with pytest.raises(RuntimeError):
+        create_build_index(client, "confluence-1", {"properties": {}}, shards=6)
+
+
+def test_a_resumed_build_keeps_its_index():
+    client = FakeClient()
+    create_build_index(client, "confluence-1", {"properties": {}}, shards=6)
+    create_build_index(client, "confluence-1", {"properties": {}}, shards=6)
+    assert client.indices.get_settings(index="confluence-1")["confluence-1"]["settings"]["index"]["number_of_shards"] == "6"
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from utils.llm import LLMRouter
+
+
+class FakeLimiter:
+    def __init__(self, queue_depth=0):
+        self.queue_depth = queue_depth
+
+
+class FakeProvider:
+    """Plays back one behaviour per call: a delay, then a response, None, or an exception."""
+
+    name = "fake"
+
+    def __init__(self, behaviours, limiter=None):
+        self.behaviours = list(behaviours)
+        self.limiter = limiter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def chat(self, messages, model):
+        with self._lock:
+            delay, result = self.behaviours[self.calls]
+            self.calls += 1
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeRegistry:
+    def __init__(self, provider):
+        self.provider = provider
+
+    def resolve(self, task=None, model=None):
+        return self.provider, "model"
+
+
+def warmed_router(provider, **kwargs):
+    router = LLMRouter(FakeRegistry(provider), hedge_min_samples=1, hedge_min_delay=0.05, **kwargs)
+    router._route_stats("fake:model").latencies.append(0.01)
+    return router
+
+
+def test_backup_wins_when_the_primary_is_slow():
+    provider = FakeProvider([(0.5, {"id": "primary"}), (0, {"id": "backup"})])
+    router = warmed_router(provider)
+    assert router.complete([{"role": "user", "content": "hi"}]) == {"id": "backup"}
+    stats = router.stats()["fake:model"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_a_failed_primary_does_not_fail_the_call():
+    provider = FakeProvider([(0.1, RuntimeError("primary failed")), (0.2, {"id": "backup"})])
+    router = warmed_router(provider)
+    assert router.complete([{"role": "user", "content": "hi"}]) == {"id": "backup"}
+
+
+def test_the_call_fails_only_when_both_requests_fail():
+    provider = FakeProvider([(0.1, RuntimeError("primary failed")), (0.1, None)])
+    router = warmed_router(provider)
+    with pytest.raises(RuntimeError):
+        router.complete([{"role": "user", "content": "hi"}])
+
+
+def test_no_hedge_while_the_limiter_has_a_queue():
+    provider = FakeProvider([(0.1, {"id": "primary"})], limiter=FakeLimiter(queue_depth=3))
+    router = warmed_router(provider)
+    assert router.complete([{"role": "user", "content": "hi"}]) == {"id": "primary"}
+    assert provider.calls == 1
+    assert router.stats()["fake:model"]["hedges_skipped"] == 1
+
+
+def test_hedges_in_flight_are_capped():
+    provider = FakeProvider([(0.1, {"id": "primary"})])
+    router = warmed_router(provider, max_hedges=0)
+    assert router.complete([{"role": "user", "content": "hi"}]) == {"id": "primary"}
+    assert provider.calls == 1
+
+
+class LimitedProvider:
+    """Holds a slot of its limiter for `delay` seconds per call, like `LLMProvider.chat`."""
+
+    name = "fake"
+
+    def __init__(self, limiter, delay):
+        self.limiter = limiter
+        self.delay = delay
+
+    def chat(self, messages, model):
+        with self.limiter.slot():
+            time.sleep(self.delay)
+        return {"id": "ok"}
+
+
+def run_concurrently(router, calls):
+    results, barrier = [], threading.Barrier(calls)
+
+    def call():
+        barrier.wait()
+        try:
+            results.append(router.complete([{"role": "user", "content": "hi"}]))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_an_overloaded_hedged_route_still_answers_429():
+    admission = pytest.importorskip("utils.admission")
+    limiter = admission.StageLimiter("llm", max_concurrency=1, max_queue=2, max_wait=10)
+    router = LLMRouter(FakeRegistry(LimitedProvider(limiter, 0.5)), hedge_min_samples=1, hedge_min_delay=10, max_workers=2)
+    router._route_stats("fake:model").latencies.append(0.01)
+    # Two calls fit the pool, the other two wait on their own threads: one queues, one is shed
+    results = run_concurrently(router, 4)
+    rejected = [result for result in results if isinstance(result, admission.Overloaded)]
+    assert len(rejected) == 1 and rejected[0].status_code == 429
+    assert results.count({"id": "ok"}) == 3
+
+
+def test_hedged_calls_keep_the_request_deadline():
+    admission = pytest.importorskip("utils.admission")
+    limiter = admission.StageLimiter("llm", max_concurrency=1, max_queue=1, max_wait=10)
+    router = LLMRouter(FakeRegistry(LimitedProvider(limiter, 0)), hedge_min_samples=1, hedge_min_delay=10)
+    router._route_stats("fake:model").latencies.append(0.01)
+    with limiter.slot():
+        token = admission.set_deadline(0.1)
+        start = time.monotonic()
+        try:
+            with pytest.raises(admission.DeadlineExceeded):
+                router.complete([{"role": "user", "content": "hi"}])
+        finally:
+            admission.reset_deadline(token)
+    # Gave up at the request deadline, not the limiter's max_wait
+    assert time.monotonic() - start < 2
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("haystack")
+
+from haystack import Document
+from haystack.document_stores.types import DuplicatePolicy
+
+from docstore.utils.local_store import LocalDocumentStore
+from ingestion.utils.dedup import rehome_aliases, restore_aliases
+
+
+def chunk(page_id, split_id, content, **meta):
+    return Document(content=content, embedding=[1.0, 0.0, 0.0, 0.0],
+                    meta={"Page_ID": page_id, "Page_Title": f"Page {page_id}", "Page_URL": f"/pages/{page_id}",
+                          "split_id": split_id, **meta})
+
+
+def test_alias_chunks_lists_only_chunks_holding_aliases(tmp_path):
+    store = LocalDocumentStore(str(tmp_path), embedding_dim=4)
+    canonical = chunk("1", 0, "Shared template.", alias_page_ids=["2"], alias_page_titles=["Page 2"], alias_page_urls=["/pages/2"])
+    store.write_documents([canonical, chunk("1", 1, "Page one."), chunk("2", 0, "Page two.")])
+    assert [(stored["id"], stored["alias_page_ids"]) for stored in store.alias_chunks(["1", "2"])] == [(canonical.id, ["2"])]
+
+
+def test_a_handed_over_chunk_survives_its_page_and_joins_the_alias(tmp_path):
+    store = LocalDocumentStore(str(tmp_path), embedding_dim=4)
+    canonical = chunk("1", 0, "Shared template.", alias_page_ids=["2"], alias_page_titles=["Page 2"], alias_page_urls=["/pages/2"])
+    store.write_documents([canonical, chunk("1", 1, "Page one."), chunk("2", 0, "Page two.")])
+
+    # Page 1 is removed: its alias-holding chunk moves to page 2 instead of being deleted
+    rehomed = rehome_aliases(store.alias_chunks(["1"]), keep_ids=[])
+    assert store.update_meta(rehomed) == 1
+    store.delete_documents([doc_id for doc_id in store.page_document_ids("1") if doc_id not in rehomed])
+
+    assert store.page_document_ids("1") == []
+    assert [source["content"] for source in store.page_sources("2")] == ["Shared template.", "Page two."]
+    assert store.alias_chunks(["2"]) == []
+
+
+def test_a_rewritten_page_keeps_the_aliases_of_its_chunks(tmp_path):
+    store = LocalDocumentStore(str(tmp_path), embedding_dim=4)
+    aliases = {"alias_page_ids": ["2"], "alias_page_titles": ["Page 2"], "alias_page_urls": ["/pages/2"]}
+    store.write_documents([chunk("1", 0, "Shared template.", **aliases), chunk("1", 1, "Old outro.", **aliases),
+                           chunk("2", 0, "Page two.")])
+
+    # Page 1 is re-ingested: the template chunk comes back under the same id, the outro is gone
+    stored = store.alias_chunks(["1"])
+    new = [chunk("1", 0, "Shared template.", **aliases), chunk("1", 1, "New outro.")]
+    new[0].meta.pop("alias_page_ids")
+    restore_aliases(new, stored)
+    store.write_documents(new, policy=DuplicatePolicy.OVERWRITE)
+    rehomed = rehome_aliases(stored, keep_ids=[doc.id for doc in new])
+    store.update_meta(rehomed)
+
+    assert new[0].meta["alias_page_ids"] == ["2"]
+    assert [source["content"] for source in store.page_sources("2")] == ["Page two.", "Old outro.", "Shared template."]
@@ -0,0 +1,82 @@
+from utils.page_assembly import assemble_page, page_metadata, strip_overlap
+
+
+class FakeClient:
+    """Answers term queries on `Page_ID` / `alias_page_ids` from a list of chunk sources, sorted by split_id."""
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def search(self, index, size, query, sort=None, _source=None, search_after=None):
+        field, value = next(iter(query["bool"]["filter"][0]["term"].items()))
+        matches = [source for source in self.sources if not source.get("Attachment_ID")
+                   and (value in (source.get(field) or []) if field == "alias_page_ids" else source.get(field) == value)]
+        hits = [{"_source": source, "sort": [source.get("split_id", 0), position]}
+                for position, source in sorted(enumerate(matches), key=lambda item: (item[1].get("split_id", 0), item[0]))]
+        if search_after is not None:
+            hits = [hit for hit in hits if hit["sort"] > search_after]
+        return {"hits": {"hits": hits[:size]}}
+
+
+def chunk(page_id, split_id, content, **meta):
+    return {"Page_ID": page_id, "Page_Title": f"Page {page_id}", "split_id": split_id, "content": content, **meta}
+
+
+def alias(page_id, split_id, content, alias_id):
+    return chunk(page_id, split_id, content, alias_page_ids=[alias_id], alias_page_titles=[f"Page {alias_id}"],
+                 alias_page_urls=[f"/pages/{alias_id}"])
+
+
+def test_strip_overlap_removes_exactly_the_recorded_overlap():
+    previous = {"id": "a", "content": "one two three four "}
+    current = {"content": "three four five six", "_split_overlap": [{"doc_id": "a", "range": [8, 19]},
+                                                                    {"doc_id": "c", "range": [0, 4]}]}
+    assert strip_overlap(previous, current) == "five six"
+    assert strip_overlap({"content": "one two three four "}, current) == "five six"
+
+
+def test_strip_overlap_keeps_chunks_that_do_not_overlap():
+    # Structure chunks carry no overlap record: a word that happens to repeat is real text
+    assert strip_overlap({"content": "Read the"}, {"content": "the end"}) == "the end"
+    # A record about another chunk (here the next one) is not an overlap with this one
+    previous = {"id": "a", "content": "one two"}
+    assert strip_overlap(previous, {"content": "one two three", "_split_overlap": [{"doc_id": "c", "range": [0, 7]}]}) == "one two three"
+
+
+def test_alias_chunks_follow_the_page_own_chunks():
+    client = FakeClient([
+        alias("2", 0, "shared intro", "1"),
+        chunk("1", 1, "own second"),
+        chunk("1", 0, "own first"),
+        alias("3", 5, "shared appendix", "1"),
+        chunk("1", 0, "attachment", Attachment_ID="9"),
+    ])
+    page = assemble_page(client, "chunks", "1", page_size=1)
+    assert page["content"].split("\n") == ["own first", "own second", "shared intro", "shared appendix"]
+    assert page["metadata"]["Page_Title"] == "Page 1"
+    assert "split_id" not in page["metadata"]
+
+
+def test_word_splitter_overlap_is_stripped_when_assembling():
+    client = FakeClient([chunk("1", 0, "alpha beta gamma ", id="a"),
+                         chunk("1", 1, "beta gamma delta", id="b", _split_overlap=[{"doc_id": "a", "range": [6, 17]}])])
+    assert assemble_page(client, "chunks", "1")["content"] == "alpha beta gamma \ndelta"
+
+
+def test_alias_chunks_do_not_lose_words_to_overlap_stripping():
+    client = FakeClient([chunk("1", 0, "alpha beta gamma"), alias("2", 3, "beta gamma delta", "1")])
+    assert assemble_page(client, "chunks", "1")["content"] == "alpha beta gamma\nbeta gamma delta"
+
+
+def test_page_without_own_chunks_is_assembled_from_aliases():
+    client = FakeClient([alias("2", 4, "shared text", "1"), chunk("2", 0, "other page")])
+    page = assemble_page(client, "chunks", "1")
+    assert page["content"] == "shared text"
+    assert page["metadata"] == {"Page_ID": "1", "Page_Title": "Page 1", "Page_URL": "/pages/1"}
+    assert page_metadata(client, "chunks", "1") == page["metadata"]
+
+
+def test_missing_page_is_none():
+    client = FakeClient([chunk("2", 0, "other page")])
+    assert assemble_page(client, "chunks", "1") is None
+    assert page_metadata(client, "chunks", "1") is None
@@ -0,0 +1,65 @@
+import json
+import threading
+
+from ingestion.utils.profiling import IngestionProfiler
+
+
+def test_stage_accumulates_calls_items_and_bytes(tmp_path):
+    profiler = IngestionProfiler(report_path=str(tmp_path / "report.json"))
+    for _ in range(3):
+        with profiler.stage("embedding") as stage:
+            stage.add(items=2, nbytes=100)
+
+    stats = profiler.stages["embedding"].to_dict()
+    assert stats["calls"] == 3
+    assert stats["items"] == 6
+    assert stats["bytes"] == 300
+    assert stats["wall_time_s"] >= 0
+
+
+def test_concurrent_entries_are_all_counted(tmp_path):
+    profiler = IngestionProfiler(report_path=str(tmp_path / "report.json"))
+    barrier = threading.Barrier(4)
+
+    def work():
+        with profiler.stage("download") as stage:
+            barrier.wait()
+            stage.add(items=1)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert profiler.stages["download"].calls == 4
+    assert profiler.stages["download"].items == 4
+    assert profiler._active == {}
+
+
+def test_write_report_includes_stages_and_extra(tmp_path):
+    profiler = IngestionProfiler(report_path=str(tmp_path / "reports" / "run.json"), profile_dir=str(tmp_path / "prof"))
+    with profiler.stage("chunking") as stage:
+        stage.add(items=1)
+    profiler.extra["chunks"] = {"written": 1}
+
+    path = profiler.write_report()
+
+    report = json.loads(path.read_text())
+    assert report["stages"]["chunking"]["items"] == 1
+    assert report["stages"]["chunking"]["window"][0] <= report["stages"]["chunking"]["window"][1]
+    assert report["chunks"] == {"written": 1}
+    assert (tmp_path / "prof" / "chunking.prof").exists()
+
+
+def test_rss_delta_is_measured_from_each_entry(tmp_path):
+    profiler = IngestionProfiler(report_path=str(tmp_path / "report.json"), sample_interval=3600)
+    readings = iter([100, 1000, 1010, 400])
+    profiler._rss = lambda: next(readings)
+    with profiler.stage("extract"):
+        with profiler.stage("extract"):
+            pass
+
+    stats = profiler.stages["extract"]
+    assert stats.rss_start == 100
+    assert stats.rss_peak_delta == 300
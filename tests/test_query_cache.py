@@ -0,0 +1,77 @@
+import json
+import time
+
+from utils.query_cache import LRUCache, QueryLog
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_lru_cache_expires_entries_after_the_ttl():
+    cache = LRUCache(maxsize=4, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_cache_of_size_zero_stores_nothing():
+    cache = LRUCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_query_log_append_does_not_touch_the_disk(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), flush_interval=60)
+    log.append("vacation policy")
+    assert not (tmp_path / "queries.jsonl").exists()
+    log.flush()
+    assert (tmp_path / "queries.jsonl").read_text(encoding="utf-8") == '{"q":"vacation policy"}\n'
+
+
+def test_query_log_is_written_in_the_background(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path), flush_interval=0.01)
+    log.append("vacation policy")
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert path.read_text(encoding="utf-8") == '{"q":"vacation policy"}\n'
+
+
+def test_most_common_counts_queries_with_their_filters(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), flush_interval=60)
+    ops = {"field": "meta.Space_Key", "operator": "in", "value": ["OPS"]}
+    for query, filters in [("vpn", None), ("vpn", ops), ("vpn", None), ("sla", None)]:
+        log.append(query, filters)
+    assert log.most_common(2) == [("vpn", None, 2), ("vpn", ops, 1)]
+
+
+def test_most_common_skips_a_truncated_line(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text('{"q":"vpn"}\n{"q":"trunc', encoding="utf-8")
+    assert QueryLog(str(path)).most_common(5) == [("vpn", None, 1)]
+
+
+def test_query_log_is_compacted_to_the_latest_entries(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path), max_entries=3, flush_interval=60)
+    for i in range(6):
+        log.append(f"q{i}")
+    log.flush()
+    assert [json.loads(line)["q"] for line in path.read_text(encoding="utf-8").splitlines()] == ["q3", "q4", "q5"]
+
+
+def test_disabled_query_log_writes_nothing(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), max_entries=0)
+    log.append("vpn")
+    log.flush()
+    assert not (tmp_path / "queries.jsonl").exists()
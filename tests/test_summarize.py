@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.summarize import MapReduceSummarizer, estimate_tokens, is_focused_request, split_sections
+
+
+def words(count, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_short_page_is_one_section():
+    text = "First paragraph.\n\nSecond paragraph."
+    assert split_sections(text, max_tokens=100) == ["First paragraph.\n\nSecond paragraph."]
+
+
+def test_paragraphs_are_packed_within_the_budget_in_order():
+    paragraphs = [words(30, prefix=f"p{n}_") for n in range(5)]
+    sections = split_sections("\n\n".join(paragraphs), max_tokens=100)
+    assert len(sections) > 1
+    assert all(estimate_tokens(section) <= 100 for section in sections)
+    assert "\n\n".join(sections).split("\n\n") == paragraphs
+
+
+def test_oversized_paragraph_is_split_on_word_boundaries():
+    paragraph = words(300)
+    sections = split_sections(paragraph, max_tokens=50)
+    assert all(estimate_tokens(section) <= 50 for section in sections)
+    assert " ".join(sections).split() == paragraph.split()
+
+
+def test_headings_tables_and_code_start_a_new_paragraph():
+    text = "Intro line\n# Heading\n[Table Start]\nrow\n[Code Block]\nprint()"
+    # Every paragraph fills the budget, so each one becomes its own section
+    sections = split_sections(text, max_tokens=10, count_tokens=lambda piece: 10)
+    assert sections == ["Intro line", "# Heading", "[Table Start]\nrow", "[Code Block]\nprint()"]
+
+
+def test_plain_summary_requests_are_not_focused():
+    assert not is_focused_request(None)
+    assert not is_focused_request("Summarize the Deployment Guide page", "Deployment Guide")
+    assert not is_focused_request("Can you give me a quick summary of deployment guide?", "Deployment Guide")
+
+
+def test_a_request_about_part_of_the_page_is_focused():
+    assert is_focused_request("Summarize the Deployment Guide rollback steps", "Deployment Guide")
+    assert is_focused_request("tl;dr of the escalation policy", "On-call Handbook")
+
+
+def test_sections_end_at_headings_once_they_hold_min_tokens():
+    text = "\n\n".join(f"# Part {n}\n\n{words(30, prefix=f'p{n}_')}" for n in range(4))
+    sections = split_sections(text, max_tokens=100)
+    assert [section.split("\n\n")[0] for section in sections] == [f"# Part {n}" for n in range(4)]
+
+
+def test_an_edit_keeps_later_sections_cached():
+    calls = []
+
+    def generate(prompt, model, system):
+        calls.append(prompt)
+        return f"summary {len(calls)}"
+
+    summarizer = MapReduceSummarizer(generate, section_tokens=100)
+    parts = [[f"# Part {n}", words(20, prefix=f"a{n}_"), words(20, prefix=f"b{n}_")] for n in range(6)]
+    first = summarizer.summarize("\n\n".join("\n\n".join(part) for part in parts), None, "Page", "model")
+
+    # The first section grows; every section after it keeps its text, so its summary is cached
+    parts[0][1] += " " + words(30, prefix="new")
+    calls.clear()
+    second = summarizer.summarize("\n\n".join("\n\n".join(part) for part in parts), None, "Page", "model")
+    assert second["sections"] == first["sections"] > 1
+    assert second["cached_sections"] == second["sections"] - 1
+    assert len(calls) == 2  # the edited section and the merge
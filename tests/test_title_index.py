@@ -0,0 +1,105 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.title_index import TitleIndex, normalize_title, trigrams
+
+TITLES = ["Overview", "Home", "Work From Home Policy", "DevOps Ramp-up Plan", "Employee Handbook & Policies", "Release Process"]
+
+
+def test_normalize_title_and_trigrams():
+    assert normalize_title("DevOps  Ramp-up/Plan!") == "devops ramp up plan"
+    assert trigrams("Home") == {" ho", "hom", "ome", "me "}
+
+
+def test_title_named_in_query_scores_one_despite_punctuation():
+    index = TitleIndex()
+    index.sync(TITLES)
+
+    results = index.search("Summarize the devops ramp up plan please")
+
+    assert results[0] == ("DevOps Ramp-up Plan", 1.0)
+
+
+def test_small_typo_still_ranks_first():
+    index = TitleIndex()
+    index.sync(TITLES)
+
+    title, score = index.search("summarize the employee handbok and policies")[0]
+
+    assert title == "Employee Handbook & Policies"
+    assert 0.8 <= score < 1.0
+
+
+def test_specific_title_wins_tie_over_generic_one():
+    index = TitleIndex()
+    index.sync(TITLES)
+
+    results = index.search("summarize the work from home policy")
+
+    assert results[0] == ("Work From Home Policy", 1.0)
+    assert results[1] == ("Home", 1.0)
+
+
+def test_generic_title_assembled_from_other_words_stays_below_default_threshold():
+    index = TitleIndex()
+    index.sync(TITLES)
+
+    assert index.search("review the overall process", min_score=0.8) == []
+
+
+def test_add_and_remove_keep_scores_consistent_between_rebuilds():
+    index = TitleIndex(rebuild_drift=10.0)
+    index.sync(TITLES)
+    snapshot = dict(index._idf)
+
+    index.add("Incident Postmortem Template")
+    index.remove("Release Process")
+
+    # No rebuild happened, so existing IDF values are untouched...
+    assert all(index._idf[gram] == idf for gram, idf in snapshot.items() if gram in index._idf)
+    # ...yet a fully mentioned title still scores exactly 1.0, and a removed one is gone
+    assert index.search("fill in the incident postmortem template")[0] == ("Incident Postmortem Template", 1.0)
+    assert "Release Process" not in [title for title, _ in index.search("release process")]
+
+
+def test_rebuild_after_drift_matches_fresh_index():
+    grown = TitleIndex()
+    grown.sync(TITLES[:2])
+    grown.sync(TITLES)
+    fresh = TitleIndex()
+    fresh.sync(TITLES)
+
+    assert grown.search("give me an overview of the release process") == fresh.search("give me an overview of the release process")
+
+
+def test_common_trigrams_do_not_nominate_candidates():
+    titles = [f"Team {i:03d} Notes" for i in range(200)] + ["Quarterly Roadmap"]
+    index = TitleIndex(max_df_ratio=0.05, min_stop_df=10)
+    index.sync(titles)
+
+    uncapped = TitleIndex(max_df_ratio=1.0)
+    uncapped.sync(titles)
+
+    # " te", "tea", "eam", " no", ... appear in almost every title: they alone must not match anything
+    assert uncapped.search("team notes") != []
+    assert index.search("team notes") == []
+    assert index.search("the quarterly roadmap")[0] == ("Quarterly Roadmap", 1.0)
+
+
+def test_ids_are_reused_after_remove():
+    index = TitleIndex()
+    index.sync(["Alpha", "Beta"], version=1)
+    index.sync(["Beta", "Gamma"], version=2)
+
+    assert len(index) == 2
+    assert len(index._titles) == 2
+    assert index.search("gamma")[0] == ("Gamma", 1.0)
+
+
+def test_sync_is_skipped_for_the_same_version():
+    index = TitleIndex()
+    index.sync(["Alpha"], version=3)
+    index.sync(["Beta"], version=3)
+
+    assert index.search("alpha")[0][0] == "Alpha"
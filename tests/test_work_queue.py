@@ -0,0 +1,79 @@
+import threading
+
+from utils.work_queue import DebouncedQueue, QueueWorker
+
+
+def test_an_entry_is_due_after_the_debounce(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=60)
+    queue.enqueue("1", "upsert")
+    assert queue.next_due() is None
+    assert queue.stats()["pending"] == 1
+
+    immediate = DebouncedQueue(str(tmp_path / "immediate.sqlite3"), debounce_seconds=0)
+    immediate.enqueue("1", "upsert")
+    assert immediate.next_due()["page_id"] == "1"
+
+
+def test_a_burst_is_one_entry_with_the_latest_event(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=0)
+    queue.enqueue("1", "upsert")
+    queue.enqueue("1", "upsert")
+    queue.enqueue("1", "remove")
+    entry = queue.next_due()
+    assert entry["event"] == "remove" and entry["revision"] == 2
+    assert queue.stats()["pending"] == 1
+
+
+def test_a_page_that_keeps_changing_is_due_after_max_delay(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=60, max_delay_seconds=0)
+    queue.enqueue("1", "upsert")
+    assert queue.next_due() is None
+    queue.enqueue("1", "upsert")
+    assert queue.next_due()["page_id"] == "1"
+
+
+def test_an_event_during_processing_keeps_the_entry(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=0)
+    queue.enqueue("1", "upsert")
+    entry = queue.next_due()
+    queue.enqueue("1", "upsert")
+    queue.done(entry)
+    assert queue.next_due()["revision"] == entry["revision"] + 1
+    queue.done(queue.next_due())
+    assert queue.stats()["pending"] == 0
+
+
+def test_failures_back_off_and_are_dropped_after_max_attempts(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=0, max_attempts=2)
+    queue.enqueue("1", "upsert")
+    entry = queue.next_due()
+    queue.failed(entry, "boom")
+    entry = queue.next_due()
+    assert entry["attempts"] == 1
+    queue.failed(entry, "boom")
+    assert queue.stats()["pending"] == 0
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    DebouncedQueue(path, debounce_seconds=0).enqueue("1", "upsert")
+    assert DebouncedQueue(path, debounce_seconds=0).next_due()["page_id"] == "1"
+
+
+def test_worker_processes_due_entries(tmp_path):
+    queue = DebouncedQueue(str(tmp_path / "queue.sqlite3"), debounce_seconds=0)
+    seen, finished = [], threading.Event()
+
+    def process(page_id, event):
+        seen.append((page_id, event))
+        finished.set()
+
+    worker = QueueWorker(queue, process, poll_interval=0.01)
+    queue.enqueue("1", "upsert")
+    worker.start()
+    try:
+        assert finished.wait(5)
+    finally:
+        worker.stop()
+    assert seen == [("1", "upsert")]
+    assert worker.stats()["processed"] == 1 and worker.stats()["pending"] == 0